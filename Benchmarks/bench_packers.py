@@ -0,0 +1,117 @@
+"""
+Benchmark of Engine.packer packers: pack time, occupancy and failure rate on text, sprite and tile workloads
+
+Every workload is a stream of sizes, with total area of --fill times atlas area, packed one by one into
+a single atlas, and then all at once with Packer.pack_many, like TextureAtlas.pack does.
+Occupancy is packed area / atlas area, failures are sizes which didn't fit
+
+Usage: python Benchmarks/bench_packers.py [--atlas SIZE] [--fill FRACTION] [--seed SEED] [--packers NAME ...]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from functools import partial
+from typing import Iterator
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+
+from Engine import Vec2, GuillotinePacker, SkylinePacker, MaxRectsPacker
+
+WORDS = ("Noname", "Human", "Nobody", "Health", "Mana", "FPS", "Quads", "Binds", "Goblin", "Sword", "Chunks",
+         "Evictions", "Level", "Asmantia", "Tavern", "Dungeon", "Merchant", "Guard")
+
+
+def text_sizes(rng: random.Random) -> Iterator[Vec2]:
+    """Sizes of rendered name tags and debug lines in the fonts client uses"""
+    fonts = [pygame.font.Font(f"Assets/Fonts/Exo2-{face}.ttf", size)
+             for face, size in (("Regular", 16), ("Medium", 20), ("Bold", 24), ("Regular", 12))]
+    while True:
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6)))
+        if rng.random() < 0.5:
+            text += f": {rng.randint(0, 10 ** rng.randint(1, 6))}"
+        yield Vec2.from_tuple(rng.choice(fonts).size(text))
+
+
+def sprite_sizes(rng: random.Random) -> Iterator[Vec2]:
+    """Mostly small sprites, some of them big or stretched"""
+    while True:
+        side = rng.choice((16, 16, 24, 32, 32, 48, 64, 96, 128))
+        yield Vec2(side * rng.choice((1, 1, 2)), side * rng.choice((1, 1, 2)))
+
+
+def tile_sizes(rng: random.Random) -> Iterator[Vec2]:
+    """Tiles of tileset with their bleed border, plus occasional multi-tile props"""
+    while True:
+        yield Vec2(18, 18) if rng.random() < 0.9 else Vec2(18 * rng.randint(1, 3), 18 * rng.randint(1, 3))
+
+
+def glyph_sizes(rng: random.Random) -> Iterator[Vec2]:
+    """Printable ascii glyphs of fonts client uses in all sizes, like a glyph atlas built at startup"""
+    while True:
+        for face in ("Regular", "Medium", "Bold"):
+            for size in range(10, 49, 2):
+                font = pygame.font.Font(f"Assets/Fonts/Exo2-{face}.ttf", size)
+                for char in map(chr, range(32, 127)):
+                    yield Vec2.from_tuple(font.size(char))
+
+
+def take_area(sizes: Iterator[Vec2], area: float) -> list[Vec2]:
+    taken = []
+    while area > 0:
+        size = next(sizes)
+        taken.append(size)
+        area -= size.x * size.y
+    return taken
+
+
+WORKLOADS = {"text": text_sizes, "sprites": sprite_sizes, "tiles": tile_sizes, "glyphs": glyph_sizes}
+PACKERS = {
+    "Guillotine": GuillotinePacker,
+    "Skyline": SkylinePacker,
+    **{f"MaxRects-{h}": partial(MaxRectsPacker, heuristic=h) for h in MaxRectsPacker.HEURISTICS},
+}
+
+
+def run(packer_type, atlas: Vec2, sizes: list[Vec2], bulk: bool) -> tuple[float, float, int]:
+    """Returns seconds, occupancy and amount of failures"""
+    packer = packer_type(atlas)
+    start = time.perf_counter()
+    if bulk:
+        positions = packer.pack_many(sizes)
+    else:
+        positions = [packer.pack(size) for size in sizes]
+    seconds = time.perf_counter() - start
+    used = sum(size.x * size.y for size, pos in zip(sizes, positions) if pos is not None)
+    return seconds, used / (atlas.x * atlas.y), positions.count(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--atlas", type=int, default=1024)
+    parser.add_argument("--fill", type=float, default=0.9, help="total area of rects / atlas area")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--packers", nargs="+", choices=PACKERS, default=list(PACKERS))
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=list(WORKLOADS))
+    args = parser.parse_args()
+    atlas = Vec2(args.atlas, args.atlas)
+
+    pygame.font.init()
+    for workload in args.workloads:
+        sizes = take_area(WORKLOADS[workload](random.Random(args.seed)), args.fill * atlas.x * atlas.y)
+        print(f"{workload}: {len(sizes)} rects, {args.fill:.0%} of atlas {args.atlas}x{args.atlas}")
+        for name in args.packers:
+            packer_type = PACKERS[name]
+            for bulk in (False, True):
+                seconds, occupancy, failures = run(packer_type, atlas, sizes, bulk)
+                print(f"    {name:16} {"bulk" if bulk else "":4} {seconds * 1e3:9.1f} ms "
+                      f"{seconds / len(sizes) * 1e6:8.1f} us/rect "
+                      f"occupancy {occupancy:6.1%} failed {failures / len(sizes):6.1%}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
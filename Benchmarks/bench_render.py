@@ -0,0 +1,188 @@
+"""
+Headless render benchmark: frame times, chunk bakes, texture uploads, quads and binds of maps in Data/Maps
+
+Maps are loaded through Map.load, so from their .amap file when it is up to date, from the folder otherwise.
+Camera is driven along scripted paths: panning at the default, closest and farthest zoom, zooming across
+the whole range of the client (MIN_W..MAX_W), and both at once. Frames are drawn into an offscreen EGL
+surface, so no window or GPU is needed: without one, Mesa renders on CPU (llvmpipe).
+Every frame ends with glFinish, so frame times include drawing. Chunks are baked on worker threads,
+as in client, so bakes finishing in a frame may differ slightly between runs
+
+Usage: python Benchmarks/bench_render.py [--maps NAME ...] [--frames N] [--size WxH] [--mode MODE] [--flatten]
+                                         [--bake-cache] [--paths NAME ...] [--json PATH] [--trace PATH]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from math import sin, pi
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+# offscreen context, without X or Wayland
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+
+import numpy as np
+import pygame
+from OpenGL import GL
+
+from Engine import Vec2, Camera, GLUtils, FrameStats, FrameTimes, Profiler
+from Engine.offscreen import egl_context
+from Map import Map
+from Tilemap import Tileset, ChunkMode, baker, bake_cache, BAKE_CACHE_DIR
+
+# same as in client.py
+MIN_W = 160
+MAX_W = 1600
+DEFAULT_W = 400
+
+COUNTERS = ("chunk_bakes", "texture_uploads", "upload_bytes", "quads", "binds")
+
+
+def triangle(t: float) -> float:
+    """0 -> 1 -> 0, while t goes from 0 to 1"""
+    return 1 - abs(2 * t - 1)
+
+
+def figure_eight(t: float, center: Vec2, extent: Vec2) -> Vec2:
+    return center + extent * Vec2(sin(2 * pi * t), sin(4 * pi * t)) * 0.45
+
+
+def zoomed_out(t: float) -> float:
+    """Camera width, from MIN_W to MAX_W and back"""
+    return MIN_W * (MAX_W / MIN_W) ** triangle(t)
+
+
+def pan(width: float):
+    """Figure eight over the map, at constant zoom"""
+    def path(t: float, center: Vec2, extent: Vec2) -> tuple[Vec2, float]:
+        return figure_eight(t, center, extent), width
+    return path
+
+
+def zoom(t: float, center: Vec2, extent: Vec2) -> tuple[Vec2, float]:
+    """Out and back in, at center of the map"""
+    return center, zoomed_out(t)
+
+
+def pan_zoom(t: float, center: Vec2, extent: Vec2) -> tuple[Vec2, float]:
+    """Both at once, so zoom levels change while new parts of the map come into view"""
+    return figure_eight(t, center, extent), zoomed_out(t)
+
+
+PATHS = {
+    "pan": pan(DEFAULT_W),
+    "pan_near": pan(MIN_W),
+    "pan_far": pan(MAX_W),
+    "zoom": zoom,
+    "pan_zoom": pan_zoom,
+}
+
+
+def map_bounds(mp: Map) -> tuple[Vec2, Vec2]:
+    """Center and size of the map in world units"""
+    first = mp.maps[0]
+    size = first.size * first.tile_size
+    return first.global_pos + size / 2, size
+
+
+def draw_frame(cam: Camera, mp: Map, size: tuple[int, int]) -> None:
+    GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+    GLUtils.set_size_center(cam.width, size[1] / size[0] * cam.width)
+    GL.glLoadIdentity()
+    GL.glTranslatef(-cam.global_pos.x, -cam.global_pos.y, 0)
+    cam.render([mp])
+    GL.glFinish()
+
+
+def run_path(path, cam: Camera, mp: Map, frames: int, size: tuple[int, int]) -> dict:
+    stats = FrameStats()
+    profiler = Profiler()
+    times = FrameTimes(frames)
+    counters = {name: np.zeros(frames) for name in COUNTERS}
+    center, extent = map_bounds(mp)
+    for frame in range(frames):
+        cam.pos, cam.width = path(frame / frames, center, extent)
+        start = time.perf_counter()
+        with profiler.scope("frame.draw"):
+            draw_frame(cam, mp, size)
+        times.add((time.perf_counter() - start) * 1e3)
+        last = stats.end_frame()
+        profiler.end_frame()
+        for name in COUNTERS:
+            counters[name][frame] = last.get(name, 0)
+    p50, p95, p99 = times.percentiles()
+    return {
+        "frames": frames,
+        "ms": {"mean": float(times.recent().mean()), "p50": p50, "p95": p95, "p99": p99,
+               "max": float(times.recent().max())},
+        **{name: {"mean": float(values.mean()), "max": float(values.max()), "total": float(values.sum())}
+           for name, values in counters.items()},
+        "bakes_pending": len(baker.pending),
+    }
+
+
+def print_result(name: str, result: dict) -> None:
+    ms = result["ms"]
+    print(f"    {name:10} {ms["mean"]:7.2f} {ms["p50"]:7.2f} {ms["p95"]:7.2f} {ms["p99"]:7.2f} {ms["max"]:7.2f}"
+          f" {result["chunk_bakes"]["mean"]:7.2f} {result["texture_uploads"]["mean"]:7.2f}"
+          f" {result["upload_bytes"]["mean"] / 2 ** 20:7.2f} {result["quads"]["mean"]:7.0f}"
+          f" {result["binds"]["mean"]:6.1f}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--maps", nargs="+", default=sorted(os.listdir("Data/Maps")), help="folders in Data/Maps")
+    parser.add_argument("--frames", type=int, default=300, help="per path")
+    parser.add_argument("--size", default="1600x960", help="of the screen, in pixels")
+    parser.add_argument("--mode", choices=[mode.name for mode in ChunkMode], default=ChunkMode.BAKED.name)
+    parser.add_argument("--flatten", action="store_true", help="see Map.flatten")
+    parser.add_argument("--bake-cache", action="store_true", help=f"read chunks pre-baked into {BAKE_CACHE_DIR}")
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS))
+    parser.add_argument("--json", help="also write results into this file, e.g. to compare runs")
+    parser.add_argument("--trace", help="profile and write Chrome trace of last frames into this file")
+    args = parser.parse_args()
+    size = tuple(int(side) for side in args.size.split("x"))
+
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    egl_context(*size)
+    print(f"{GL.glGetString(GL.GL_RENDERER).decode()}, {size[0]}x{size[1]}, {args.mode}"
+          f"{", flattened" if args.flatten else ""}{", bake cache" if args.bake_cache else ""},"
+          f" {args.frames} frames per path")
+    profiler = Profiler()
+    profiler.enabled = args.trace is not None
+    if args.bake_cache:
+        bake_cache.path = BAKE_CACHE_DIR
+
+    tileset = Tileset().load_set("Assets/Tiles/Tileset.png")
+    results = {}
+    for map_name in args.maps:
+        start = time.perf_counter()
+        mp = Map.load(os.path.join("Data/Maps", map_name), tileset, mode=ChunkMode[args.mode], flatten=args.flatten)
+        print(f"{map_name}: loaded in {time.perf_counter() - start:.2f} s")
+        print(f"    {"path":10} {"mean":>7} {"p50":>7} {"p95":>7} {"p99":>7} {"max":>7}"
+              f" {"bakes":>7} {"uploads":>7} {"MiB":>7} {"quads":>7} {"binds":>6}")
+        cam = Camera(DEFAULT_W, size)
+        results[map_name] = {}
+        for path_name in args.paths:
+            result = run_path(PATHS[path_name], cam, mp, args.frames, size)
+            results[map_name][path_name] = result
+            print_result(path_name, result)
+    print("frame times in ms, counters are means per frame")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"renderer": GL.glGetString(GL.GL_RENDERER).decode(), "args": vars(args), "results": results},
+                      f, indent=2)
+    if args.trace:
+        profiler.dump(args.trace)
+    if baker.executor is not None:
+        baker.executor.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    main()
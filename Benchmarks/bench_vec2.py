@@ -0,0 +1,99 @@
+"""
+Microbenchmark of Engine.Vec2: ns per call and Vec2 allocations per call, for operators and render paths
+
+Doesn't need GL, render paths only queue quads
+
+Usage: python Benchmarks/bench_vec2.py [--number N]
+"""
+import argparse
+import os
+import sys
+import timeit
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from Engine import Vec2, Camera, Obj, Renderer, Texture
+from Map import Map
+from Tilemap import Tileset, chunk_range
+
+
+@contextmanager
+def count_allocations():
+    """Counts Vec2 instances created inside of the block"""
+    counter = [0]
+    init = Vec2.__init__
+
+    def counting_init(self, *args, **kwargs):
+        counter[0] += 1
+        init(self, *args, **kwargs)
+
+    Vec2.__init__ = counting_init
+    try:
+        yield counter
+    finally:
+        Vec2.__init__ = init
+
+
+def measure(name: str, func, number: int):
+    with count_allocations() as allocs:
+        func()
+    ns = min(timeit.repeat(func, number=number, repeat=5)) / number * 1e9
+    print(f"{name:40} {ns:8.0f} ns {allocs[0]:4} allocs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args()
+    n = args.number
+
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+
+    a, b = Vec2(1.5, 2.5), Vec2(3.0, 4.0)
+    print("Operators")
+    measure("a + b", lambda: a + b, n)
+    measure("a + (1, 2)", lambda: a + (1, 2), n)
+    measure("a * 2.0", lambda: a * 2.0, n)
+    measure("a / 2.0", lambda: a / 2.0, n)
+    if hasattr(Vec2, "add_vec"):
+        c = a.copy()
+        measure("a.add_vec(b)", lambda: a.add_vec(b), n)
+        measure("a.mul_num(2.0)", lambda: a.mul_num(2.0), n)
+        measure("c += b", lambda: c.__iadd__(b), n)
+
+    print("Render paths")
+    cam = Camera(400, (1600, 960))
+    measure("Camera.update", cam.update, n)
+
+    root = Obj(pos=(-1000, -1000))
+    chunk = Obj(pos=(512, 512), parent=Obj(parent=root))
+    measure("Obj.global_pos, 3 levels", lambda: chunk.global_pos, n)
+
+    surf = pygame.Surface((16, 16))
+    sprite = Renderer(surf, pos=(10, 10), tex=Texture(0, surf, (0, 0, 1, 1), Vec2(0, 0), Vec2(16, 16)))
+
+    def render_sprite():
+        sprite.render(cam)
+        cam.queue.queue.clear()
+    measure("Renderer.render", render_sprite, n)
+
+    tileset = Tileset().load_set("Assets/Tiles/Tileset.png", atlas=False)
+    tilemap = Map.from_folder("Data/Maps/test_map", tileset).maps[0]
+    measure("chunk_range", lambda: chunk_range(cam, tilemap.global_pos, tilemap.chunk_size, tilemap.chunk_count),
+            n // 10)
+    cam.pos = Vec2(-10_000, -10_000)
+    cam.update()
+    cx, cy = np.argwhere(tilemap.occupied)[0].tolist()
+    culled = tilemap.chunk(cx, cy)
+    measure("Chunk.render, culled", lambda: culled.render(cam), n)
+
+
+if __name__ == "__main__":
+    main()
@@ -38,12 +38,26 @@ class Character(Obj):
         self.sprite.parent = self
         y = self.sprite.size.y / 2 + 3
         self.name = name
-        self.name_tag = TextRenderer(name, self.font, self.fore, self.back, parent=self, pos=(0, -y), scalable=False)
+        self.name_tag = TextRenderer(name, self.font, self.fore, self.back, parent=self, pos=(0, -y), scalable=False,
+                                     layer=1)
 
     def render(self, cam):
         self.sprite.render(cam)
         self.name_tag.render(cam)
 
+    @property
+    def reach(self):
+        world, screen = 0, 0
+        for part in (self.sprite, self.name_tag):
+            part_world, part_screen = part.reach
+            world = max(world, abs(part.pos.x) + part_world, abs(part.pos.y) + part_world)
+            screen = max(screen, part_screen)
+        return world, screen
+
+    def bounds(self, zoom: float = 1):
+        (x0, y0, x1, y1), (u0, v0, u1, v1) = self.sprite.bounds(zoom), self.name_tag.bounds(zoom)
+        return min(x0, u0), min(y0, v0), max(x1, u1), max(y1, v1)
+
 
 @dataclass
 class CharSheet:
@@ -1,22 +1,51 @@
 import logging
+from dataclasses import dataclass
 from functools import wraps
 
 import pygame
 
+from . import GLUtils
 from .GLUtils import DrawQueue, screen_render
-from .TextRenderUtils import TRenderer
+from .TextRenderUtils import TRenderer, GlyphAtlas
+from .packer import MaxRectsPacker
 from .singleton import singleton
+from .stats import FrameStats, FrameTimes
+from .texture import Texture, TextureAtlas
 from .vec2 import Vec2
 
 TRender = TRenderer()
 
 DEBUG_BACK = (0, 0, 0, 127)
+DEBUG_ATLAS_SIZE = Vec2(1024, 1024)
+
+GRAPH_SIZE = (300, 60)
+GRAPH_BAR = 2  # width of bar of a single frame
+GRAPH_COLORS = {
+    "back": DEBUG_BACK,
+    "fast": (90, 200, 90),
+    "slow": (230, 200, 60),
+    "hitch": (230, 60, 60),
+    "budget": (255, 255, 255, 160),
+}
 
 logger = logging.getLogger(__name__)
 
+stats = FrameStats()
+
+
+@dataclass(slots=True)
+class DebugLine:
+    """Slot of a line of display, kept between frames, so line is only rendered again when its text changes"""
+    text: str | None = None
+    size: tuple[int, int] = (0, 0)
+    surface: pygame.Surface | None = None  # kept to be packed again, when debug atlas is compacted
+    texture: Texture | None = None
+
 
 class DebugDisplay:
     pos: Vec2
+    lines: list[DebugLine]
+    line: int  # slot of next line in current frame
 
     def __init__(self, relpos: tuple[str, Vec2], debug_manager):
         """
@@ -24,38 +53,84 @@ class DebugDisplay:
         :type debug_manager: DebugManager
         """
         self.offset: Vec2 = Vec2()
+        self.lines = []
+        self.line = 0
         self.relpos = relpos
         self.manager = debug_manager
         self.update_size()
 
     def add(self, text: str):
-        pos = {self.relpos[0]: (self.pos + self.offset).tuple}
-        tex = TRender.prerender_text(text, self.manager.font, back=DEBUG_BACK)
-        text_rect: pygame.Rect = tex.surf.get_rect(**pos)
-        self.manager.queue += (text_rect.x, text_rect.y, text_rect.width, text_rect.height), tex
-        self.offset.y += text_rect.height
+        if self.line == len(self.lines):
+            self.lines.append(DebugLine())
+        line = self.lines[self.line]
+        if line.text != text:
+            self.manager.rasterize(line, text, (self, self.line))
+        self.line += 1
+
+        text_rect = self.place(line.size)
+        if self.manager.glyphs is None:
+            self.manager.placed.append((text_rect, line))
+        else:
+            self.manager.glyphs.queue(text, text_rect.x, text_rect.y, self.manager.queue, DEBUG_BACK)
+
+    def graph(self, frame_times: FrameTimes, budget: float):
+        """
+        Bar per recent frame, newest on the right, scaled so that budget is at quarter of height
+
+        Frames over 1.2 of budget are yellow, over twice the budget are red, the line marks budget
+
+        :type frame_times: FrameTimes
+        :type budget: float
+        """
+        palette = self.manager.palette
+        queue = self.manager.queue
+        width, height = GRAPH_SIZE
+        rect = self.place(GRAPH_SIZE)
+        queue.add(rect.x, rect.y, width, height, palette["back"])
+
+        scale = height / (4 * budget)
+        times = frame_times.recent(width // GRAPH_BAR)
+        x = rect.right - len(times) * GRAPH_BAR
+        for ms in times.tolist():
+            bar = min(ms * scale, height)
+            color = "hitch" if ms > 2 * budget else "slow" if ms > 1.2 * budget else "fast"
+            queue.add(x, rect.bottom - bar, GRAPH_BAR, bar, palette[color])
+            x += GRAPH_BAR
+        queue.add(rect.x, rect.bottom - budget * scale, width, 1, palette["budget"])
+
+    def place(self, size: tuple[int, int]) -> pygame.Rect:
+        """Rect of next block (line, graph) of display, blocks are stacked down from position of display"""
+        rect = pygame.Rect((0, 0), size)
+        setattr(rect, self.relpos[0], (self.pos + self.offset).tuple)
+        self.offset.y += rect.height
+        return rect
 
     def reset_offset(self):
         self.offset = Vec2()
+        self.line = 0
 
     def update_size(self):
         self.pos = self.relpos[1]
         match self.relpos[0]:
             case "topright":
-                self.pos += Vec2(self.manager.size[0], 0)
+                self.pos = self.pos + Vec2(self.manager.size[0], 0)
 
 
 @singleton
 class DebugManager:
     displays: list[DebugDisplay]
     font: pygame.font.Font
+    glyphs: GlyphAtlas | None  # lines are laid out from glyphs, instead of being rendered whole
+    atlas: TextureAtlas | None  # rendered lines, when glyphs aren't used
+    placed: list[tuple[pygame.Rect, DebugLine]]  # lines from atlas in current frame, queued on draw
+    palette: dict[str, Texture]  # colors of graphs
     screen: pygame.Surface
     queue: DrawQueue
 
     initialized = False
 
     def init(self, font: pygame.font.Font = None, size: tuple[int, int] = None,
-             display_positions: list[tuple[str, Vec2]] = None):
+             display_positions: list[tuple[str, Vec2]] = None, glyphs: bool = False):
         if self.initialized:
             raise RuntimeError("Init was called second time")
         self.initialized = True
@@ -65,6 +140,11 @@ class DebugManager:
         for do in display_positions:
             self.displays.append(DebugDisplay(do, self))
         self.font = font
+        self.glyphs = TRender.glyph_atlas(font) if glyphs else None
+        self.atlas = None if glyphs else TextureAtlas.create_empty(DEBUG_ATLAS_SIZE, packer=MaxRectsPacker,
+                                                                  keep_copies=False)
+        self.placed = []
+        self.palette = self.make_palette(GRAPH_COLORS)
         self.queue: DrawQueue = DrawQueue()
         logger.debug(f"Instance of {self.__class__} is initialized")
 
@@ -82,6 +162,56 @@ class DebugManager:
     def __call__(self, text, d=0):
         self.displays[d].add(text)
 
+    @check_init
+    def graph(self, frame_times: FrameTimes, budget: float, d=0):
+        self.displays[d].graph(frame_times, budget)
+
+    def rasterize(self, line: DebugLine, text: str, key) -> None:
+        """
+        Renders changed line into debug atlas, or only measures it when lines are laid out from glyphs
+
+        Lines are rendered outside of text cache of TRenderer, so ever changing numbers don't evict other text.
+        Compacting atlas changes textures of all lines, so lines are queued only on draw
+        """
+        stats.add("debug_lines_rasterized")
+        line.text = text
+        if self.glyphs is not None:
+            line.size = self.glyphs.box_size(text)
+            return
+        line.surface = TRender.render_box(text, self.font, back=DEBUG_BACK)
+        line.size = line.surface.get_size()
+        if key in self.atlas:
+            self.atlas.remove(key)
+        packed = self.atlas.pack({key: line.surface}, flush=False)
+        if key not in packed:
+            # fragmented by changing lines, so all of them are packed again
+            logger.debug(f"{self.__class__}: Compacting atlas")
+            self.atlas.reset()
+            packed = self.atlas.pack({(display, i): slot.surface
+                                      for display in self.displays for i, slot in enumerate(display.lines)
+                                      if slot.surface is not None}, flush=False)
+            for (display, i), texture in packed.items():
+                display.lines[i].texture = texture
+            if key not in packed:
+                raise ValueError(f"Debug line too long: can support {DEBUG_ATLAS_SIZE}, given {line.size}")
+        line.texture = packed[key]
+
+    @staticmethod
+    def make_palette(colors: dict[str, tuple]) -> dict[str, Texture]:
+        """Textures of single colors, all in one small texture"""
+        surface = pygame.Surface((4 * len(colors), 4), pygame.SRCALPHA)
+        for i, color in enumerate(colors.values()):
+            surface.fill(color, (4 * i, 0, 4, 4))
+        tex_id = GLUtils.surface_to_texture(surface)
+        width, height = surface.get_size()
+        # only middles of patches are sampled, so filtering doesn't mix neighbouring colors
+        return {name: Texture(tex_id=tex_id,
+                              surf=surface.subsurface(4 * i + 1, 1, 2, 2),
+                              uv=((4 * i + 1) / width, 1 / height, (4 * i + 3) / width, 3 / height),
+                              pos=Vec2(4 * i + 1, 1),
+                              size=Vec2(2, 2))
+                for i, name in enumerate(colors)}
+
     @check_init
     def update_size(self, size: tuple[int, int]):
         self.screen = pygame.Surface(size)
@@ -98,4 +228,7 @@ class DebugManager:
         for i in self.displays:
             i.reset_offset()
 
+        for rect, line in self.placed:
+            self.queue += (rect.x, rect.y, rect.width, rect.height), line.texture
+        self.placed.clear()
         self.queue()
@@ -1,14 +1,21 @@
 import logging
 from functools import wraps
 
+import numpy as np
 import pygame
 from OpenGL import GL, GLU
 
 from .vec2 import Vec2
-from .texture import Texture
+from .texture import Texture, TextureAtlas
+from .batch import SpriteBatch, Mesh
+from .stats import FrameStats
+from .profiler import Profiler
 
 logger = logging.getLogger(__name__)
 
+stats = FrameStats()
+profiler = Profiler()
+
 def surface_to_texture(surface):
     data = pygame.image.tostring(surface, "RGBA")
     w, h = surface.get_size()
@@ -17,6 +24,20 @@ def surface_to_texture(surface):
     GL.glBindTexture(GL.GL_TEXTURE_2D, texture)
     GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA, w, h, 0,
                     GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, data)
+    stats.add("texture_uploads")
+    stats.add("upload_bytes", len(data))
+
+    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
+    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_NEAREST)
+
+    return texture
+
+def create_texture(size: Vec2) -> int:
+    """Creates texture with uninitialized storage, to be filled later with update_texture"""
+    texture = GL.glGenTextures(1)
+    GL.glBindTexture(GL.GL_TEXTURE_2D, texture)
+    GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA, int(size.x), int(size.y), 0,
+                    GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, None)
 
     GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
     GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_NEAREST)
@@ -31,6 +52,23 @@ def update_texture(tex_id: int, surface: pygame.Surface, offset: Vec2 = None):
     GL.glBindTexture(GL.GL_TEXTURE_2D, tex_id)
     GL.glTexSubImage2D(GL.GL_TEXTURE_2D, 0, offset.x, offset.y, size.x, size.y,
                     GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, data)
+    stats.add("texture_uploads")
+    stats.add("upload_bytes", len(data))
+
+def update_texture_data(tex_id: int, pixels: np.ndarray, offset: Vec2 = None):
+    """Same as update_texture, but for RGBA array of shape (height, width, 4)"""
+    if offset is None:
+        offset = Vec2.zero
+    pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+    h, w = pixels.shape[:2]
+    GL.glBindTexture(GL.GL_TEXTURE_2D, tex_id)
+    GL.glTexSubImage2D(GL.GL_TEXTURE_2D, 0, int(offset.x), int(offset.y), w, h,
+                    GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, pixels)
+    stats.add("texture_uploads")
+    stats.add("upload_bytes", pixels.nbytes)
+
+def delete_texture(tex_id: int):
+    GL.glDeleteTextures([tex_id])
 
 def surf_to_tex_default(surface):
     return Texture(surface_to_texture(surface), surface, (0, 0, 1, 1), Vec2(0, 0), Vec2.from_tuple(surface.get_size()))
@@ -57,52 +95,58 @@ def draw_quad(x, y, width, height, texture):
     GL.glDisable(GL.GL_BLEND)
 
 
-def batch_draw(texture_list):
-    if len(texture_list)==0:
-        return
-
-    GL.glEnable(GL.GL_TEXTURE_2D)
-    GL.glEnable(GL.GL_BLEND)
-    GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
-
-    current_tex = texture_list[0][1].tex_id
-    GL.glBindTexture(GL.GL_TEXTURE_2D, current_tex)
-    GL.glBegin(GL.GL_QUADS)
-
-    for [x, y, w, h], tex in texture_list:
-        tex_id, [u0, v0, u1, v1] = tex.tex_id, tex.uv
-        if tex_id!=current_tex:
-            GL.glEnd()
-            GL.glBindTexture(GL.GL_TEXTURE_2D, tex_id)
-            GL.glBegin(GL.GL_QUADS)
-            current_tex = tex_id
-
-        GL.glTexCoord2f(u0, v0); GL.glVertex2f(x, y)
-        GL.glTexCoord2f(u1, v0); GL.glVertex2f(x + w, y)
-        GL.glTexCoord2f(u1, v1); GL.glVertex2f(x + w, y + h)
-        GL.glTexCoord2f(u0, v1); GL.glVertex2f(x, y + h)
-
-    GL.glEnd()
-    GL.glDisable(GL.GL_TEXTURE_2D)
-    GL.glDisable(GL.GL_BLEND)
-
-
 class DrawQueue:
-    queue: list[tuple[tuple[int, int, int, int], Texture]]  # list[tuple[x, y, width, height, texture]]
-
-    def __init__(self):
+    """
+    Collects quads during a frame and draws them in one batch
+
+    Every quad carries a layer: lower layers are drawn first, and inside of a layer
+    quads are grouped by texture, so order between quads of the same layer isn't kept.
+    Quads that must be drawn over others of their layer go to a fractional layer above it
+    """
+    queue: list[tuple[tuple[int, int, int, int], Texture, int]]  # list[tuple[x, y, width, height, texture, layer]]
+    meshes: list[tuple[Mesh, tuple[float, float], int]]  # list[tuple[mesh, offset, layer]]
+    batch: SpriteBatch
+    sort: bool
+    binds: int  # texture binds during last flush
+    binds_saved: int  # binds avoided by sorting during last flush
+
+    # shared between queues, as they are flushed one after another anyway
+    default_batch: SpriteBatch | None = None
+
+    def __init__(self, batch: SpriteBatch = None, *, sort: bool = True):
         self.queue = []
-
-    def __iadd__(self, other: tuple[tuple[int, int, int, int], Texture]):
-        self.append = self.queue.append(other)
+        self.meshes = []
+        if batch is None:
+            if DrawQueue.default_batch is None:
+                DrawQueue.default_batch = SpriteBatch()
+            batch = DrawQueue.default_batch
+        self.batch = batch
+        self.sort = sort
+        self.binds = 0
+        self.binds_saved = 0
+
+    def __iadd__(self, other: tuple[tuple[int, int, int, int], Texture] | tuple[tuple[int, int, int, int], Texture, int]):
+        if len(other) == 2:
+            other = (*other, 0)
+        self.queue.append(other)
         return self
 
-    def add(self, x, y, width, height, texture: Texture):
-        self.__iadd__(((x, y, width, height), texture))
+    def add(self, x, y, width, height, texture: Texture, layer: float = 0):
+        self.queue.append(((x, y, width, height), texture, layer))
+
+    def add_mesh(self, mesh: Mesh, offset: tuple[float, float], layer: int = 0):
+        self.meshes.append((mesh, offset, layer))
 
+    @profiler.profile("DrawQueue.draw")
     def __call__(self):
-        batch_draw(self.queue)
+        # subtextures packed during the frame are uploaded, before anything is drawn with them
+        TextureAtlas.flush_all()
+        self.binds, self.binds_saved = self.batch.draw(self.queue, self.meshes, self.sort)
+        stats.add("quads", len(self.queue) + sum(len(mesh) for mesh, _, _ in self.meshes))
+        stats.add("binds", self.binds)
+        stats.add("binds_saved", self.binds_saved)
         self.queue.clear()
+        self.meshes.clear()
 
 
 def set_size_center(w, h):
@@ -1,31 +1,218 @@
 import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Iterable
 
 import pygame
 
 from .GLUtils import DrawQueue
 from .singleton import singleton
+from .stats import FrameStats
 from .texture import Texture, TextureAtlas
-from .packer import SkylinePacker
+from .packer import MaxRectsPacker
 from .vec2 import Vec2
 
 logger = logging.getLogger(__name__)
 
+stats = FrameStats()
+
+TEXT_PADDING = 3  # between text and edges of its background box
+GLYPH_SUBLAYER = 0.5  # glyphs are queued this much above layer of their box, so they are drawn over its background
+
+
+@dataclass(slots=True)
+class CachedText:
+    texture: Texture
+    atlas: TextureAtlas
+    frame: int  # last frame text was used in
+
+
+@dataclass(slots=True)
+class Glyph:
+    texture: Texture | None  # None for glyphs without visible pixels, e.g. space
+    width: int  # of glyph rendered alone
+
+
+class GlyphAtlas:
+    """
+    Glyphs of one font in one color, rasterized once into shared atlas pages, strings are laid out from them
+    as a quad per glyph, so changing text costs no texture work
+
+    Every glyph is placed where the text up to it ends, as measured by font.size, so kerning is included
+    and rounding doesn't add up along the string: layout matches font.render, except for ligatures.
+    That's a measure per glyph, so layouts of recent strings are cached.
+    Quads have no vertex colors, so every color of text needs its own GlyphAtlas (see TRenderer.glyph_atlas).
+    Glyphs are never evicted
+    """
+    page_size = Vec2(512, 512)
+    packer = MaxRectsPacker
+    preloaded = "".join(map(chr, range(32, 127)))  # printable ascii, rasterized on creation
+    layout_cache_size = 1024
+
+    def __init__(self, font: pygame.font.Font, fore=(255, 255, 255)):
+        """
+
+        :type font: pygame.font.Font
+        :type fore: tuple[int, int, int] | tuple[int, int, int, int]
+        """
+        self.font = font
+        self.fore = fore
+        self.height = font.get_height()
+        self.pages: list[TextureAtlas] = []
+        self.glyphs: dict[str, Glyph] = {}
+        self.solids: dict[tuple, Texture] = {}
+        self.layouts: dict[str, tuple[list[tuple[int, Texture]], int]] = {}
+        self.add_glyphs(self.preloaded)
+
+    def add_glyphs(self, chars: Iterable[str]) -> None:
+        """Rasterizes glyphs which aren't in atlas yet, all of them are uploaded at once, before next draw"""
+        bitmaps = {}
+        for char in chars:
+            if char in self.glyphs or char in bitmaps:
+                continue
+            surf = self.font.render(char, True, self.fore)
+            self.glyphs[char] = Glyph(None, surf.get_width())
+            if surf.get_bounding_rect().width:
+                # transparent border, so neighbours don't bleed in when text is minified
+                bitmaps[char] = bordered = pygame.Surface((surf.get_width() + 2, surf.get_height() + 2),
+                                                          pygame.SRCALPHA)
+                bordered.blit(surf, (1, 1), special_flags=pygame.BLEND_RGBA_ADD)
+        for char, texture in self._pack(bitmaps).items():
+            self.glyphs[char].texture = texture
+
+    def solid(self, color) -> Texture:
+        """
+        Texture of single color in glyph pages, for backgrounds of text boxes
+
+        :type color: tuple[int, int, int] | tuple[int, int, int, int]
+        :rtype: Texture
+        """
+        texture = self.solids.get(color)
+        if texture is None:
+            patch = pygame.Surface((4, 4), pygame.SRCALPHA)
+            patch.fill(color)
+            # only middle of patch is sampled, so filtering never reaches whatever is packed around it
+            texture = self.solids[color] = self._pack({color: patch})[color]
+        return texture
+
+    def _pack(self, surfaces: dict[Any, pygame.Surface]) -> dict[Any, Texture]:
+        """Packs surfaces into pages, returned textures exclude 1 pixel border of every surface"""
+        for key, surf in surfaces.items():
+            if self.page_size.lt_or(Vec2.from_tuple(surf.get_size())):
+                raise ValueError(f"Glyph too big: can support {self.page_size}, given {surf.get_size()} for {key!r}")
+        textures = {}
+        surfaces = dict(surfaces)
+        # oldest pages first: backgrounds are packed into earlier pages than glyphs drawn over them,
+        # and quads of a layer are drawn in order of texture
+        pages = iter(list(self.pages))
+        while surfaces:
+            page = next(pages, None)
+            if page is None:
+                logger.debug(f"{self.__class__}: New page for {self.font}")
+                self.pages.append(page := TextureAtlas.create_empty(self.page_size, packer=self.packer,
+                                                                    keep_copies=False))
+            for key, texture in page.pack(surfaces, flush=False).items():
+                del surfaces[key]
+                pos, size = texture.pos + (1, 1), texture.size - (2, 2)
+                textures[key] = Texture(
+                    tex_id=page.tex,
+                    surf=texture.surf.subsurface((1, 1), size.int_tuple),
+                    uv=(*page.calculate_uv(pos), *page.calculate_uv(pos + size)),
+                    pos=pos,
+                    size=size
+                )
+        return textures
+
+    def layout(self, text: str) -> tuple[list[tuple[int, Texture]], int]:
+        """
+        Glyph textures of text with their x relative to start of text, and width of text
+
+        :type text: str
+        :rtype: tuple[list[tuple[int, Texture]], int]
+        """
+        layout = self.layouts.get(text)
+        if layout is not None:
+            return layout
+        self.add_glyphs(text)
+        glyphs = self.glyphs
+        size = self.font.size
+        quads = []
+        for i, char in enumerate(text):
+            glyph = glyphs[char]
+            if glyph.texture is not None:
+                # glyph ends where text up to it ends
+                quads.append((size(text[:i + 1])[0] - glyph.width, glyph.texture))
+        if len(self.layouts) >= self.layout_cache_size:
+            self.layouts.clear()
+        layout = self.layouts[text] = quads, size(text)[0]
+        return layout
+
+    def box_size(self, text: str) -> tuple[int, int]:
+        """Size of text with its background box, same as of prerendered text"""
+        return self.layout(text)[1] + 2 * TEXT_PADDING, self.height + 2 * TEXT_PADDING
+
+    def queue(self, text: str, x: float, y: float, queue: DrawQueue, back=None, layer: int = 0,
+              scale: tuple[float, float] = (1, 1)) -> None:
+        """
+        Queues background of text box with its top left corner at x, y, and quads of glyphs over it,
+        at layer + GLYPH_SUBLAYER
+
+        :type text: str
+        :type queue: DrawQueue
+        :type back: tuple[int, int, int] | tuple[int, int, int, int] | None
+        :type layer: int
+        :type scale: tuple[float, float]
+        """
+        quads, width = self.layout(text)
+        sx, sy = scale
+        if back is not None and back[3:] != (0,):
+            queue.add(x, y, (width + 2 * TEXT_PADDING) * sx, (self.height + 2 * TEXT_PADDING) * sy,
+                      self.solid(back), layer)
+        x, y = x + TEXT_PADDING * sx, y + TEXT_PADDING * sy
+        for glyph_x, texture in quads:
+            queue.add(x + glyph_x * sx, y, texture.size.x * sx, texture.size.y * sy, texture, layer + GLYPH_SUBLAYER)
+
 
 @singleton
 class TRenderer:
+    """
+    Renders strings into per-font atlases and caches them
+
+    Cache is LRU, bounded by cache_size: when it's exceeded, least recently used strings are removed from
+    their atlases, so the space is packed again. Strings used during current frame are never removed.
+    When no atlas of font has space, atlas with lowest occupancy below compact_occupancy is compacted,
+    so space fragmented by removed strings is reclaimed, and atlases left empty are deleted,
+    so amount of atlases stays bounded in long sessions
+
+    Often changing text (counters, debug lines) is better laid out from glyph_atlas(font, fore) instead
+    """
     exists = False
     atlases: dict[pygame.font.Font, list[TextureAtlas]]
-    prerendered_text: dict[
+    prerendered_text: OrderedDict[
         tuple[str, pygame.font.Font, tuple[int, int, int] | tuple[int, int, int, int],
                                      tuple[int, int, int] | tuple[int, int, int, int]],
-        Texture
-    ]
+        CachedText
+    ]  # least recently used first
+    glyph_atlases: dict[tuple[pygame.font.Font, tuple], GlyphAtlas]
     atlas_size = Vec2(2048, 2048)
-    packer = SkylinePacker
+    packer = MaxRectsPacker
+    cache_size = 4096
+    compact_occupancy = 0.5
 
     def __init__(self):
-        self.prerendered_text = {}
+        self.prerendered_text = OrderedDict()
         self.atlases = {}
+        self.glyph_atlases = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def atlas_count(self) -> int:
+        return sum(len(atlases) for atlases in self.atlases.values())
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / (self.hits + self.misses) if self.hits or self.misses else 0
 
     def render_text(self, text: str, font: pygame.font.Font, pos, queue: DrawQueue,
                     fore=(255, 255, 255), back=(0, 0, 0)):
@@ -33,11 +220,25 @@ class TRenderer:
         text_rect: pygame.Rect = tex.surf.get_rect(**pos)
         queue += (text_rect.x, text_rect.y, text_rect.width, text_rect.height), tex
 
+    @staticmethod
+    def render_box(text: str, font: pygame.font.Font, fore=(255, 255, 255), back=(0, 0, 0)) -> pygame.Surface:
+        """Renders text over its background box"""
+        rendered_text = font.render(text, True, fore)
+        background = pygame.Surface(
+            (rendered_text.get_width() + 2 * TEXT_PADDING, rendered_text.get_height() + 2 * TEXT_PADDING),
+            pygame.SRCALPHA)
+        background.fill(back)
+        background.blit(rendered_text, (TEXT_PADDING, TEXT_PADDING))
+        return background
+
     def prerender_text(self, text: str, font: pygame.font.Font, fore=(255, 255, 255), back=(0, 0, 0),
                        atlas: TextureAtlas = None) -> Texture:
         """
         Pre-renders text, if necessary, otherwise looks up Texture object
 
+        Texture is only guaranteed to stay valid until the end of current frame, so it should be looked up
+        every frame it's drawn in
+
         :type text: str
         :type font: pygame.font.Font
         :type fore: tuple[int, int, int] | tuple[int, int, int, int]
@@ -45,15 +246,18 @@ class TRenderer:
         :type atlas: TextureAtlas
         :rtype: Texture
         """
+        key = text, font, fore, back
+        cached = self.prerendered_text.get(key)
+        if cached is not None:
+            self.prerendered_text.move_to_end(key)
+            cached.frame = stats.frame
+            self.hits += 1
+            stats.add("text_hits")
+            return cached.texture
+        self.misses += 1
+        stats.add("text_misses")
 
-        if (text, font, fore, back) in self.prerendered_text:
-            return self.prerendered_text[text, font, fore, back]
-
-        rendered_text = font.render(text, True, fore)
-        background = pygame.Surface(
-            (rendered_text.get_width() + 6, rendered_text.get_height() + 6), pygame.SRCALPHA)
-        background.fill(back)
-        background.blit(rendered_text, (3, 3))
+        background = self.render_box(text, font, fore, back)
         text_size = Vec2.from_tuple(background.get_size())
 
         # adding to atlas
@@ -61,27 +265,81 @@ class TRenderer:
         if self.atlas_size.lt_or(text_size):
             raise ValueError(f"String too long: can support {self.atlas_size}, given {text_size}")
 
-        # checking if atlas is given
-        if atlas is None:
-            # if list of atlases exists for this font
-            if font not in self.atlases:
-                logger.debug(f"{self.__class__}: New atlas: New font")
-                atlas = self.new_atlas()
-                self.atlases[font] = [atlas]
+        name = text, fore, back
+        texture = atlas.pack({name: background}, flush=False) if atlas is not None else None
+        if not texture:
+            # newest atlas first, older ones may have space freed by evicted strings
+            for atlas in reversed(self.atlases.setdefault(font, [])):
+                if texture := atlas.pack({name: background}, flush=False):
+                    break
             else:
-                atlas = self.atlases[font][-1]
+                atlas = self.compact_atlas(font)
+                texture = atlas.pack({name: background}, flush=False) if atlas is not None else None
+                if not texture:
+                    logger.debug(f"{self.__class__}: New atlas")
+                    self.atlases[font].append(atlas := self.new_atlas())
+                    texture = atlas.pack({name: background}, flush=False)
 
-        # packing it to atlas
-        texture = atlas.pack({(text, fore, back): background})
+        self.prerendered_text[key] = CachedText(texture[name], atlas, stats.frame)
+        self.trim()
+        return texture[name]
 
-        # checking if it had successfully packed it, otherwise creating new atlas
-        if not texture:
-            logger.debug(f"{self.__class__}: New atlas: Not enough space")
-            self.atlases[font].append(atlas := self.new_atlas())
-            texture = atlas.pack({(text, fore, back): background})
+    def glyph_atlas(self, font: pygame.font.Font, fore=(255, 255, 255)) -> GlyphAtlas:
+        """
+        Glyph atlas of font in color, created on first use
 
-        self.prerendered_text[text, font, fore, back] = texture[text, fore, back]
-        return self.prerendered_text[text, font, fore, back]
+        :type font: pygame.font.Font
+        :type fore: tuple[int, int, int] | tuple[int, int, int, int]
+        :rtype: GlyphAtlas
+        """
+        key = font, fore
+        atlas = self.glyph_atlases.get(key)
+        if atlas is None:
+            atlas = self.glyph_atlases[key] = GlyphAtlas(font, fore)
+        return atlas
+
+    def trim(self) -> None:
+        """Removes least recently used strings over cache_size"""
+        while len(self.prerendered_text) > self.cache_size:
+            key, cached = next(iter(self.prerendered_text.items()))
+            if cached.frame == stats.frame:
+                break
+            self.evict(key)
+
+    def evict(self, key) -> None:
+        text, font, fore, back = key
+        cached = self.prerendered_text.pop(key)
+        cached.atlas.remove((text, fore, back))
+        atlases = self.atlases.get(font, [])
+        if not cached.atlas.textures and cached.atlas in atlases and len(atlases) > 1:
+            logger.debug(f"{self.__class__}: Deleting empty atlas")
+            atlases.remove(cached.atlas)
+            cached.atlas.delete()
+
+    def compact_atlas(self, font: pygame.font.Font) -> TextureAtlas | None:
+        """
+        Repacks least occupied atlas of font, if it is occupied less than compact_occupancy
+        and none of its strings were used in this frame, as their textures change.
+        Strings which don't fit anymore are removed from cache. Returns None if no atlas qualifies
+
+        :type font: pygame.font.Font
+        :rtype: TextureAtlas | None
+        """
+        candidates = [a for a in self.atlases[font] if a.occupancy() < self.compact_occupancy]
+        for atlas in sorted(candidates, key=TextureAtlas.occupancy):
+            names = list(atlas.textures)
+            if any(self.prerendered_text[text, font, fore, back].frame == stats.frame for text, fore, back in names):
+                continue
+            logger.debug(f"{self.__class__}: Compacting atlas of {len(names)} strings")
+            packed = atlas.compact(flush=False)
+            for text, fore, back in names:
+                key = text, font, fore, back
+                if (text, fore, back) in packed:
+                    self.prerendered_text[key].texture = packed[text, fore, back]
+                else:
+                    del self.prerendered_text[key]
+            return atlas
+        return None
 
     def new_atlas(self):
-        return TextureAtlas.create_empty(self.atlas_size, packer=self.packer)
\ No newline at end of file
+        return TextureAtlas.create_empty(self.atlas_size, packer=self.packer, keep_copies=False)
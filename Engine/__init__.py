@@ -5,11 +5,16 @@ logger = logging.getLogger(__name__)
 from .vec2 import Vec2
 from .camera import Camera
 from .object import Obj
+from .spatial import SpatialIndex
 from .renderer import Renderer, TextRenderer
 from . import GLUtils, TextRenderUtils, Debug
 from .ui import UiRenderer, UiTextRenderer, UiElement, UiProgressBar, Canvas
 from .GLUtils import DrawQueue
+from .batch import Mesh
 from .texture import Texture, TextureAtlas
-from .packer import Packer, GuillotinePacker, SkylinePacker
+from .texture_pool import TexturePool
+from .packer import Packer, GuillotinePacker, SkylinePacker, MaxRectsPacker
+from .stats import FrameStats, FrameTimes
+from .profiler import Profiler
 
 logger.info("Engine is imported")
@@ -0,0 +1,194 @@
+import ctypes
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+from OpenGL import GL
+
+from .texture import Texture
+
+logger = logging.getLogger(__name__)
+
+FLOATS_PER_VERTEX = 4  # x, y, u, v
+VERTEX_STRIDE = FLOATS_PER_VERTEX * np.dtype(np.float32).itemsize
+VERTICES_PER_QUAD = 4
+
+# corners of a quad in drawing order: top-left, top-right, bottom-right, bottom-left
+_CORNER_X = np.array([False, True, True, False])
+_CORNER_Y = np.array([False, False, True, True])
+
+
+@dataclass(slots=True)
+class Mesh:
+    """
+    Pre-built quads sharing one texture, e.g. all tiles of a chunk from a tileset atlas
+
+    vertices are in local coordinates, offset is given when mesh is queued
+    """
+    vertices: np.ndarray  # shape (quads, 4, 4): (x, y, u, v) of every corner
+    tex_id: int
+
+    def __len__(self):
+        return len(self.vertices)
+
+
+def quad_vertices(rects: np.ndarray, uvs: np.ndarray) -> np.ndarray:
+    """
+    Builds corners of quads
+
+    :param rects: shape (quads, 4): x, y, width, height
+    :param uvs: shape (quads, 4): u0, v0, u1, v1
+    :return: shape (quads, 4, 4): (x, y, u, v) of every corner
+    """
+    x, y, w, h = (c[:, None] for c in rects.T)
+    u0, v0, u1, v1 = (c[:, None] for c in uvs.T)
+    vertices = np.empty((len(rects), VERTICES_PER_QUAD, FLOATS_PER_VERTEX), dtype=np.float32)
+    vertices[:, :, 0] = np.where(_CORNER_X, x + w, x)
+    vertices[:, :, 1] = np.where(_CORNER_Y, y + h, y)
+    vertices[:, :, 2] = np.where(_CORNER_X, u1, u0)
+    vertices[:, :, 3] = np.where(_CORNER_Y, v1, v0)
+    return vertices
+
+
+def build_vertices(quads: list[tuple[tuple[float, float, float, float], Texture, int]]
+                   ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Packs quads into one contiguous vertex array
+
+    Returns vertices of shape (len(quads), 4, 4) with (x, y, u, v) per vertex, tex_id and layer of every quad
+
+    :type quads: list[tuple[tuple[float, float, float, float], Texture, int]]
+    :rtype: tuple[np.ndarray, np.ndarray, np.ndarray]
+    """
+    # float64, so tex_id and layer survive the trip exactly
+    data = np.array([(*rect, *tex.uv, tex.tex_id, layer) for rect, tex, layer in quads],
+                    dtype=np.float64).reshape(-1, 10)
+    vertices = quad_vertices(data[:, :4], data[:, 4:8])
+    return vertices, data[:, 8].astype(np.int64), data[:, 9]
+
+
+def build_mesh_vertices(meshes: list[tuple[Mesh, tuple[float, float], int]]
+                        ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Same as build_vertices, but for queued meshes
+
+    :type meshes: list[tuple[Mesh, tuple[float, float], int]]
+    :rtype: tuple[np.ndarray, np.ndarray, np.ndarray]
+    """
+    counts = [len(mesh) for mesh, _, _ in meshes]
+    vertices = np.concatenate([mesh.vertices for mesh, _, _ in meshes])
+    offsets = np.repeat(np.array([offset for _, offset, _ in meshes], dtype=np.float32), counts, axis=0)
+    vertices[:, :, :2] += offsets[:, None, :]
+    tex_ids = np.repeat(np.array([mesh.tex_id for mesh, _, _ in meshes], dtype=np.int64), counts)
+    layers = np.repeat(np.array([layer for _, _, layer in meshes], dtype=np.float64), counts)
+    return vertices, tex_ids, layers
+
+
+def sort_order(tex_ids: np.ndarray, layers: np.ndarray) -> np.ndarray:
+    """
+    Stable order of quads by (layer, tex_id)
+
+    Layers keep painter's order between each other, inside of a layer quads are grouped by texture.
+    Layers may be fractional, to draw something right above a layer, without relying on texture ids
+
+    :type tex_ids: np.ndarray
+    :type layers: np.ndarray
+    :rtype: np.ndarray
+    """
+    return np.lexsort((tex_ids, layers))
+
+
+def count_binds(tex_ids: np.ndarray) -> int:
+    if len(tex_ids) == 0:
+        return 0
+    return int(np.count_nonzero(tex_ids[1:] != tex_ids[:-1])) + 1
+
+
+def texture_runs(tex_ids: np.ndarray) -> list[tuple[int, int, int]]:
+    """
+    Splits quads into runs sharing the same texture
+
+    :type tex_ids: np.ndarray
+    :rtype: list[tuple[tex_id, first quad, quad count]]
+    """
+    starts = np.flatnonzero(tex_ids[1:] != tex_ids[:-1]) + 1
+    starts = np.concatenate(([0], starts))
+    counts = np.diff(np.concatenate((starts, [len(tex_ids)])))
+    return [(int(tex_ids[s]), int(s), int(c)) for s, c in zip(starts, counts)]
+
+
+class SpriteBatch:
+    """
+    Streams all quads of a DrawQueue to the GPU through one vertex buffer
+
+    Vertices are uploaded once per flush and drawn with one glDrawArrays per texture run,
+    instead of eight immediate-mode calls per quad
+    """
+    vbo: int | None
+    capacity: int  # in bytes
+
+    def __init__(self):
+        self.vbo = None
+        self.capacity = 0
+
+    def upload(self, vertices: np.ndarray) -> None:
+        if self.vbo is None:
+            self.vbo = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        if vertices.nbytes > self.capacity:
+            # grow geometrically, so buffer isn't reallocated every time queue gets a bit longer
+            self.capacity = max(vertices.nbytes, self.capacity * 2)
+            logger.debug(f"{self.__class__}: Buffer resized to {self.capacity} bytes")
+        # orphaning old storage, so driver doesn't have to wait until previous draw is finished
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, self.capacity, None, GL.GL_STREAM_DRAW)
+        GL.glBufferSubData(GL.GL_ARRAY_BUFFER, 0, vertices.nbytes, vertices)
+
+    def draw(self, quads: list[tuple[tuple[float, float, float, float], Texture, int]],
+             meshes: list[tuple[Mesh, tuple[float, float], int]] = (), sort: bool = True) -> tuple[int, int]:
+        """
+        Draws quads and meshes, sorted by (layer, tex_id) unless sort is False
+
+        Returns amount of texture binds and amount of binds saved by sorting
+
+        :type quads: list[tuple[tuple[float, float, float, float], Texture, int]]
+        :type meshes: list[tuple[Mesh, tuple[float, float], int]]
+        :type sort: bool
+        :rtype: tuple[int, int]
+        """
+        meshes = [m for m in meshes if len(m[0])]
+        if len(quads) == 0 and len(meshes) == 0:
+            return 0, 0
+
+        parts = []
+        if quads:
+            parts.append(build_vertices(quads))
+        if meshes:
+            parts.append(build_mesh_vertices(meshes))
+        vertices, tex_ids, layers = (np.concatenate(p) for p in zip(*parts))
+        unsorted_binds = count_binds(tex_ids)
+        if sort:
+            order = sort_order(tex_ids, layers)
+            vertices = vertices[order]
+            tex_ids = tex_ids[order]
+        runs = texture_runs(tex_ids)
+        self.upload(vertices.reshape(-1, FLOATS_PER_VERTEX))
+
+        GL.glEnable(GL.GL_TEXTURE_2D)
+        GL.glEnable(GL.GL_BLEND)
+        GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
+        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glEnableClientState(GL.GL_TEXTURE_COORD_ARRAY)
+        GL.glVertexPointer(2, GL.GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(0))
+        GL.glTexCoordPointer(2, GL.GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(2 * 4))
+
+        for tex_id, first, count in runs:
+            GL.glBindTexture(GL.GL_TEXTURE_2D, tex_id)
+            GL.glDrawArrays(GL.GL_QUADS, first * VERTICES_PER_QUAD, count * VERTICES_PER_QUAD)
+
+        GL.glDisableClientState(GL.GL_TEXTURE_COORD_ARRAY)
+        GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        GL.glDisable(GL.GL_TEXTURE_2D)
+        GL.glDisable(GL.GL_BLEND)
+
+        return len(runs), unsorted_binds - len(runs)
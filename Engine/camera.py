@@ -2,8 +2,12 @@ from typing import Iterable
 
 from .GLUtils import DrawQueue
 from .object import Obj
+from .spatial import SpatialIndex
+from .stats import FrameStats
 from .vec2 import Vec2
 
+stats = FrameStats()
+
 
 class Camera(Obj):
     width: int
@@ -34,7 +38,7 @@ class Camera(Obj):
 
     @property
     def world_size(self):
-        return self.size / self.zoom
+        return self.size.div_num(self.zoom)
 
     @property
     def width(self):
@@ -67,14 +71,36 @@ class Camera(Obj):
         """
         return (world_pos - self.global_pos + self.world_size / 2) * self.zoom
 
-    def render(self, to_render: Obj | Iterable[Obj]):
+    def sees(self, x0: float, y0: float, x1: float, y1: float) -> bool:
+        """Whether world rect intersects view, culled and drawn objects are counted in FrameStats"""
+        ul, dr = self.world_up_left, self.world_down_right
+        if x1 < ul.x or x0 > dr.x or y1 < ul.y or y0 > dr.y:
+            stats.add("culled")
+            return False
+        stats.add("drawn")
+        return True
+
+    def sees_screen(self, x0: float, y0: float, x1: float, y1: float) -> bool:
+        """Same as sees(), for rect in screen pixels (e.g. of ui)"""
+        if x1 < 0 or x0 > self.size.x or y1 < 0 or y0 > self.size.y:
+            stats.add("culled")
+            return False
+        stats.add("drawn")
+        return True
+
+    def render(self, to_render: Obj | SpatialIndex | Iterable[Obj]):
+        """Renders objects, from index only ones which may be visible"""
         self.update()
         if isinstance(to_render, Obj):
             to_render = (to_render,)
+        elif isinstance(to_render, SpatialIndex):
+            to_render = to_render.query_rect(self.world_up_left, self.world_down_right, self.zoom)
         for obj in to_render:
             obj.render(self)
         self.queue()
 
     def update(self):
-        self.world_up_left = self.global_pos - self.world_size / 2
-        self.world_down_right = self.screen_to_world(self.size)
+        pos = self.global_pos
+        half = self.world_size.div_num(2)
+        self.world_up_left = pos.sub_vec(half)
+        self.world_down_right = pos.add_vec(half)
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from .vec2 import Vec2, ConstVec2
+
+if TYPE_CHECKING:
+    from .camera import Camera
+    from .spatial import SpatialIndex
+
+
+class Obj:
+    """
+    Node of scene graph, positioned relative to its parent
+
+    Global position is cached, and recomputed only after pos or parent of the object or of any of its
+    ancestors were assigned. pos must be assigned to be seen, changing its x or y in place isn't tracked.
+    Vec2 given as pos on creation is copied, as `obj.pos += d` changes the vector in place
+    """
+    _parent: Obj | None
+    _pos: Vec2
+    _global_pos: ConstVec2
+    _dirty: bool = True  # global position has to be recomputed, if set, it's also set on all descendants
+    children: set[Obj]
+    _index: SpatialIndex | None = None
+
+    def __init__(self, pos: Vec2 | tuple = None, parent: Obj = None):
+        if isinstance(pos, Vec2):
+            self.pos = pos.copy()
+        elif hasattr(pos, '__len__') and len(pos) == 2:
+            self.pos = Vec2.from_tuple(pos)
+        elif pos is None:
+            self.pos = Vec2()
+        else:
+            raise TypeError("pos can only be Vec2, tuple or not provided")
+        self.children = set()
+        self._parent = None
+        self.parent = parent
+
+    @property
+    def pos(self) -> Vec2:
+        return self._pos
+
+    @pos.setter
+    def pos(self, pos: Vec2):
+        self._pos = pos
+        self.invalidate()
+
+    @property
+    def global_pos(self) -> Vec2:
+        """Position in the world, shouldn't be changed in place"""
+        if self._dirty:
+            pos = self.compute_global_pos()
+            self._global_pos = ConstVec2(pos.x, pos.y)
+            self._dirty = False
+        return self._global_pos
+
+    def compute_global_pos(self) -> Vec2:
+        if self.parent:
+            return self.pos.add_vec(self.parent.global_pos)
+        return self.pos
+
+    def invalidate(self):
+        """Marks global position of object and all of its descendants to be recomputed"""
+        if self._dirty:
+            # descendants of dirty object are already dirty
+            return
+        self._dirty = True
+        if self._index is not None:
+            self._index.notify_moved(self)
+        for child in self.children:
+            child.invalidate()
+
+    @property
+    def reach(self) -> tuple[float, float] | None:
+        """
+        How far from global_pos object draws: (in world units, in screen pixels), None if it isn't known
+
+        Used by SpatialIndex, objects without reach are never culled by it
+        """
+        return None
+
+    def bounds(self, zoom: float = 1) -> tuple[float, float, float, float]:
+        """Drawn rect at given zoom: (x0, y0, x1, y1) in world units"""
+        pos = self.global_pos
+        return pos.x, pos.y, pos.x, pos.y
+
+    def in_view(self, cam: Camera, x0: float, y0: float, x1: float, y1: float) -> bool:
+        """Whether rect drawn by object is seen by camera, objects skip drawing when it's not"""
+        return cam.sees(x0, y0, x1, y1)
+
+    @property
+    def parent(self):
+        return self._parent
+
+    @parent.setter
+    def parent(self, new_parent: Obj):
+        if self._parent is not None:
+            self._parent.children.remove(self)
+        self._parent = new_parent
+        self.invalidate()
+        if new_parent is not None:
+            if self in new_parent.children:
+                raise RuntimeError('wtf, how???')
+            new_parent.children.add(self)
+
+    def remove(self):
+        if self._parent is not None:
+            self._parent.children.remove(self)
+        if self._index is not None:
+            self._index.remove(self)
+
+    def render(self, *args, **kwargs):
+        pass
+
+    def update(self):
+        pass
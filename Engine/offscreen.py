@@ -0,0 +1,30 @@
+"""
+Offscreen OpenGL context through EGL, without X or Wayland, for benchmarks and tests
+
+Not imported by Engine itself, as EGL isn't available everywhere. PyOpenGL must be set up for it before
+OpenGL is first imported: PYOPENGL_PLATFORM=egl, and EGL_PLATFORM=surfaceless for machines without a display
+"""
+import ctypes
+
+from OpenGL import EGL, GL
+
+
+def egl_context(width: int, height: int):
+    """Makes current an OpenGL context with offscreen surface of given size"""
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    if not EGL.eglInitialize(display, ctypes.pointer(EGL.EGLint()), ctypes.pointer(EGL.EGLint())):
+        raise RuntimeError("Can't initialize EGL display")
+    attributes = (EGL.EGLint * 13)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                                   EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8,
+                                   EGL.EGL_ALPHA_SIZE, 8, EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT, EGL.EGL_NONE)
+    config, count = EGL.EGLConfig(), EGL.EGLint()
+    if not EGL.eglChooseConfig(display, attributes, ctypes.pointer(config), 1, ctypes.pointer(count)) \
+            or not count.value:
+        raise RuntimeError("No EGL config with OpenGL and pbuffer support")
+    surface = EGL.eglCreatePbufferSurface(display, config,
+                                          (EGL.EGLint * 5)(EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE))
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+    if not EGL.eglMakeCurrent(display, surface, surface, context):
+        raise RuntimeError("Can't make EGL context current")
+    GL.glViewport(0, 0, width, height)
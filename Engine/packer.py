@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from collections import deque
 from typing import Optional
-from dataclasses import dataclass
 
 from .rect import Rect
 from .vec2 import Vec2
@@ -12,6 +13,7 @@ from .vec2 import Vec2
 
 class Packer(ABC):
     """Abstract base class for texture packing algorithms"""
+    bulk_sort = "height"  # order pack_many packs in by default
 
     def __init__(self, atlas_size: Vec2):
         self.atlas_size = atlas_size
@@ -34,6 +36,38 @@ class Packer(ABC):
         """
         pass
 
+    @abstractmethod
+    def free(self, rect: Rect) -> None:
+        """
+        Returns space of packed rectangle back to packer.
+        Packers may reclaim it only partially, reset() reclaims everything.
+        """
+        pass
+
+    def pack_many(self, sizes: list[Vec2], sort: str = None) -> list[Optional[Vec2]]:
+        """
+        Packs rectangles from biggest to smallest, which fills atlas tighter and faster than packing them as they come
+
+        sort: "height", "width", "area" or "none", defaults to bulk_sort of packer
+        Returns positions in order of sizes, None for ones which didn't fit
+        """
+        match sort or self.bulk_sort:
+            case "height":
+                key = lambda i: (sizes[i].y, sizes[i].x)
+            case "width":
+                key = lambda i: (sizes[i].x, sizes[i].y)
+            case "area":
+                key = lambda i: sizes[i].x * sizes[i].y
+            case "none":
+                key = None
+            case _:
+                raise ValueError(f"Unknown sort {sort}, expected height, width, area or none")
+        order = sorted(range(len(sizes)), key=key, reverse=True) if key else range(len(sizes))
+        positions = [None] * len(sizes)
+        for i in order:
+            positions[i] = self.pack(sizes[i])
+        return positions
+
     def reset(self) -> None:
         self._init_packer()
 
@@ -120,22 +154,30 @@ class GuillotinePacker(Packer):
 
                 top, bottom, left, right = rect1.adjacent_to(rect2)
 
-                if bottom and rect1.size.vy == rect2.size.vy:
+                # rects stacked vertically merge only if they span the same columns, and side by side - same rows
+                same_columns = rect1.pos.x == rect2.pos.x and rect1.size.x == rect2.size.x
+                same_rows = rect1.pos.y == rect2.pos.y and rect1.size.y == rect2.size.y
+                if bottom and same_columns:
                     self.free_rects[i] = Rect(rect1.pos, rect1.size + rect2.size.vy)
-                elif top and rect1.size.vy == rect2.size.vy:
+                elif top and same_columns:
                     self.free_rects[i] = Rect(rect2.pos, rect2.size + rect1.size.vy)
-                elif right and rect1.size.vx == rect2.size.vx:
+                elif right and same_rows:
                     self.free_rects[i] = Rect(rect1.pos, rect1.size + rect2.size.vx)
-                elif left and rect1.size.vx == rect2.size.vx:
+                elif left and same_rows:
                     self.free_rects[i] = Rect(rect2.pos, rect2.size + rect1.size.vx)
                 else:
                     j += 1
                     continue
 
                 self.free_rects.pop(j)
+                rect1 = self.free_rects[i]
                 j = i + 1
             i += 1
 
+    def free(self, rect: Rect) -> None:
+        """Freed rect is merged with free space around it on next placement"""
+        self.free_rects.append(Rect(rect.pos.copy(), rect.size.copy()))
+
     def _find_best_fit(self, size: Vec2) -> Optional[Rect]:
         """Find the best free rectangle to place the given size using best area fit heuristic"""
         best_rect = None
@@ -168,134 +210,233 @@ class GuillotinePacker(Packer):
 class SkylinePacker(Packer):
     r"""
     Note: this one is optimized for fixed height, so for analogy to hold, imagine city on a wall
-    UPD: i am probably wrong about it, but i am halfway through rewriting it so... yeah ¯\_(ツ)_/¯
-    """
-
-    @dataclass(slots=True)
-    class Segment:
-        y: int
-        height: int
-        width: int
-        @property
-        def end(self) -> int:
-            return self.y + self.height
 
-    skyline: list[Segment]
+    Skyline goes along y: segment i covers ys[i] <= y < ys[i + 1] (last one till atlas height),
+    everything left of xs[i] is taken. Rect is placed at the lowest x among its positions, found by a linear
+    scan over segments (see _find_best_fit). Segments it covers are found with bisect and replaced in place
+    """
+    bulk_sort = "width"  # skyline grows along x, so that's the side to sort by
+    ys: list[int]  # starts of segments, sorted
+    xs: list[int]  # x where free space of segment starts
 
     def _init_packer(self) -> None:
-        # Skyline is stored as list of (y, height, width) tuples
-        # Each entry represents a vertical segment at y=height from x to x+width
-        self.skyline: list[SkylinePacker.Segment] = [self.Segment(0, self.atlas_size.y, 0)]
-        self.used_rects: list[Rect] = []
+        self.ys = [0]
+        self.xs = [0]
 
     def add_used_rect(self, rect: Rect) -> None:
-        self.used_rects.append(rect)
-        self._update_skyline(rect)
+        y0, y1 = int(rect.pos.y), int(rect.end.y)
+        i, j = self._split(y0), self._split(y1)
+        end = int(rect.end.x)
+        for k in range(i, j):
+            self.xs[k] = max(self.xs[k], end)
+        self._merge(i, j)
+
+    def free(self, rect: Rect) -> None:
+        """Only reclaims parts of rect which are on the skyline, everything left of skyline is considered taken"""
+        y0, y1 = int(rect.pos.y), int(rect.end.y)
+        x0, x1 = int(rect.pos.x), int(rect.end.x)
+        i, j = self._split(y0), self._split(y1)
+        for k in range(i, j):
+            if self.xs[k] == x1:
+                self.xs[k] = x0
+        self._merge(i, j)
+
+    def _split(self, y: int) -> int:
+        """Makes segment start at y (if it is inside of atlas), returns its index"""
+        ys = self.ys
+        i = bisect_left(ys, y)
+        if i < len(ys) and ys[i] == y or y >= self.atlas_size.y:
+            return i
+        ys.insert(i, y)
+        self.xs.insert(i, self.xs[i - 1])
+        return i
+
+    def _merge(self, i: int, j: int) -> None:
+        """Merges segments with same x around range i..j"""
+        ys, xs = self.ys, self.xs
+        k = min(j, len(ys) - 1)
+        while k > 0 and k >= i:
+            if xs[k] == xs[k - 1]:
+                del ys[k], xs[k]
+            k -= 1
+
+    def _find_best_fit(self, w: int, h: int) -> Optional[tuple[int, int]]:
+        """
+        Position with lowest x, then least area wasted under rect
 
-    def _update_skyline(self, rect: Rect) -> None:
-        """Update skyline with a new rectangle"""
-        y_start = int(rect.pos.y)
-        y_end = int(rect.end.y)
-        width_new = int(rect.end.x)
+        Not a bisect lookup: candidates are starts of segments, scanned once, and both ends of covered span
+        only move forward, so the scan is linear in amount of segments. Wasted area is summed only for
+        candidates which can still win, which is cheaper than keeping prefix sums of it for every segment
+        """
+        ys, xs = self.ys, self.xs
+        n = len(ys)
+        max_x, max_y = self.atlas_size.x - w, self.atlas_size.y - h
+        best_pos = None
+        best_score = None
+        # segments i..j-1 are covered by rect placed at ys[i], both ends only move forward,
+        # so max x of covered segments is kept in a deque of decreasing xs
+        window = deque()
+        j = 0
+        for i in range(n):
+            y = ys[i]
+            if y > max_y:
+                break
+            while j < n and ys[j] < y + h:
+                while window and xs[window[-1]] <= xs[j]:
+                    window.pop()
+                window.append(j)
+                j += 1
+            while window[0] < i:
+                window.popleft()
+            x = xs[window[0]]
+            if x > max_x or best_score is not None and x > best_score[0]:
+                continue
+            waste = sum((x - xs[k]) * ((ys[k + 1] if k + 1 < j else y + h) - ys[k]) for k in range(i, j))
+            score = x, waste
+            if best_score is None or score < best_score:
+                best_score = score
+                best_pos = x, y
+        return best_pos
 
-        new_skyline: list[SkylinePacker.Segment] = []
+    def pack(self, size: Vec2) -> Optional[Vec2]:
+        """Pack a rectangle using bottom-left heuristic"""
+        w, h = int(size.x), int(size.y)
+        if w <= 0 or h <= 0:
+            # takes no space, same as in other packers
+            return Vec2(0, 0)
+        position = self._find_best_fit(w, h)
+        if position is None:
+            return None
+        x, y = position
+        i, j = self._split(y), self._split(y + h)
+        # every covered segment is raised to the right edge of rect
+        self.ys[i:j] = [y]
+        self.xs[i:j] = [x + w]
+        self._merge(i, i + 1)
+        return Vec2(x, y)
 
-        # Subdivide affected segments and move affected parts
-        for seg in self.skyline:
 
-            if seg.end <= y_start or seg.y >= y_end:
-                # No overlap, skip
-                new_skyline.append(seg)
-                continue
+class MaxRectsPacker(Packer):
+    """
+    MaxRects packing algorithm.
+    Free space is kept as maximal (possibly overlapping) free rectangles, so nothing is lost to guillotine cuts.
 
-            # Overlap
-            # Part before rectangle
-            if seg.y < y_start:
-                new_skyline.append(self.Segment(seg.y, y_start - seg.y, seg.width))
-
-            # Overlapping part - raise to rectangle's top if higher
-            overlap_start = max(seg.y, y_start)
-            overlap_end = min(seg.end, y_end)
-            overlap_width = overlap_end - overlap_start
-            new_skyline.append(self.Segment(overlap_start, overlap_width, max(seg.width, width_new)))
-
-            # Part after rectangle
-            if seg.end > y_end:
-                new_skyline.append(self.Segment(y_end, seg.end - y_end, seg.width))
-
-        # Merge segments w/ same height
-        merged_skyline: list[SkylinePacker.Segment] = [new_skyline.pop(0)]
-        for seg in new_skyline:
-            prev = merged_skyline[-1]
-            if prev.width == seg.width:
-                assert prev.end == seg.y
-                merged_skyline[-1].height = prev.height + seg.height
-            else:
-                merged_skyline.append(seg)
-
-        self.skyline = merged_skyline
-
-    def _find_best_fit(self, size: Vec2) -> Optional[Vec2]:
-        """Find the best position to place the rectangle using bottom-left heuristic"""
-        best_pos = None
-        best_waste = float('inf')
+    Free rectangles are kept sorted by width, so finding a fit skips every rectangle which is too narrow,
+    and after a split only new rectangles are checked for containment, instead of every pair.
 
-        for i, seg in enumerate(self.skyline):
-            potential_pos = Vec2(seg.width, seg.y)
-            if self.atlas_size.lt_or(potential_pos + size):
-                # There isn't a way to fit it in this segment
-                continue
-            if seg.height >= size.y:
-                waste = self._calculate_waste(seg, size.y)
-                if waste < best_waste:
-                    best_waste = waste
-                    best_pos = potential_pos
-                continue
+    Heuristics (score of placement, lower is better):
+        "bssf" - best short side fit: smallest leftover on the shorter side
+        "blsf" - best long side fit: smallest leftover on the longer side
+        "baf"  - best area fit: smallest leftover area
+        "bl"   - bottom left: lowest top edge (smallest y + height), then smallest x
+    """
+    HEURISTICS = ("bssf", "blsf", "baf", "bl")
 
-            # Try to fit by combining segments
-            if i < len(self.skyline) - 1:
-                combined_height = seg.height
-                max_seg_width = seg.width
-                j = i + 1
+    free_rects: list[tuple[int, int, int, int]]  # (width, height, x, y), sorted
 
-                while j < len(self.skyline) and combined_height < size.y:
-                    seg2 = self.skyline[j]
-                    max_seg_width = max(max_seg_width, seg2.width)
-                    combined_height += seg2.height
-                    j += 1
+    def __init__(self, atlas_size: Vec2, heuristic: str = "bssf"):
+        if heuristic not in self.HEURISTICS:
+            raise ValueError(f"Unknown heuristic {heuristic}, expected one of {self.HEURISTICS}")
+        self.heuristic = heuristic
+        super().__init__(atlas_size)
 
-                potential_pos = Vec2(max_seg_width, seg.y)
-                if combined_height >= size.y and potential_pos + size <= self.atlas_size:
-                    waste = self._calculate_waste_for_combined(i, j, max_seg_width, size.y, combined_height)
-                    if waste < best_waste:
-                        best_waste = waste
-                        best_pos = potential_pos
+    def _init_packer(self) -> None:
+        self.free_rects = [(int(self.atlas_size.x), int(self.atlas_size.y), 0, 0)]
+
+    def add_used_rect(self, rect: Rect) -> None:
+        self._place(int(rect.pos.x), int(rect.pos.y), int(rect.size.x), int(rect.size.y))
 
+    def free(self, rect: Rect) -> None:
+        """Freed rect becomes a free rect of its own, it isn't merged with free space around it"""
+        freed = fw, fh, fx, fy = int(rect.size.x), int(rect.size.y), int(rect.pos.x), int(rect.pos.y)
+        if self._contained(freed, self.free_rects):
+            return
+        fx1, fy1 = fx + fw, fy + fh
+        self.free_rects = [(w, h, x, y) for w, h, x, y in self.free_rects
+                           if not (fx <= x and fy <= y and x + w <= fx1 and y + h <= fy1)]
+        insort(self.free_rects, freed)
+
+    def _score(self, fw: int, fh: int, fx: int, fy: int, w: int, h: int) -> tuple[int, int]:
+        match self.heuristic:
+            case "bssf":
+                short, long = sorted((fw - w, fh - h))
+                return short, long
+            case "blsf":
+                short, long = sorted((fw - w, fh - h))
+                return long, short
+            case "baf":
+                return fw * fh - w * h, min(fw - w, fh - h)
+            case _:
+                return fy + h, fx
+
+    def _find_best_fit(self, w: int, h: int) -> Optional[tuple[int, int]]:
+        best_pos = None
+        best_score = None
+        free_rects = self.free_rects
+        # every rect before this one is narrower than w
+        for i in range(bisect_left(free_rects, (w,)), len(free_rects)):
+            fw, fh, fx, fy = free_rects[i]
+            if fh < h:
+                continue
+            score = self._score(fw, fh, fx, fy, w, h)
+            if best_score is None or score < best_score:
+                best_score = score
+                best_pos = fx, fy
         return best_pos
 
-    def pack(self, size: Vec2) -> Optional[Vec2]:
-        """Pack a rectangle using bottom-left heuristic"""
-        position = self._find_best_fit(size)
-        if position is None:
-            return None
+    def _place(self, x: int, y: int, w: int, h: int) -> None:
+        """Splits every free rect intersecting placed rect into maximal rects around it"""
+        x1, y1 = x + w, y + h
+        kept = []
+        touching = []  # kept rects, which touch placed rect
+        split = []
+        for free in self.free_rects:
+            fw, fh, fx, fy = free
+            fx1, fy1 = fx + fw, fy + fh
+            if fx >= x1 or fx1 <= x or fy >= y1 or fy1 <= y:
+                kept.append(free)
+                if fx <= x1 and fx1 >= x and fy <= y1 and fy1 >= y:
+                    touching.append(free)
+                continue
+            if fx < x:
+                split.append((x - fx, fh, fx, fy))
+            if fx1 > x1:
+                split.append((fx1 - x1, fh, x1, fy))
+            if fy < y:
+                split.append((fw, y - fy, fx, fy))
+            if fy1 > y1:
+                split.append((fw, fy1 - y1, fx, y1))
+        if not split:
+            self.free_rects = kept
+            return
 
-        self.add_used_rect(Rect(position, size))
-        return position
+        # free rects never contain each other, so only new rects have to be checked:
+        # kept rect can't be inside of a new one, since every new rect is inside of a rect it was split from.
+        # New rect touches placed rect, so it can only be inside of kept rect which touches it too
+        split.sort(key=lambda r: r[0] * r[1], reverse=True)
+        new = []
+        for rect in split:
+            if not (self._contained(rect, new) or self._contained(rect, touching)):
+                new.append(rect)
+        for rect in new:
+            insort(kept, rect)
+        self.free_rects = kept
 
     @staticmethod
-    def _calculate_waste(segment: Segment, height) -> int:
-        return segment.height - height + segment.width * 16
-
-    def _calculate_waste_for_combined(self, start_idx: int, end_idx: int,
-                                      x: int, height: int, total_height: int) -> int:
-        """Calculate waste for placing rectangle across multiple segments"""
-        height_waste = total_height - height
-        area_waste = 0
-
-        for i in range(start_idx, end_idx - 1):
-            seg = self.skyline[i]
-            area_waste += (x - seg.width) * seg.height
-        seg = self.skyline[end_idx - 1]
-        area_waste += (x - seg.width) * (seg.height - height_waste)
-
-        return area_waste + height_waste + x
+    def _contained(inner: tuple[int, int, int, int], rects: list[tuple[int, int, int, int]]) -> bool:
+        """Whether inner rect is inside of any of rects"""
+        iw, ih, ix, iy = inner
+        ix1, iy1 = ix + iw, iy + ih
+        for ow, oh, ox, oy in rects:
+            if ox <= ix and oy <= iy and ix1 <= ox + ow and iy1 <= oy + oh:
+                return True
+        return False
+
+    def pack(self, size: Vec2) -> Optional[Vec2]:
+        """Pack a rectangle using chosen heuristic"""
+        w, h = int(size.x), int(size.y)
+        position = self._find_best_fit(w, h)
+        if position is None:
+            return None
+        self._place(*position, w, h)
+        return Vec2(*position)
@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from functools import wraps
+
+from .singleton import singleton
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FRAMES = 600
+PROFILE_DIR = "Profiles"
+
+
+class _NullScope:
+    """Scope of disabled profiler, shared, so disabled scopes don't allocate anything"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+NULL_SCOPE = _NullScope()
+
+
+class Scope:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.record(self.name, self.start, time.perf_counter_ns() - self.start)
+        return None
+
+
+@singleton
+class Profiler:
+    """
+    Timings of named scopes, kept for the last PROFILE_FRAMES frames, exported as Chrome trace JSON
+    (open it in chrome://tracing or ui.perfetto.dev)
+
+    Scopes are either blocks: `with profiler.scope("flip"): ...`, or functions: `@profiler.profile()`.
+    Nested scopes make a hierarchy, scopes of worker threads (e.g. chunk bakes) are on tracks of their threads.
+    Disabled by default: then a scope is a shared no-op, and a profiled function only checks a flag
+    """
+    enabled: bool
+    frames: deque[list[tuple[str, int, int, int]]]  # per frame: (name, start ns, duration ns, thread id)
+    events: list[tuple[str, int, int, int]]  # of current frame
+
+    def __init__(self, frames: int = PROFILE_FRAMES):
+        self.enabled = False
+        self.frames = deque(maxlen=frames)
+        self.events = []
+        self._frame_start = time.perf_counter_ns()
+
+    def scope(self, name: str) -> Scope | _NullScope:
+        if not self.enabled:
+            return NULL_SCOPE
+        return Scope(self, name)
+
+    def profile(self, name: str = None):
+        """Decorator, which profiles every call of function, under its qualified name by default"""
+        def decorator(func):
+            scope_name = name or func.__qualname__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(scope_name, start, time.perf_counter_ns() - start)
+
+            return wrapper
+
+        return decorator
+
+    def record(self, name: str, start: int, duration: int) -> None:
+        # list.append is atomic, so worker threads record without a lock
+        self.events.append((name, start, duration, threading.get_ident()))
+
+    def end_frame(self) -> None:
+        """Closes frame, it is recorded as a scope too, should be called once per frame"""
+        now = time.perf_counter_ns()
+        if self.enabled:
+            self.events.append(("frame", self._frame_start, now - self._frame_start, threading.get_ident()))
+            self.frames.append(self.events)
+            self.events = []
+        self._frame_start = now
+
+    def clear(self) -> None:
+        self.frames.clear()
+        self.events = []
+
+    def last_frame(self) -> dict[str, float]:
+        """Total ms of every scope in last recorded frame, slowest first"""
+        if not self.frames:
+            return {}
+        totals = defaultdict(int)
+        for name, _, duration, _ in self.frames[-1]:
+            totals[name] += duration
+        return {name: duration / 1e6 for name, duration in sorted(totals.items(), key=lambda item: -item[1])}
+
+    def chrome_trace(self) -> dict:
+        """Recorded frames in Chrome trace event format"""
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "ts": start / 1e3, "dur": duration / 1e3, "pid": pid, "tid": tid}
+                  for frame in self.frames for name, start, duration, tid in frame]
+        threads = {thread.ident: thread.name for thread in threading.enumerate()}
+        for tid in {event["tid"] for event in events}:
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                           "args": {"name": threads.get(tid, str(tid))}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path: str | os.PathLike = None) -> str:
+        """
+        Writes recorded frames as Chrome trace JSON, by default into PROFILE_DIR, named by current time
+
+        :rtype: str
+        """
+        if path is None:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, time.strftime("profile-%Y%m%d-%H%M%S.json"))
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        logger.info(f"Profile of {len(self.frames)} frames is written to {path}")
+        return str(path)
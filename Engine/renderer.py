@@ -0,0 +1,108 @@
+import pygame
+
+from .object import Obj
+from .vec2 import Vec2
+from . import GLUtils
+from .TextRenderUtils import TRenderer
+from .camera import Camera
+from .texture import Texture
+
+TRender = TRenderer()
+
+class Renderer(Obj):
+    src: pygame.Surface
+    tex: int
+    size: Vec2
+
+    def __init__(self, img: pygame.Surface, pos=None, *, tex: Texture=None, parent=None, scalable=True, pivot=(0.5, 0.5), scale=(1, 1),
+                 layer=0):
+        super().__init__(pos=pos, parent=parent)
+        self.src = img.convert_alpha()
+        self.tex = tex if tex is not None else GLUtils.surf_to_tex_default(self.src)
+        self.size = Vec2.from_tuple(self.src.get_size())
+        self.scalable = scalable
+        self.pivot = pivot
+        self.scale = scale
+        self.layer = layer
+
+    def render(self, cam: Camera):
+        size = (self.size if self.scalable else self.size.div_num(cam.zoom)) * self.scale
+        pos = self.global_pos.sub_vec(size * self.pivot)
+        if not self.in_view(cam, pos.x, pos.y, pos.x + size.x, pos.y + size.y):
+            return
+        cam.queue += (pos.x, pos.y, size.x, size.y), self.tex, self.layer
+
+    @property
+    def reach(self):
+        size = self.size * self.scale
+        px, py = self.pivot
+        reach = max(abs(size.x) * max(px, 1 - px), abs(size.y) * max(py, 1 - py))
+        return (reach, 0) if self.scalable else (0, reach)
+
+    def bounds(self, zoom: float = 1):
+        size = (self.size if self.scalable else self.size.div_num(zoom)) * self.scale
+        pos = self.global_pos.sub_vec(size * self.pivot)
+        return pos.x, pos.y, pos.x + size.x, pos.y + size.y
+
+
+class TextRenderer(Renderer):
+    def __init__(self, text: str, font: pygame.font.Font, fore, back,
+                 pos=None, *, parent=None, scalable=True, pivot=(0.5, 0.5), scale=(1, 1), layer=0, glyphs=False):
+        """
+        glyphs: lay text out from glyph atlas of font instead of rendering whole string into a texture,
+        so changing text costs no texture work, for often changing text (see TextRenderUtils.GlyphAtlas)
+
+        :type text: str
+        :type font: pygame.font.Font
+        :type fore: tuple[int, int, int] | tuple[int, int, int, int]
+        :type back: tuple[int, int, int] | tuple[int, int, int, int]
+        :type pos: Vec2 | None
+        :type parent: Obj
+        :type pivot: tuple[float, float]
+        :type scale: tuple[float, float]
+        :type layer: int
+        :type glyphs: bool
+        """
+        self.font = font
+        self.fore = fore
+        self.back = back
+        self._text = text
+        self.glyphs = TRender.glyph_atlas(font, fore) if glyphs else None
+        # with glyphs, texture is only a patch of background color, text is drawn by glyph atlas
+        text = self.glyphs.solid(back) if glyphs else TRender.prerender_text(text, font, fore, back)
+        super().__init__(text.surf, pos=pos, tex=text, parent=parent, scalable=scalable, pivot=pivot, scale=scale,
+                         layer=layer)
+        if glyphs:
+            self.size = Vec2.from_tuple(self.glyphs.box_size(self._text))
+
+    def render(self, cam: Camera):
+        if self.glyphs is None:
+            # texture may be evicted from text cache between frames, so it is looked up every time
+            self.tex = TRender.prerender_text(self._text, self.font, self.fore, self.back)
+            super().render(cam)
+            return
+        x0, y0, x1, y1 = self.bounds(cam.zoom)
+        if not self.in_view(cam, x0, y0, x1, y1):
+            return
+        width, height = self.glyphs.box_size(self._text)
+        self.glyphs.queue(self._text, x0, y0, cam.queue, self.back, self.layer,
+                          ((x1 - x0) / width, (y1 - y0) / height))
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, text):
+        if text == self._text:
+            return
+        self._text = text
+        if self.glyphs is not None:
+            size = self.glyphs.box_size(text)
+        else:
+            text = TRender.prerender_text(text, self.font, self.fore, self.back)
+            self.src = text.surf
+            self.tex = text
+            size = self.src.get_size()
+        if size != self.size.tuple:
+            self.size = Vec2.from_tuple(size)
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from math import floor, hypot
+from typing import Iterable
+
+from .object import Obj
+from .vec2 import Vec2
+
+CELL_SIZE = 256  # in world units
+
+
+class SpatialIndex:
+    """
+    Uniform grid of objects, bucketed by their global position, for view and mouse picking queries
+
+    Objects draw around their position up to obj.reach: (world units, screen pixels), so queries are widened
+    by the biggest reach in the index. Objects with reach None (e.g. maps, which cull themselves) can't be bucketed
+    and are returned by every view query.
+    Objects report changes of their global position themselves (see Obj.invalidate), moved objects are rebucketed
+    on next query. Reach is read when object is added or moved, call update(obj) if it changes by other means
+    """
+    cell_size: float
+    cells: defaultdict[tuple[int, int], dict[Obj, None]]
+    entries: dict[Obj, tuple[int, int] | None]  # object -> its cell, None for unbounded, in order of adding
+    order: dict[Obj, int]  # object -> sequence number of adding
+    unbounded: dict[Obj, None]
+    moved: set[Obj]
+    world_reach: float
+    screen_reach: float
+
+    def __init__(self, objects: Iterable[Obj] = (), cell_size: float = CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = defaultdict(dict)
+        self.entries = {}
+        self.order = {}
+        self._added = 0
+        self.unbounded = {}
+        self.moved = set()
+        # only grows, so removing objects never makes queries miss anything
+        self.world_reach = 0
+        self.screen_reach = 0
+        for obj in objects:
+            self.add(obj)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, obj: Obj) -> bool:
+        return obj in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def add(self, obj: Obj) -> None:
+        if obj._index is not None:
+            raise ValueError(f"{obj} is already in an index")
+        obj._index = self
+        self.entries[obj] = None
+        self.order[obj] = self._added
+        self._added += 1
+        self._place(obj)
+
+    def remove(self, obj: Obj) -> None:
+        self._unplace(obj)
+        del self.entries[obj]
+        del self.order[obj]
+        self.moved.discard(obj)
+        obj._index = None
+
+    def update(self, obj: Obj) -> None:
+        """Rebuckets object right away, e.g. after its reach changed"""
+        self.moved.discard(obj)
+        self._unplace(obj)
+        self._place(obj)
+
+    def notify_moved(self, obj: Obj) -> None:
+        self.moved.add(obj)
+
+    def cell(self, x: float, y: float) -> tuple[int, int]:
+        return floor(x / self.cell_size), floor(y / self.cell_size)
+
+    def _place(self, obj: Obj) -> None:
+        reach = obj.reach
+        if reach is None:
+            self.unbounded[obj] = None
+            return
+        self.world_reach = max(self.world_reach, reach[0])
+        self.screen_reach = max(self.screen_reach, reach[1])
+        pos = obj.global_pos
+        cell = self.cell(pos.x, pos.y)
+        self.cells[cell][obj] = None
+        self.entries[obj] = cell
+
+    def _unplace(self, obj: Obj) -> None:
+        cell = self.entries[obj]
+        if cell is None:
+            self.unbounded.pop(obj, None)
+            return
+        bucket = self.cells[cell]
+        del bucket[obj]
+        if not bucket:
+            del self.cells[cell]
+        self.entries[obj] = None
+
+    def _flush(self) -> None:
+        while self.moved:
+            obj = self.moved.pop()
+            self._unplace(obj)
+            self._place(obj)
+
+    def _near(self, x0: float, y0: float, x1: float, y1: float) -> list[Obj]:
+        """Bucketed objects with position inside of rect, in order of adding"""
+        (cx0, cy0), (cx1, cy1) = self.cell(x0, y0), self.cell(x1, y1)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) >= len(self.cells):
+            # rect covers more cells than there are occupied, so walking occupied ones is cheaper
+            buckets = (b for (cx, cy), b in self.cells.items() if cx0 <= cx <= cx1 and cy0 <= cy <= cy1)
+        else:
+            cells = self.cells
+            buckets = (cells[c] for c in ((cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1))
+                       if c in cells)
+        found = []
+        for bucket in buckets:
+            for obj in bucket:
+                pos = obj.global_pos
+                if x0 <= pos.x <= x1 and y0 <= pos.y <= y1:
+                    found.append(obj)
+        # keep order objects were added in, since it is the draw order inside of a layer
+        found.sort(key=self.order.__getitem__)
+        return found
+
+    def query_rect(self, up_left: Vec2, down_right: Vec2, zoom: float = 1) -> list[Obj]:
+        """
+        Objects which may draw inside of rect (e.g. view of camera), including unbounded ones, in order of adding
+
+        Result is conservative: objects still cull themselves
+        """
+        self._flush()
+        margin = self.world_reach + self.screen_reach / zoom
+        near = self._near(up_left.x - margin, up_left.y - margin, down_right.x + margin, down_right.y + margin)
+        if not self.unbounded:
+            return near
+        return sorted(near + list(self.unbounded), key=self.order.__getitem__)
+
+    def query_radius(self, center: Vec2, radius: float, zoom: float = 1) -> list[Obj]:
+        """Objects which bounds (at given zoom) intersect circle, e.g. for picking with the mouse"""
+        self._flush()
+        margin = radius + self.world_reach + self.screen_reach / zoom
+        found = []
+        for obj in self._near(center.x - margin, center.y - margin, center.x + margin, center.y + margin):
+            x0, y0, x1, y1 = obj.bounds(zoom)
+            dx = max(x0 - center.x, 0, center.x - x1)
+            dy = max(y0 - center.y, 0, center.y - y1)
+            if hypot(dx, dy) <= radius:
+                found.append(obj)
+        return found
+
+    def query_point(self, point: Vec2, zoom: float = 1) -> list[Obj]:
+        """Objects which bounds (at given zoom) contain point"""
+        return self.query_radius(point, 0, zoom)
@@ -0,0 +1,76 @@
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from .singleton import singleton
+
+
+@singleton
+class FrameStats:
+    """
+    Per-frame counters (quads, binds, etc.)
+
+    Systems add to counters of current frame, and end_frame() moves them to `last`,
+    so anything reading them (debug overlay, benchmarks) sees complete numbers of previous frame
+    """
+    counters: defaultdict[str, int | float]
+    last: dict[str, int | float]
+    frame: int
+
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.last = {}
+        self.frame = 0
+
+    def add(self, name: str, value: int | float = 1) -> None:
+        self.counters[name] += value
+
+    def end_frame(self) -> dict[str, int | float]:
+        self.last = dict(self.counters)
+        self.counters.clear()
+        self.frame += 1
+        return self.last
+
+    def __getitem__(self, name: str) -> int | float:
+        return self.last.get(name, 0)
+
+
+class FrameTimes:
+    """
+    Ring buffer of recent frame times in ms, for percentiles and graphs
+
+    Unlike averaged fps, shows single hitches, e.g. ones caused by chunk bakes while panning
+    """
+    times: np.ndarray
+    count: int  # frames recorded in total
+
+    def __init__(self, capacity: int = 600):
+        self.times = np.zeros(capacity)
+        self.count = 0
+        self._last_tick: float | None = None
+
+    def __len__(self):
+        return min(self.count, len(self.times))
+
+    def tick(self) -> None:
+        """Records time since previous tick, should be called once per frame"""
+        now = time.perf_counter()
+        if self._last_tick is not None:
+            self.add((now - self._last_tick) * 1e3)
+        self._last_tick = now
+
+    def add(self, ms: float) -> None:
+        self.times[self.count % len(self.times)] = ms
+        self.count += 1
+
+    def recent(self, n: int = None) -> np.ndarray:
+        """Last n (all by default) frame times, oldest first"""
+        n = len(self) if n is None else min(n, len(self))
+        end = self.count % len(self.times)
+        return np.roll(self.times, -end)[len(self.times) - n:]
+
+    def percentiles(self, q: tuple[float, ...] = (50, 95, 99)) -> tuple[float, ...]:
+        if not len(self):
+            return (0.0,) * len(q)
+        return tuple(np.percentile(self.recent(), q).tolist())
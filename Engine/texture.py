@@ -7,34 +7,49 @@ from .rect import Rect
 from .vec2 import Vec2
 from . import GLUtils
 from .packer import Packer, GuillotinePacker
+from .profiler import Profiler
+
+profiler = Profiler()
 
 
 @dataclass(slots=True)
 class Texture:
     tex_id: int
-    surf: pygame.Surface
+    surf: pygame.Surface  # for subtextures of atlas it may be a view into atlas surface, see TextureAtlas
     uv: tuple[float, float, float, float]  # u0, v0, u1, v1
     pos: Vec2
     size: Vec2
 
 
 class TextureAtlas:
+    """
+    Packed subtextures are drawn into surface of atlas, and changed region is uploaded to GPU with a single call:
+    at the end of pack(), or, with pack(flush=False), for all atlases at once, before next DrawQueue is drawn
+    """
+    dirty_atlases: set["TextureAtlas"] = set()  # atlases with changes which are not uploaded yet
+
     def __init__(self,
                  surface: pygame.Surface,
                  subtextures: dict[Any, tuple[Vec2, Vec2]] = None,
-                 packer: Type[Packer] = GuillotinePacker):
+                 packer: Type[Packer] = GuillotinePacker,
+                 keep_copies: bool = True):
         """
         subtextures: dict[name: str, tuple[Vec2: Start, Vec2: Size]]
         packer: can be any implementation of .packer.Packer, defaults to Guillotine
+        keep_copies: whether packed textures keep a copy of their surface, otherwise their surf is a view into
+        surface of atlas, which saves memory, but changes if that part of atlas is packed again
 
         :type packer: Type[Packer]
         :type surface:
         :type subtextures dict[Any, tuple[Vec2, Vec2]]
+        :type keep_copies: bool
         """
         self.surface = surface
         self.tex = GLUtils.surface_to_texture(surface)
         self.size = Vec2.from_tuple(surface.get_size())
         self.textures: dict[Any, Texture] = {}
+        self.keep_copies = keep_copies
+        self.dirty: pygame.Rect | None = None  # region of surface changed since last upload
 
         self.packer = packer(self.size)
 
@@ -43,7 +58,7 @@ class TextureAtlas:
 
     @classmethod
     def create_empty(cls, size: Vec2, *args, **kwargs):
-        return cls(pygame.Surface(size.int_tuple), *args, **kwargs)
+        return cls(pygame.Surface(size.int_tuple, pygame.SRCALPHA), *args, **kwargs)
 
     def calculate_uv(self, xy: Vec2) -> Vec2:
         return xy / self.size
@@ -75,37 +90,40 @@ class TextureAtlas:
 
             self.textures[name] = texture
 
-    def pack(self, textures: dict[Any, pygame.Surface]) -> dict[Any, Texture]:
+    @profiler.profile()
+    def pack(self, textures: dict[Any, pygame.Surface], flush: bool = True) -> dict[Any, Texture]:
         """
         Packs new subtextures from dict
 
-        !!! This changes the texture itself
+        !!! This changes the texture itself, when flush is False, not until flush_all() is called
 
         Returns dict of successfully packed textures
 
         :type textures: dict[Any, pygame.Surface]
+        :type flush: bool
         :rtype: tuple[dict[Any, Texture], dict[Any, pygame.Surface]]
         """
         packed = {}
 
-        for name, surf in textures.items():
-            size = Vec2.from_tuple(surf.get_size())
-            position = self.packer.pack(size)
-
+        sizes = [Vec2.from_tuple(surf.get_size()) for surf in textures.values()]
+        positions = self.packer.pack_many(sizes)
+        for (name, surf), size, position in zip(textures.items(), sizes, positions):
             if position is None:
                 # No space available
                 continue
 
-            # Update tex and surface
-            self.surface.blit(surf, position.int_tuple)
-            GLUtils.update_texture(self.tex, surf, position)
+            # Update surface, pixels are copied as they are, not blended over what was there before
+            rect = pygame.Rect(position.int_tuple, size.int_tuple)
+            self.surface.fill((0, 0, 0, 0), rect)
+            self.surface.blit(surf, rect, special_flags=pygame.BLEND_RGBA_ADD)
+            self.dirty = self.dirty.union(rect) if self.dirty else rect
 
             u0, v0 = self.calculate_uv(position)
             u1, v1 = self.calculate_uv(position + size)
 
             texture = Texture(
                 tex_id=self.tex,
-                surf=surf.copy(),
+                surf=surf.copy() if self.keep_copies else self.surface.subsurface(rect),
                 uv=(u0, v0, u1, v1),
                 pos=position,
                 size=size
@@ -114,8 +132,39 @@ class TextureAtlas:
             self.textures[name] = texture
             packed[name] = texture
 
+        if flush:
+            self.flush()
+        elif self.dirty:
+            TextureAtlas.dirty_atlases.add(self)
         return packed
 
+    @profiler.profile()
+    def flush(self) -> None:
+        """Uploads changed region of surface to texture"""
+        if self.dirty:
+            GLUtils.update_texture(self.tex, self.surface.subsurface(self.dirty), Vec2(self.dirty.x, self.dirty.y))
+            self.dirty = None
+        TextureAtlas.dirty_atlases.discard(self)
+
+    @classmethod
+    def flush_all(cls) -> None:
+        while cls.dirty_atlases:
+            cls.dirty_atlases.pop().flush()
+
+    def remove(self, name: Any) -> None:
+        """Removes subtexture and gives its space back to packer, pixels are left until something is packed there"""
+        texture = self.textures.pop(name)
+        self.packer.free(Rect(texture.pos, texture.size))
+
+    def occupancy(self) -> float:
+        """Fraction of atlas area taken by subtextures"""
+        return sum(t.size.x * t.size.y for t in self.textures.values()) / (self.size.x * self.size.y)
+
+    def delete(self) -> None:
+        """Frees GPU texture of atlas, it must not be used after that"""
+        TextureAtlas.dirty_atlases.discard(self)
+        GLUtils.delete_texture(self.tex)
+
     def __getitem__(self, name: str) -> Texture:
         return self.textures[name]
 
@@ -125,6 +174,26 @@ class TextureAtlas:
     def clear(self) -> None:
         self.textures.clear()
 
+    def reset(self) -> None:
+        """Removes every subtexture, and frees all of atlas space"""
+        self.textures.clear()
+        self.packer.reset()
+
+    def compact(self, flush: bool = True) -> dict[Any, Texture]:
+        """
+        Packs every subtexture again from scratch, so space fragmented by removed ones is reclaimed
+
+        Subtextures get new Texture objects, old ones must not be used after that.
+        Returns dict of repacked textures, ones which didn't fit anymore are removed
+
+        :type flush: bool
+        :rtype: dict[Any, Texture]
+        """
+        # copied first, as surfaces of textures may be views into the atlas, which is about to be overwritten
+        surfaces = {name: texture.surf.copy() for name, texture in self.textures.items()}
+        self.reset()
+        return self.pack(surfaces, flush)
+
     def __iter__(self):
         for name, t in self.textures.items():
             yield name, t
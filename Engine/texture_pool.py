@@ -0,0 +1,104 @@
+import logging
+from collections import OrderedDict
+from typing import Hashable
+
+from OpenGL import GL
+
+from . import GLUtils
+from .stats import FrameStats
+from .texture import Texture
+from .vec2 import Vec2
+
+logger = logging.getLogger(__name__)
+
+stats = FrameStats()
+
+
+class TexturePool:
+    """
+    Reusable texture slots of the same size (e.g. for chunks), kept under a GPU memory budget
+
+    Owners get a slot with acquire(), and mark it as used with touch() every frame they are visible.
+    When budget is reached, slot of least recently visible owner is taken and owner.evict() is called,
+    so it can rebake itself when it is needed again.
+    Owners visible during current frame are never evicted: budget is exceeded instead
+    """
+    slot_size: Vec2
+    budget: int  # in bytes
+    slots: OrderedDict[Hashable, tuple[Texture, int]]  # owner -> (slot, frame it was last used), oldest first
+    free: list[Texture]
+
+    def __init__(self, slot_size: Vec2, budget: int):
+        self.slot_size = slot_size
+        self.budget = budget
+        self.slots = OrderedDict()
+        self.free = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def slot_bytes(self) -> int:
+        return int(self.slot_size.x) * int(self.slot_size.y) * 4
+
+    @property
+    def resident_bytes(self) -> int:
+        return (len(self.slots) + len(self.free)) * self.slot_bytes
+
+    def __contains__(self, owner: Hashable) -> bool:
+        return owner in self.slots
+
+    def touch(self, owner: Hashable) -> bool:
+        """Marks slot of owner as used in this frame, returns whether owner still has a slot"""
+        if owner not in self.slots:
+            return False
+        self.slots[owner] = self.slots[owner][0], stats.frame
+        self.slots.move_to_end(owner)
+        self.hits += 1
+        return True
+
+    def acquire(self, owner: Hashable) -> Texture:
+        """Returns slot of owner, taking a free or least recently used one if owner doesn't have it"""
+        if owner in self.slots:
+            self.touch(owner)
+            return self.slots[owner][0]
+
+        self.misses += 1
+        stats.add("pool_misses")
+        if self.free:
+            slot = self.free.pop()
+        elif self.resident_bytes + self.slot_bytes <= self.budget or not self._evictable():
+            if self.resident_bytes + self.slot_bytes > self.budget:
+                logger.warning(f"{self.__class__}: Budget of {self.budget} bytes exceeded by visible slots")
+            slot = Texture(GLUtils.create_texture(self.slot_size), None, (0, 0, 1, 1), Vec2(0, 0), self.slot_size)
+        else:
+            slot = self._evict()
+
+        self.slots[owner] = slot, stats.frame
+        return slot
+
+    def release(self, owner: Hashable) -> None:
+        """Returns slot of owner to the pool, without calling owner.evict()"""
+        if owner in self.slots:
+            self.free.append(self.slots.pop(owner)[0])
+
+    def _evictable(self) -> bool:
+        return bool(self.slots) and next(iter(self.slots.values()))[1] != stats.frame
+
+    def _evict(self) -> Texture:
+        owner, (slot, _) = self.slots.popitem(last=False)
+        self.evictions += 1
+        stats.add("pool_evictions")
+        owner.evict()
+        return slot
+
+    def trim(self) -> None:
+        """Frees GL textures of unused slots, evicting owners if needed, until pool fits into budget"""
+        while self.resident_bytes > self.budget:
+            if self.free:
+                slot = self.free.pop()
+            elif self._evictable():
+                slot = self._evict()
+            else:
+                break
+            GL.glDeleteTextures([slot.tex_id])
@@ -17,6 +17,7 @@ class Canvas(Obj):
         self.cam = cam
         self.pivot = Vec2.zero
         self.elements: list[UiElement] = []
+        self._size = self.cam.size.copy()
 
     @property
     def size(self):
@@ -24,6 +25,11 @@ class Canvas(Obj):
 
     @screen_render
     def render(self):
+        if self._size != self.cam.size:
+            # elements are positioned relative to size of the screen
+            self._size = self.cam.size.copy()
+            for element in self.children:
+                element.invalidate()
         self.cam.render(self.elements)
 
 
@@ -31,12 +37,13 @@ class UiElement(Obj):
     parent: "Canvas | UiElement"
 
     def __init__(self, parent: "Canvas | UiElement", pos: tuple | Vec2 = (0, 0), size: tuple | Vec2 = (0, 0),
-                 relpos: tuple | Vec2 = (0, 0), pivot: tuple | Vec2 = (0, 0), *args, **kwargs):
+                 relpos: tuple | Vec2 = (0, 0), pivot: tuple | Vec2 = (0, 0), *args,
+                 layer: int = None, **kwargs):
         self.size = Vec2.zero
         self._canvas: Canvas | None = None
         # noinspection PyArgumentList
         super().__init__(pos=pos, parent=parent, *args, **kwargs)
-        self.relpos = Vec2.from_tuple(relpos) if isinstance(relpos, tuple) else relpos
+        self.relpos = Vec2.from_tuple(relpos) if isinstance(relpos, tuple) else relpos.copy()
 
         # checking if size(argument) is non zero and if not, then we override it
         size = Vec2.from_tuple(size) if isinstance(size, tuple) else size
@@ -45,6 +52,11 @@ class UiElement(Obj):
 
         self.pivot = Vec2.from_tuple(pivot) if isinstance(pivot, tuple) else pivot
 
+        # by default elements are drawn on top of their parents
+        if layer is None:
+            layer = parent.layer + 1 if isinstance(parent, UiElement) else 0
+        self.layer = layer
+
     @Obj.parent.setter
     def parent(self, new_parent: "Canvas | UiElement"):
         # noinspection PyUnreachableCode
@@ -74,9 +86,41 @@ class UiElement(Obj):
         for c in self.children:
             c.canvas = self._canvas
 
+    # position of element depends on its relpos and on size and pivot of its parent
+    @property
+    def relpos(self) -> Vec2:
+        return self._relpos
+
+    @relpos.setter
+    def relpos(self, relpos: Vec2):
+        self._relpos = relpos
+        self.invalidate()
+
+    @property
+    def size(self) -> Vec2:
+        return self._size
+
+    @size.setter
+    def size(self, size: Vec2):
+        self._size = size
+        self.invalidate()
+
     @property
-    def global_pos(self):
-        return self.pos + self.parent.global_pos + (self.parent.size * (self.relpos - self.parent.pivot))
+    def pivot(self) -> Vec2:
+        return self._pivot
+
+    @pivot.setter
+    def pivot(self, pivot: Vec2):
+        self._pivot = pivot
+        self.invalidate()
+
+    def in_view(self, cam: Camera, x0: float, y0: float, x1: float, y1: float) -> bool:
+        # ui is positioned on screen, not in the world
+        return cam.sees_screen(x0, y0, x1, y1)
+
+    def compute_global_pos(self) -> Vec2:
+        parent = self.parent
+        return self.pos.add_vec(parent.global_pos).add_vec(parent.size.mul_vec(self.relpos.sub_vec(parent.pivot)))
 
 
 class UiRenderer(UiElement, Renderer):
@@ -97,7 +141,7 @@ class UiProgressBar(UiElement):
         super().__init__(parent=parent, pos=pos, size=size, relpos=relpos, pivot=pivot)
         self._progress = 0
         self.back = UiRenderer(img=img_back, tex=tex_back, size=size, parent=self)
-        self.bar = UiRenderer(img=img_bar, tex=tex_bar, size=size, parent=self)
+        self.bar = UiRenderer(img=img_bar, tex=tex_bar, size=size, parent=self, layer=self.back.layer + 1)
         self.progress = progress
 
     def render(self, *args, **kwargs):
@@ -29,62 +29,124 @@ class Vec2:
 
     def __add__(self, other: "Vec2 | tuple | (int | float)"):
         if isinstance(other, Vec2):
-            return Vec2(x=self.x + other.x, y=self.y + other.y)
+            return Vec2(self.x + other.x, self.y + other.y)
         elif isinstance(other, tuple):
-            return Vec2(x=self.x + other[0], y=self.y + other[1])
+            return Vec2(self.x + other[0], self.y + other[1])
         elif isinstance(other, (int, float)):
-            return Vec2(x=self.x + other, y=self.y + other)
+            return Vec2(self.x + other, self.y + other)
         else:
             raise TypeError(f"Can't add {type(other)} to {type(self)}")
 
     def __sub__(self, other: "Vec2 | tuple | (int | float)"):
         if isinstance(other, Vec2):
-            return Vec2(x=self.x - other.x, y=self.y - other.y)
+            return Vec2(self.x - other.x, self.y - other.y)
         elif isinstance(other, tuple):
-            return Vec2(x=self.x - other[0], y=self.y - other[1])
+            return Vec2(self.x - other[0], self.y - other[1])
         elif isinstance(other, (int, float)):
-            return Vec2(x=self.x - other, y=self.y - other)
+            return Vec2(self.x - other, self.y - other)
         else:
             raise TypeError(f"Can't sub {type(other)} from {type(self)}")
 
     def __mul__(self, other: "int | tuple | float | Vec2"):
         if isinstance(other, Vec2):
-            return Vec2(x=self.x * other.x, y=self.y * other.y)
+            return Vec2(self.x * other.x, self.y * other.y)
         elif isinstance(other, tuple):
-            return Vec2(x=self.x * other[0], y=self.y * other[1])
+            return Vec2(self.x * other[0], self.y * other[1])
         elif isinstance(other, (int, float)):
-            return Vec2(x=self.x * other, y=self.y * other)
+            return Vec2(self.x * other, self.y * other)
         else:
             raise TypeError(f"Can't multiply {type(self)} by {type(other)}")
 
     def __truediv__(self, other: "tuple | int | float | Vec2"):
         if isinstance(other, Vec2):
-            return Vec2(x=self.x / other.x, y=self.y / other.y)
+            return Vec2(self.x / other.x, self.y / other.y)
         elif isinstance(other, tuple):
-            return Vec2(x=self.x / other[0], y=self.y / other[1])
+            return Vec2(self.x / other[0], self.y / other[1])
         elif isinstance(other, (int, float)):
-            return Vec2(x=self.x / other, y=self.y / other)
+            return Vec2(self.x / other, self.y / other)
         else:
             raise TypeError(f"Can't divide {type(self)} by {type(other)}")
 
     def __floordiv__(self, other: "int | tuple | float | Vec2"):
         if isinstance(other, Vec2):
-            return Vec2(x=self.x // other.x, y=self.y // other.y)
+            return Vec2(self.x // other.x, self.y // other.y)
         elif isinstance(other, tuple):
-            return Vec2(x=self.x // other[0], y=self.y // other[1])
+            return Vec2(self.x // other[0], self.y // other[1])
         elif isinstance(other, (int, float)):
-            return Vec2(x=self.x // other, y=self.y // other)
+            return Vec2(self.x // other, self.y // other)
         else:
             raise TypeError(f"Can't divide {type(self)} by {type(other)}")
 
+    # in-place operators change vector itself, so it must not be shared: e.g. `pos += d` on self.pos of an object
+    def __iadd__(self, other: "Vec2 | tuple | (int | float)"):
+        if isinstance(other, Vec2):
+            self.x += other.x
+            self.y += other.y
+        elif isinstance(other, tuple):
+            self.x += other[0]
+            self.y += other[1]
+        elif isinstance(other, (int, float)):
+            self.x += other
+            self.y += other
+        else:
+            raise TypeError(f"Can't add {type(other)} to {type(self)}")
+        return self
+
+    def __isub__(self, other: "Vec2 | tuple | (int | float)"):
+        if isinstance(other, Vec2):
+            self.x -= other.x
+            self.y -= other.y
+        elif isinstance(other, tuple):
+            self.x -= other[0]
+            self.y -= other[1]
+        elif isinstance(other, (int, float)):
+            self.x -= other
+            self.y -= other
+        else:
+            raise TypeError(f"Can't sub {type(other)} from {type(self)}")
+        return self
+
+    def __imul__(self, other: "int | tuple | float | Vec2"):
+        if isinstance(other, Vec2):
+            self.x *= other.x
+            self.y *= other.y
+        elif isinstance(other, tuple):
+            self.x *= other[0]
+            self.y *= other[1]
+        elif isinstance(other, (int, float)):
+            self.x *= other
+            self.y *= other
+        else:
+            raise TypeError(f"Can't multiply {type(self)} by {type(other)}")
+        return self
+
+    # same as operators, but only for one type of argument, skipping type checks
+    def add_vec(self, other: "Vec2") -> "Vec2":
+        return Vec2(self.x + other.x, self.y + other.y)
+
+    def sub_vec(self, other: "Vec2") -> "Vec2":
+        return Vec2(self.x - other.x, self.y - other.y)
+
+    def mul_vec(self, other: "Vec2") -> "Vec2":
+        return Vec2(self.x * other.x, self.y * other.y)
+
+    def mul_tuple(self, other: tuple) -> "Vec2":
+        return Vec2(self.x * other[0], self.y * other[1])
+
+    def mul_num(self, other: int | float) -> "Vec2":
+        return Vec2(self.x * other, self.y * other)
+
+    def div_num(self, other: int | float) -> "Vec2":
+        return Vec2(self.x / other, self.y / other)
+
     def __floor__(self):
-        return Vec2(x=floor(self.x), y=floor(self.y))
+        return Vec2(floor(self.x), floor(self.y))
 
     def __ceil__(self):
-        return Vec2(x=ceil(self.x), y=ceil(self.y))
+        return Vec2(ceil(self.x), ceil(self.y))
 
     def __round__(self):
-        return Vec2(x=int(self.x), y=int(self.y))
+        return Vec2(int(self.x), int(self.y))
 
     def __eq__(self, other: "Vec2"):
         if not isinstance(other, Vec2): return False
@@ -139,11 +201,11 @@ class Vec2:
         return self.x < other.x or self.y < other.y
 
     def __neg__(self):
-        return Vec2(x=-self.x, y=-self.y)
+        return Vec2(-self.x, -self.y)
 
     def __mod__(self, other: int):
         if isinstance(other, int):
-            return Vec2(x=self.x % other, y=self.y % other)
+            return Vec2(self.x % other, self.y % other)
         else:
             raise TypeError(f"Can't mod {type(self)} by {type(other)}")
 
@@ -156,7 +218,7 @@ class Vec2:
         return sqrt(self.x ** 2 + self.y ** 2)
 
     def copy(self):
-        return Vec2(x=self.x, y=self.y)
+        return Vec2(self.x, self.y)
 
     def __iter__(self):
         yield self.x
@@ -164,11 +226,11 @@ class Vec2:
 
     @property
     def vx(self):
-        return Vec2(x=self.x)
+        return Vec2(self.x, 0)
 
     @property
     def vy(self):
-        return Vec2(y=self.y)
+        return Vec2(0, self.y)
 
     def max(self, other: "Vec2"):
         return Vec2(max(self.x, other.x), max(self.y, other.y))
@@ -177,10 +239,30 @@ class Vec2:
         return Vec2(min(self.x, other.x), min(self.y, other.y))
 
 
+class ConstVec2(Vec2):
+    """
+    Vec2 that can't be changed, used for presets like Vec2.zero
+
+    In-place operators return new Vec2 instead, so `v = Vec2.zero; v += d` leaves the preset as it was
+    """
+    __slots__ = ()
+
+    def __init__(self, x: int | float = 0, y: int | float = 0):
+        object.__setattr__(self, "x", x)
+        object.__setattr__(self, "y", y)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} can't be changed, make a copy() of it")
+
+    __iadd__ = Vec2.__add__
+    __isub__ = Vec2.__sub__
+    __imul__ = Vec2.__mul__
+
+
 # init presets
-Vec2.zero = Vec2(0, 0)
-Vec2.one = Vec2(1, 1)
-Vec2.up = Vec2(0, -1)
-Vec2.down = Vec2(0, 1)
-Vec2.left = Vec2(-1, 0)
-Vec2.right = Vec2(1, 0)
+Vec2.zero = ConstVec2(0, 0)
+Vec2.one = ConstVec2(1, 1)
+Vec2.up = ConstVec2(0, -1)
+Vec2.down = ConstVec2(0, 1)
+Vec2.left = ConstVec2(-1, 0)
+Vec2.right = ConstVec2(1, 0)
@@ -1,30 +1,247 @@
-import io
-import json
 import os
 
-from Engine import Obj
-from Tilemap import TileMap, Tileset
+import numpy as np
+
+from Engine import Obj, Camera, GLUtils, Texture, TexturePool, FrameStats, Profiler
+from Tilemap import TileMap, Tileset, ChunkMode, Chunk, baker, chunk_range, occupied_in
+from MapFile import MapFile, EXTENSION
 from Engine import Vec2
 
+# map layers are drawn below everything else, which by default is on layer 0
+MAP_LAYER = -100
+
+stats = FrameStats()
+profiler = Profiler()
+
+
+def composite(layers: list[np.ndarray]) -> np.ndarray:
+    """
+    Alpha-composites RGBA pixels of layers over each other, first one is at the bottom
+
+    :type layers: list[np.ndarray]
+    :rtype: np.ndarray
+    """
+    out = layers[0].copy()
+    for src in layers[1:]:
+        alpha = src[..., 3]
+        opaque = alpha == 255
+        out[opaque] = src[opaque]
+        partial = (alpha != 0) & ~opaque
+        if not partial.any():
+            continue
+        # straight alpha "over": a = as + ad * (1 - as), rgb = (rgbs * as + rgbd * ad * (1 - as)) / a
+        s = src[partial].astype(np.float32) / 255
+        d = out[partial].astype(np.float32) / 255
+        sa, da = s[:, 3:], d[:, 3:] * (1 - s[:, 3:])
+        a = sa + da
+        rgb = (s[:, :3] * sa + d[:, :3] * da) / a
+        out[partial] = np.rint(np.concatenate((rgb, a), axis=1) * 255).astype(np.uint8)
+    return out
+
+
+class MapChunk(Obj):
+    """
+    All layers of a map at one chunk position, baked into one texture
+
+    Texture is rebaked only when one of the layer chunks under it changes (see Chunk.version),
+    until then the old one is drawn
+    """
+    cpos: tuple[int, int]
+    cached_tex: Texture | None
+    versions: tuple[int, ...] | None  # versions of layer chunks texture was baked from
+    layers: list[Chunk]  # chunks of layers with tiles at this position, bottom first, see update_layers
+    parent: "Map"
+
+    def __init__(self, cpos: tuple[int, int], pos, parent: "Map"):
+        super().__init__(pos=pos, parent=parent)
+        self.cpos = cpos
+        self.size = parent.maps[0].chunk_size
+        self.cached_tex = None
+        self.versions = None
+        self._baking = None
+        self.layers = []
+        self._missing = None
+        self.update_layers()
+
+    def update_layers(self) -> None:
+        """
+        Resolves layer chunks, main thread only: creating a chunk writes into its map.
+        Only maps without a chunk here are checked again, as editing them may add one
+        """
+        if self._missing is not None and not any(m.occupied[self.cpos] for m in self._missing):
+            return
+        self.layers = []
+        self._missing = []
+        for m in self.parent.maps:
+            if (chunk := m.chunk(*self.cpos)) is None:
+                self._missing.append(m)
+            else:
+                self.layers.append(chunk)
+
+    @property
+    def pool(self) -> TexturePool:
+        return self.parent.maps[0].pool
+
+    @property
+    def layer(self) -> int:
+        return self.parent.maps[0].layer
+
+    @property
+    def cached_valid(self) -> bool:
+        return self.cached_tex is not None and self.versions == tuple(c.version for c in self.layers)
+
+    @property
+    def is_empty(self) -> bool:
+        for chunk in self.layers:
+            if not chunk.empty_valid:
+                chunk.check_empty()
+        return all(c.is_empty for c in self.layers)
+
+    def snapshot(self) -> tuple[list[tuple[Chunk, np.ndarray, np.ndarray]]]:
+        """Arguments of bake_pixels, taken on the main thread: inputs of every non-empty layer"""
+        self._baking = tuple(c.version for c in self.layers)
+        if self.is_empty:  # also brings is_empty of layers up to date
+            return [],
+        return [(c, *c.inputs()) for c in self.layers if not c.is_empty],
+
+    @profiler.profile()
+    def bake_pixels(self, layers: list[tuple[Chunk, np.ndarray, np.ndarray]]) -> np.ndarray:
+        """RGBA pixels of all layers composited from a snapshot, safe to call from worker threads"""
+        if not layers:
+            # everything was erased since bake was requested
+            return np.zeros((int(self.size.y), int(self.size.x), 4), dtype=np.uint8)
+        return composite([chunk.bake_pixels(ids, masks) for chunk, ids, masks in layers])
+
+    @profiler.profile()
+    def upload(self, pixels: np.ndarray):
+        self.cached_tex = self.pool.acquire(self)
+        GLUtils.update_texture_data(self.cached_tex.tex_id, pixels)
+        self.versions = self._baking
+        stats.add("chunk_bakes")
+
+    @profiler.profile()
+    def cache(self):
+        """Bakes chunk right away, on the calling thread"""
+        self.upload(self.bake_pixels(*self.snapshot()))
+
+    def evict(self):
+        """Called by pool when texture of this chunk is given to another one"""
+        self.cached_tex = None
+        self.versions = None
+
+    def render(self, cam: Camera):
+        if self.is_empty:
+            return
+        pos = self.global_pos
+        if pos.gt_or(cam.world_down_right) or pos.add_vec(self.size).lt_or(cam.world_up_left):
+            return
+        if self.cached_tex is not None and self.pool.touch(self):
+            cam.queue += (pos.x, pos.y, self.size.x, self.size.y), self.cached_tex, self.layer
+            if not self.cached_valid:
+                baker.request(self)
+            return
+        baker.request(self)
+        # placeholder while composite is being baked
+        for chunk in self.layers:
+            if not chunk.is_empty:
+                chunk.render_mesh(cam, pos)
+
 
 class Map(Obj):
     maps: list[TileMap]
+    flatten: bool
+    chunks: dict[tuple[int, int], MapChunk]  # composites of all layers, created on first use
 
-    def __init__(self, maps, *, pos=None, parent=None):
+    def __init__(self, maps, *, pos=None, parent=None, flatten: bool = False):
+        """
+        flatten: draw all layers as one texture per chunk, instead of one texture per chunk of every layer.
+                 Layers must be of the same size and tile size, and in ChunkMode.BAKED
+        """
         super().__init__(pos=pos, parent=parent)
         self.maps = maps
+        self.flatten = flatten
+        self.chunks = {}
+        self._checked = False
+
+    def check_flatten(self):
+        """Checks that layers can be flattened, called on first render"""
+        first = self.maps[0]
+        for m in self.maps:
+            if m.size != first.size or m.tile_size != first.tile_size or m.pos != first.pos:
+                raise ValueError(f"{self.__class__}: Only layers of the same size, tile size and position"
+                                 f" can be flattened")
+            if m.mode is not ChunkMode.BAKED:
+                raise ValueError(f"{self.__class__}: Only layers in {ChunkMode.BAKED} can be flattened")
+        self._checked = True
+
+    @property
+    def occupied(self) -> np.ndarray:
+        """[cx][cy] -> whether any layer has tiles there"""
+        return np.logical_or.reduce([m.occupied for m in self.maps])
+
+    def chunk(self, cx: int, cy: int) -> MapChunk | None:
+        """Composite chunk at chunk coordinates, created on first call. None if no layer has tiles there"""
+        chunk = self.chunks.get((cx, cy))
+        if chunk is not None:
+            chunk.update_layers()
+        elif any(m.occupied[cx, cy] for m in self.maps):
+            first = self.maps[0]
+            chunk = MapChunk((cx, cy), first.pos + first.chunk_size * Vec2(cx, cy), self)
+            self.chunks[cx, cy] = chunk
+        return chunk
+
+    def visible_chunks(self, cam, margin: int = 0) -> list[MapChunk]:
+        first = self.maps[0]
+        xs, ys = chunk_range(cam, first.global_pos, first.chunk_size, first.chunk_count, margin)
+        return [self.chunk(cx, cy) for cx, cy in occupied_in(self.occupied, xs, ys)]
 
     @classmethod
-    def from_folder(cls, folder: str | os.PathLike, tileset: Tileset, *, parent=None):
-        with open(folder + "/info.json") as f:
-            info: dict = json.load(f)
-        mp = cls([], pos=-Vec2.from_tuple(info.get("offset", (0, 0))), parent=parent)
-        info["mapping"] = {int(k): v for k, v in info["mapping"].items()}
-        for m in info["layers"]:
-            with open(f"{folder}/{info["name"]}_{m}.png", "rb") as f:
-                mp.maps.append(TileMap.from_image(io.BytesIO(f.read()), tileset, info["mapping"], parent=mp))
+    def from_map_file(cls, map_file: MapFile, tileset: Tileset, *, parent=None,
+                      mode: ChunkMode = ChunkMode.BAKED, flatten: bool = False):
+        mp = cls([], pos=-Vec2.from_tuple(map_file.offset), parent=parent, flatten=flatten)
+        for i, tiles in enumerate(map_file.layers.values()):
+            mp.maps.append(TileMap(map_file.width, map_file.height, tileset, grid=tiles, mapping=map_file.mapping,
+                                   parent=mp, layer=MAP_LAYER + i, mode=mode))
         return mp
 
+    @classmethod
+    def from_folder(cls, folder: str | os.PathLike, tileset: Tileset, *, parent=None,
+                    mode: ChunkMode = ChunkMode.BAKED, flatten: bool = False):
+        """Loads map from folder with info.json and PNG per layer"""
+        return cls.from_map_file(MapFile.from_folder(folder), tileset, parent=parent, mode=mode, flatten=flatten)
+
+    @classmethod
+    def from_file(cls, path: str | os.PathLike, tileset: Tileset, *, parent=None,
+                  mode: ChunkMode = ChunkMode.BAKED, flatten: bool = False):
+        """Loads map from a map file made by MapFile.convert, see MapFile.py"""
+        return cls.from_map_file(MapFile.open(path), tileset, parent=parent, mode=mode, flatten=flatten)
+
+    @classmethod
+    def load(cls, folder: str | os.PathLike, tileset: Tileset, *, parent=None,
+             mode: ChunkMode = ChunkMode.BAKED, flatten: bool = False):
+        """
+        Loads map from <folder>/<name>.amap if it exists and is newer than the rest of the folder,
+        otherwise decodes the folder, see from_folder
+        """
+        path = os.path.join(folder, os.path.basename(os.path.normpath(folder)) + EXTENSION)
+        if os.path.exists(path) and all(os.path.getmtime(path) >= os.path.getmtime(os.path.join(folder, name))
+                                        for name in os.listdir(folder) if name.endswith((".json", ".png"))):
+            return cls.from_file(path, tileset, parent=parent, mode=mode, flatten=flatten)
+        return cls.from_folder(folder, tileset, parent=parent, mode=mode, flatten=flatten)
+
+    @profiler.profile()
     def render(self, cam):
-        for m in self.maps:
-            m.render(cam)
+        if not self.flatten or not self.maps:
+            for m in self.maps:
+                m.render(cam)
+            return
+
+        if not self._checked:
+            self.check_flatten()
+        baker.upload_ready()
+        for chunk in self.visible_chunks(cam):
+            chunk.render(cam)
+        # baking nearby chunks in advance
+        for chunk in self.visible_chunks(cam, 2):
+            if not chunk.is_empty and not chunk.cached_valid:
+                baker.request(chunk)
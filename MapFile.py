@@ -0,0 +1,145 @@
+"""
+Binary map container, loaded through numpy.memmap instead of decoding PNGs
+
+Layout (little-endian):
+    header      MAGIC, VERSION, layer count, mapping count, width, height, offset x, offset y, table size
+    name        u16 length + utf-8
+    mapping     per entry: u16 map id, u16 length + utf-8 tile name
+    layers      per layer: u16 length + utf-8 layer name, u64 offset of its tiles
+    tiles       per layer: width * height uint16 map ids, indexed [x][y], every layer starts at ALIGN
+
+Layers are aligned to pages, so processes running the same map share them
+
+Usage: python MapFile.py [Data/Maps/<name> ...] converts folders (all of Data/Maps by default) to <folder>/<name>.amap
+"""
+import io
+import json
+import logging
+import os
+import struct
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"AMAP"
+VERSION = 1
+ALIGN = 4096
+EXTENSION = ".amap"
+
+_HEADER = struct.Struct("<4sHHHxxIIiiI")
+_U16 = struct.Struct("<H")
+_OFFSET = struct.Struct("<Q")
+TILE_DTYPE = np.dtype("<u2")
+
+
+@dataclass
+class MapFile:
+    name: str
+    width: int
+    height: int
+    offset: tuple[int, int]
+    mapping: dict[int, str]
+    layers: dict[str, np.ndarray]  # layer name -> map ids [x][y], bottom layer first
+
+    @classmethod
+    def open(cls, path: str | os.PathLike) -> "MapFile":
+        """
+        Maps layers of file into memory, without reading them
+
+        Layers are copy-on-write: changing them doesn't change the file, and only changed pages get copied
+        """
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) != _HEADER.size or header[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a map file")
+            _, version, layer_count, mapping_count, width, height, ox, oy, table_size = _HEADER.unpack(header)
+            if version != VERSION:
+                raise ValueError(f"{path}: Unsupported map file version {version}, expected {VERSION}")
+            data = f.read(table_size)
+
+        pos = 0
+        name, pos = _read_str(data, pos)
+        mapping = {}
+        for _ in range(mapping_count):
+            (map_id,), pos = _U16.unpack_from(data, pos), pos + _U16.size
+            mapping[map_id], pos = _read_str(data, pos)
+        layers = {}
+        for _ in range(layer_count):
+            layer, pos = _read_str(data, pos)
+            (start,), pos = _OFFSET.unpack_from(data, pos), pos + _OFFSET.size
+            tiles = np.memmap(path, dtype=TILE_DTYPE, mode="c", offset=start, shape=(width, height))
+            # plain view, so slicing it into chunks skips memmap bookkeeping
+            layers[layer] = tiles.view(np.ndarray)
+        return cls(name, width, height, (ox, oy), mapping, layers)
+
+    @classmethod
+    def from_folder(cls, folder: str | os.PathLike) -> "MapFile":
+        """Reads map from folder with info.json and palette PNG per layer"""
+        with open(f"{folder}/info.json") as f:
+            info: dict = json.load(f)
+        layers = {}
+        for m in info["layers"]:
+            with open(f"{folder}/{info["name"]}_{m}.png", "rb") as f:
+                img = Image.open(io.BytesIO(f.read()))
+            if img.mode != 'P':
+                raise ValueError(f"{folder}: Layer {m} must be in palette mode")
+            layers[m] = np.ascontiguousarray(np.asarray(img, dtype=np.uint16).T)
+        width, height = next(iter(layers.values())).shape if layers else (0, 0)
+        return cls(info["name"], width, height, tuple(info.get("offset", (0, 0))),
+                   {int(k): v for k, v in info["mapping"].items()}, layers)
+
+    def save(self, path: str | os.PathLike) -> None:
+        table = bytearray(_pack_str(self.name))
+        for map_id, tile in self.mapping.items():
+            table += _U16.pack(map_id) + _pack_str(tile)
+        table_size = len(table) + sum(len(_pack_str(m)) + _OFFSET.size for m in self.layers)
+        layer_bytes = self.width * self.height * TILE_DTYPE.itemsize
+        start = _align(_HEADER.size + table_size)
+        for i, m in enumerate(self.layers):
+            table += _pack_str(m) + _OFFSET.pack(start + i * _align(layer_bytes))
+
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(self.layers), len(self.mapping),
+                                 self.width, self.height, *self.offset, len(table)))
+            f.write(table)
+            for i, tiles in enumerate(self.layers.values()):
+                if tiles.shape != (self.width, self.height):
+                    raise ValueError(f"Layer of shape {tiles.shape} doesn't match size {self.width, self.height}")
+                f.seek(start + i * _align(layer_bytes))
+                f.write(np.ascontiguousarray(tiles, dtype=TILE_DTYPE).tobytes())
+            f.truncate(start + len(self.layers) * _align(layer_bytes))
+
+
+def _align(n: int) -> int:
+    return -(-n // ALIGN) * ALIGN
+
+
+def _pack_str(s: str) -> bytes:
+    b = s.encode()
+    return _U16.pack(len(b)) + b
+
+
+def _read_str(data: bytes, pos: int) -> tuple[str, int]:
+    (length,) = _U16.unpack_from(data, pos)
+    pos += _U16.size
+    return data[pos:pos + length].decode(), pos + length
+
+
+def convert(folder: str | os.PathLike, path: str | os.PathLike = None) -> str:
+    """Converts map folder to a map file, by default stored in the folder itself as <name>.amap"""
+    mf = MapFile.from_folder(folder)
+    path = path or os.path.join(folder, mf.name + EXTENSION)
+    mf.save(path)
+    logger.info(f"Converted {folder} to {path}")
+    return path
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    folders = sys.argv[1:] or [f.path for f in os.scandir("Data/Maps") if f.is_dir()]
+    for folder in folders:
+        print(convert(folder))
@@ -0,0 +1,83 @@
+"""
+Fills chunk bake cache (see Tilemap.BakeCache) for whole maps in advance, so they open without baking
+
+Cache is read by client when BAKE_CACHE environment variable is set, and by bench_render.py with --bake-cache
+
+Usage: python Prebake.py [Data/Maps/<name> ...] [--tileset PATH] [--cache DIR] [--workers N]
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pygame
+
+from MapFile import MapFile
+from Tilemap import Tileset, TileMap, BakeCache, BAKE_CACHE_DIR, BAKE_WORKERS, CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+_cache: BakeCache
+_tileset: tuple[np.ndarray, np.ndarray, bytes]  # pixels, slots, digest
+
+
+def _init_worker(path: str, pixels: np.ndarray, slots: np.ndarray, digest: bytes):
+    global _cache, _tileset
+    _cache = BakeCache(path)
+    _tileset = pixels, slots, digest
+
+
+def _bake_chunk(cells: tuple[np.ndarray, np.ndarray]) -> bool:
+    """Bakes chunk into cache, returns whether it was baked or already cached"""
+    ids, masks = cells
+    pixels, slots, digest = _tileset
+    if os.path.exists(_cache.file(_cache.key(ids, masks, digest, pixels.shape[1]))):
+        return False
+    _cache.bake(ids, masks, pixels, slots, digest, (CHUNK_SIZE, CHUNK_SIZE))
+    return True
+
+
+def chunk_cells(map_file: MapFile, tileset: Tileset):
+    """Tile ids and neighbour masks of every non-empty chunk of every layer"""
+    for tiles in map_file.layers.values():
+        layer = TileMap(map_file.width, map_file.height, tileset, grid=tiles, mapping=map_file.mapping)
+        for cx, cy in np.argwhere(layer.occupied).tolist():
+            chunk = layer.chunk(cx, cy)
+            yield layer.remap[chunk.tiles], chunk.masks.copy()
+
+
+def prebake(folder: str | os.PathLike, tileset: Tileset, cache: str | os.PathLike = BAKE_CACHE_DIR,
+            workers: int = BAKE_WORKERS) -> tuple[int, int]:
+    """Returns amount of chunks baked and amount of chunks which were already cached"""
+    map_file = MapFile.from_folder(folder)
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(cache, tileset.pixels, tileset.slots, tileset.digest)) as pool:
+        results = list(pool.map(_bake_chunk, chunk_cells(map_file, tileset), chunksize=16))
+    return sum(results), len(results) - sum(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("folders", nargs="*", help="map folders, all of Data/Maps by default")
+    parser.add_argument("--tileset", default="Assets/Tiles/Tileset.png")
+    parser.add_argument("--cache", default=BAKE_CACHE_DIR)
+    parser.add_argument("--workers", type=int, default=BAKE_WORKERS)
+    args = parser.parse_args()
+
+    # tileset is loaded through pygame, which needs a display for convert_alpha
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    tileset = Tileset().load_set(args.tileset, atlas=False)
+
+    for folder in args.folders or [f.path for f in os.scandir("Data/Maps") if f.is_dir()]:
+        start = time.perf_counter()
+        baked, cached = prebake(folder, tileset, args.cache, args.workers)
+        print(f"{folder}: {baked} chunks baked, {cached} already cached in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,9 +1,15 @@
+import hashlib
 import io
 import json
 import logging
 import os
-from math import ceil
+import struct
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import Enum, auto
+from math import ceil, floor, log2
 
+import numpy as np
 import pygame
 from OpenGL.GL import glDeleteTextures
 from PIL import Image
@@ -12,11 +18,53 @@ from Engine import Camera
 from Engine import GLUtils
 from Engine import Obj
 from Engine import Vec2
+from Engine import Texture, TextureAtlas, Mesh, TexturePool, FrameStats, Profiler
+from Engine.batch import quad_vertices
 
 CHUNK_SIZE = 32
+# neighbour masks are computed in bands of this many columns, so temporary arrays stay small on huge maps
+MASK_BAND = 1024
+# GPU memory for baked chunks, shared by all TileMaps with the same tile size
+CHUNK_BUDGET = 256 * 2 ** 20
+# threads composing pixels of chunks in background
+BAKE_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+# baked chunks uploaded to GPU per frame, the rest waits for next frames
+UPLOADS_PER_FRAME = 4
+# where baked chunks are cached between launches, see BakeCache and Prebake.py
+BAKE_CACHE_DIR = "Data/Cache/Chunks"
+# zoomed out views draw regions of 2 ** level x 2 ** level chunks, downsampled into one chunk sized texture
+LOD_LEVELS = 2
 
 logger = logging.getLogger(__name__)
 
+stats = FrameStats()
+profiler = Profiler()
+
+_pools: dict[int, TexturePool] = {}
+
+
+def chunk_pool(tile_size: int) -> TexturePool:
+    """Default pool for textures of baked chunks"""
+    if tile_size not in _pools:
+        _pools[tile_size] = TexturePool(Vec2(tile_size, tile_size) * CHUNK_SIZE, CHUNK_BUDGET)
+    return _pools[tile_size]
+
+
+class ChunkMode(Enum):
+    # each chunk is baked into its own texture on CPU
+    BAKED = auto()
+    # each chunk is drawn as quads, which use tileset's atlas
+    ATLAS = auto()
+
+
+def _extrude(img: pygame.Surface, border: int = 1) -> pygame.Surface:
+    """Copy of img surrounded by its edge pixels, so tiles don't bleed into each other inside of an atlas"""
+    w, h = img.get_size()
+    pixels = np.frombuffer(pygame.image.tostring(img, "RGBA"), dtype=np.uint8).reshape(h, w, 4)
+    pixels = np.pad(pixels, ((border, border), (border, border), (0, 0)), mode="edge")
+    return pygame.image.fromstring(pixels.tobytes(), (w + 2 * border, h + 2 * border), "RGBA")
+
+
 class Tile:
 
     def __init__(self, img: pygame.Surface):
@@ -50,207 +98,794 @@ class DirectionalTile(Tile):
                 surf.blit(self.tile_vars[i], p.int_tuple)
 
 
+def bake(slots: np.ndarray, pixels: np.ndarray, cells: tuple[int, int] = None) -> np.ndarray:
+    """
+    Composes image out of tile pixels
+
+    Only does array indexing, so it is cheap and doesn't hold GIL for long, thus can be done in background
+
+    :param slots: indexed [x][y], index into pixels for every cell
+    :param pixels: shape (slots, tile_size, tile_size, 4), RGBA of every tile variant, 0 is empty
+    :param cells: size of image in cells, if it is larger than slots, it is padded with empty cells
+    :return: RGBA image, indexed [y][x]
+    """
+    if cells is not None and slots.shape != cells:
+        padded = np.zeros(cells, dtype=slots.dtype)
+        padded[:slots.shape[0], :slots.shape[1]] = slots
+        slots = padded
+    w, h = slots.shape
+    tile_size = pixels.shape[1]
+    # (x, y, row, column, rgba) -> (y, row, x, column, rgba)
+    return pixels[slots].transpose(1, 2, 0, 3, 4).reshape(h * tile_size, w * tile_size, 4)
+
+
+def chunk_range(cam: Camera, origin: Vec2, chunk_size: Vec2, count: tuple[int, int],
+                margin: int = 0) -> tuple[range, range]:
+    """
+    Ranges of chunk coordinates visible by camera
+
+    :param origin: global position of the chunk (0, 0)
+    :param count: size of chunk grid
+    :param margin: amount of chunks added around visible ones
+    """
+    # scalars instead of Vec2 math, this runs for every map layer every frame
+    up_left, world_size = cam.world_up_left, cam.world_size
+    x0 = ceil((up_left.x - origin.x) // chunk_size.x)
+    y0 = ceil((up_left.y - origin.y) // chunk_size.y)
+    x1 = x0 + ceil(world_size.x / chunk_size.x) + 1
+    y1 = y0 + ceil(world_size.y / chunk_size.y) + 1
+    return (range(max(x0 - margin, 0), min(x1 + margin, count[0])),
+            range(max(y0 - margin, 0), min(y1 + margin, count[1])))
+
+
+def occupied_in(occupied: np.ndarray, xs: range, ys: range) -> list[tuple[int, int]]:
+    """Coordinates of occupied chunks in given ranges, see chunk_occupancy"""
+    coords = np.argwhere(occupied[xs.start:xs.stop, ys.start:ys.stop])
+    coords += (xs.start, ys.start)
+    return coords.tolist()
+
+
+def chunk_occupancy(ids: np.ndarray) -> np.ndarray:
+    """
+    Whether chunk [cx][cy] has any non-empty cell
+
+    :param ids: tile ids, indexed [x][y], 0 is empty cell
+    :rtype: np.ndarray
+    """
+    w, h = ids.shape
+    cw, ch = ceil(w / CHUNK_SIZE), ceil(h / CHUNK_SIZE)
+    filled = np.zeros((cw * CHUNK_SIZE, ch * CHUNK_SIZE), dtype=bool)
+    filled[:w, :h] = ids != 0
+    return filled.reshape(cw, CHUNK_SIZE, ch, CHUNK_SIZE).any(axis=(1, 3))
+
+
+def neighbour_masks(ids: np.ndarray) -> np.ndarray:
+    """
+    Index of DirectionalTile variant for every cell: bit mask of neighbours with the same tile
+
+    1 - below, 2 - left, 4 - above, 8 - right. Cells outside of given array are never the same
+
+    :type ids: np.ndarray
+    :rtype: np.ndarray
+    """
+    masks = np.zeros(ids.shape, dtype=np.uint8)
+    # (x, y) and (x, y + 1)
+    same = (ids[:, 1:] == ids[:, :-1]).view(np.uint8)
+    masks[:, :-1] |= same
+    masks[:, 1:] |= same << np.uint8(2)
+    # (x, y) and (x + 1, y)
+    same = (ids[1:, :] == ids[:-1, :]).view(np.uint8)
+    masks[:-1, :] |= same << np.uint8(3)
+    masks[1:, :] |= same << np.uint8(1)
+    return masks
+
+
 class Tileset:
     tiles: dict[str, Tile]
+    ids: dict[str, int]  # name -> tile id, 0 is reserved for empty cell
+    lookup: list[Tile | None]  # tile id -> Tile
+    directional: np.ndarray  # tile id -> is it DirectionalTile
+    atlas: TextureAtlas | None
+    uvs: np.ndarray  # [tile id, variant] -> (u0, v0, u1, v1) inside of atlas
+    pixels: np.ndarray  # [slot] -> RGBA of tile variant, see bake
+    slots: np.ndarray  # [tile id, variant] -> slot in pixels
+    lod_pixels: dict[int, np.ndarray]  # level -> pixels downsampled 2 ** level times, see downsampled
+    digest: bytes  # hash of pixels and slots, changes whenever tileset image or description does
 
     def __init__(self, tile_size: int = 16):
         self.tile_size = tile_size
+        self.atlas = None
+        self.lod_pixels = {}
 
-    def load_set(self, path: os.PathLike | str):
+    def load_set(self, path: os.PathLike | str, atlas: bool = True):
+        """
+        Loads tiles from image and its .json description
+
+        If atlas is True, all tiles are also packed into a TextureAtlas for ChunkMode.ATLAS, which requires GL context
+        """
         tileset = pygame.image.load(path).convert_alpha()
+        image = np.asarray(Image.open(path).convert("RGBA"))
         self.tiles = {}
+        self.ids = {}
+        self.lookup = [None]
+        pixels = [np.zeros((self.tile_size, self.tile_size, 4), dtype=np.uint8)]
+        slots = [[0] * 16]
         with open(path + ".json") as f:
             tiles: dict[str, dict[str, list]] = json.load(f)
         for t, tile in tiles["mapping"].items():
             match tile[0]:
                 case "DIRECTIONAL":
                     imgs = []
+                    slots.append([])
                     for i in range(16):
                         imgs.append(tileset.subsurface(tile[1][i]))
+                        slots[-1].append(len(pixels))
+                        pixels.append(self._crop(image, tile[1][i]))
                     self.tiles[t] = DirectionalTile(imgs)
                 case _:
                     assert len(tile) == 4
                     self.tiles[t] = Tile(tileset.subsurface(tile))
+                    slots.append([len(pixels)] * 16)
+                    pixels.append(self._crop(image, tile))
+            self.ids[t] = len(self.lookup)
+            self.lookup.append(self.tiles[t])
+        self.pixels = np.stack(pixels)
+        # fully transparent pixels are zeroed, same as blitting them onto empty surface did
+        self.pixels[self.pixels[..., 3] == 0] = 0
+        self.slots = np.array(slots, dtype=np.int32)
+        self.digest = hashlib.blake2b(self.pixels.tobytes() + self.slots.tobytes(), digest_size=16).digest()
+        self.directional = np.array([isinstance(t, DirectionalTile) for t in self.lookup], dtype=np.bool_)
+        if atlas:
+            self.build_atlas()
         return self
 
+    def _crop(self, image: np.ndarray, rect: list[int]) -> np.ndarray:
+        x, y, w, h = rect
+        if w != self.tile_size or h != self.tile_size:
+            raise ValueError(f"Tile {rect} doesn't match tile size {self.tile_size}")
+        return image[y:y + h, x:x + w]
+
+    def downsampled(self, level: int) -> np.ndarray:
+        """pixels with every tile box-filtered down 2 ** level times, for zoomed out regions"""
+        if level == 0:
+            return self.pixels
+        if level not in self.lod_pixels:
+            f = 2 ** level
+            if self.tile_size % f:
+                raise ValueError(f"Tile size {self.tile_size} can't be downsampled {f} times")
+            n, size = len(self.pixels), self.tile_size // f
+            px = self.pixels.astype(np.float32).reshape(n, size, f, size, f, 4)
+            # colors are averaged weighted by alpha, so transparent pixels don't darken edges
+            alpha = px[..., 3:].mean(axis=(2, 4))
+            rgb = (px[..., :3] * px[..., 3:]).mean(axis=(2, 4))
+            rgb = np.divide(rgb, alpha, out=np.zeros_like(rgb), where=alpha > 0)
+            self.lod_pixels[level] = np.rint(np.concatenate((rgb, alpha), axis=-1)).astype(np.uint8)
+        return self.lod_pixels[level]
+
+    def build_atlas(self, border: int = 1) -> None:
+        """Packs every tile and every variant of directional tiles into one atlas"""
+        images: dict[tuple[str, int | None], pygame.Surface] = {}
+        for name, tile in self.tiles.items():
+            if isinstance(tile, DirectionalTile):
+                for i, img in enumerate(tile.tile_vars):
+                    images[name, i] = _extrude(img, border)
+            else:
+                images[name, None] = _extrude(tile.tile, border)
+
+        area = sum(img.get_width() * img.get_height() for img in images.values())
+        side = 64
+        while side * side < area * 2:
+            side *= 2
+        while True:
+            atlas = TextureAtlas.create_empty(Vec2(side, side))
+            packed = atlas.pack(images)
+            if len(packed) == len(images):
+                break
+            logger.debug(f"{self.__class__}: Tiles don't fit into {side}x{side} atlas")
+            glDeleteTextures([atlas.tex])
+            side *= 2
+
+        self.atlas = atlas
+        self.uvs = np.zeros((len(self.lookup), 16, 4), dtype=np.float32)
+        for (name, variant), tex in packed.items():
+            u0, v0 = atlas.calculate_uv(tex.pos + border)
+            u1, v1 = atlas.calculate_uv(tex.pos + tex.size - border)
+            # plain tiles always have variant 0, but filling all of them is more forgiving
+            variants = slice(None) if variant is None else variant
+            self.uvs[self.ids[name], variants] = u0, v0, u1, v1
+
+    def remap(self, mapping: dict[int, str], size: int = 0) -> np.ndarray:
+        """
+        Builds lookup table from ids used by a map (e.g. palette indices) to tile ids of this set
+
+        Unknown names are mapped to empty cell
+
+        :type mapping: dict[int, str]
+        :type size: int
+        :rtype: np.ndarray
+        """
+        table = np.zeros(max(size, max(mapping, default=0) + 1), dtype=np.uint16)
+        for map_id, name in mapping.items():
+            if name in self.ids:
+                table[map_id] = self.ids[name]
+            else:
+                logger.warning(f"Failed to load tile {name!r}: not present in tileset")
+        return table
+
+
+class BakeCache:
+    """
+    Baked pixels stored on disk between launches, disabled while path is None
+
+    Files are keyed by hash of everything pixels are made of: tile ids, neighbour masks (so neighbours
+    across chunk border are accounted for), tileset digest, tile size and level of detail
+    """
+    path: str | os.PathLike | None
+
+    def __init__(self, path: str | os.PathLike = None):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(ids: np.ndarray, masks: np.ndarray, digest: bytes, tile_size: int, level: int = 0) -> str:
+        h = hashlib.blake2b(digest, digest_size=16)
+        h.update(struct.pack("<HHHH", tile_size, level, *ids.shape))
+        h.update(np.ascontiguousarray(ids, dtype=np.uint16).tobytes())
+        h.update(np.ascontiguousarray(masks, dtype=np.uint8).tobytes())
+        return h.hexdigest()
+
+    def file(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key + ".npy")
+
+    def load(self, key: str) -> np.ndarray | None:
+        if self.path is None:
+            return None
+        try:
+            pixels = np.load(self.file(key))
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pixels
+
+    def store(self, key: str, pixels: np.ndarray) -> None:
+        if self.path is None:
+            return
+        file = self.file(key)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        # written under temporary name, so other threads and processes never read half of a file
+        tmp = f"{file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, pixels)
+        os.replace(tmp, file)
+
+    def bake(self, ids: np.ndarray, masks: np.ndarray, pixels: np.ndarray, slots: np.ndarray, digest: bytes,
+             cells: tuple[int, int], level: int = 0) -> np.ndarray:
+        """
+        Same as bake, but pixels are taken from cache if present, and stored there otherwise
+
+        :param ids: tile ids of the set, indexed [x][y]
+        :param masks: neighbour masks of the same cells
+        :param pixels: tile pixels of the set, downsampled for level
+        :param slots: Tileset.slots
+        :param digest: Tileset.digest
+        """
+        key = self.key(ids, masks, digest, pixels.shape[1], level) if self.path is not None else None
+        if key is not None and (baked := self.load(key)) is not None:
+            return baked
+        baked = bake(slots[ids, masks], pixels, cells)
+        if key is not None:
+            self.store(key, baked)
+        return baked
+
+
+bake_cache = BakeCache()
+
+
+class ChunkBaker:
+    """
+    Bakes pixels of chunks on worker threads
+
+    Inputs of a bake are snapshotted on the main thread (see Chunk.snapshot), so workers never touch the map.
+    Main thread only uploads finished ones, no more than uploads_per_frame per frame
+    """
+    executor: ThreadPoolExecutor | None
+    pending: dict["Chunk", Future]
+
+    def __init__(self, workers: int = BAKE_WORKERS, uploads_per_frame: int = UPLOADS_PER_FRAME):
+        self.workers = workers
+        self.uploads_per_frame = uploads_per_frame
+        self.executor = None
+        self.pending = {}
+        self._frame = -1
+        self._uploads = 0
+
+    def request(self, chunk: "Chunk") -> None:
+        if chunk in self.pending:
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="ChunkBaker")
+        self.pending[chunk] = self.executor.submit(chunk.bake_pixels, *chunk.snapshot())
+
+    @profiler.profile()
+    def upload_ready(self) -> None:
+        """Uploads finished bakes, while budget of this frame allows it"""
+        if self._frame != stats.frame:
+            self._frame = stats.frame
+            self._uploads = 0
+        for chunk, future in list(self.pending.items()):
+            if self._uploads >= self.uploads_per_frame:
+                break
+            if not future.done():
+                continue
+            del self.pending[chunk]
+            chunk.upload(future.result())
+            self._uploads += 1
+        stats.add("bakes_pending", len(self.pending))
+
+
+baker = ChunkBaker()
+
 
 class Chunk(Obj):
     set: Tileset
-    grid: list[list[Tile | None]]
-    tile_pos: dict[Tile, list[Vec2] | list[list[Vec2]]]
-    cached: pygame.Surface
-    cached_tex: int | None
+    tiles: np.ndarray  # view into TileMap.tiles
+    masks: np.ndarray  # view into TileMap.masks
+    cached_tex: Texture | None
+    mesh: Mesh | None
     cached_valid: bool = False
-    tile_pos_valid: bool = False
+    empty_valid: bool = False
     size: Vec2
     is_empty: bool = True
+    version: int = 0  # incremented every time tiles of the chunk change
+    dirty: tuple[int, int, int, int] | None  # cells changed since last frame, not yet in texture
     parent: "TileMap"
 
-    def __init__(self, tileset, grid: list[list[Tile | None]], tile_size: int, size: Vec2, cpos: Vec2, pos,
+    def __init__(self, tileset, tiles: np.ndarray, masks: np.ndarray, tile_size: int, size: Vec2, cpos: Vec2, pos,
                  parent: "TileMap"):
         super().__init__(pos=pos, parent=parent)
         self.cpos = cpos
         self.set = tileset
         self.tile_size = tile_size
-        self.grid = grid
+        self.tiles = tiles
+        self.masks = masks
         self.size = size
-        self.cached = pygame.Surface(self.size.tuple, pygame.SRCALPHA)
         self.cached_valid = False
-        self.tile_pos_valid = False
+        self.empty_valid = False
         self.cached_tex = None
+        self.mesh = None
+        self.version = 0
+        self.dirty = None
+        self._baking = 0
 
-    def cache(self):
-        self.cached.fill((0, 0, 0, 0))
-        for t, pos in self.tile_pos.items():
-            t.render(self.cached, self.tile_pos[t])
-        if self.cached_tex is not None:
-            glDeleteTextures([self.cached_tex])
-        self.cached_tex = GLUtils.surf_to_tex_default(self.cached)
+    def inputs(self) -> tuple[np.ndarray, np.ndarray]:
+        """Copies of tile ids of the set and masks of this chunk, what bake_pixels needs"""
+        return self.parent.remap[self.tiles], self.masks.copy()
+
+    def snapshot(self) -> tuple[np.ndarray, np.ndarray]:
+        """Arguments of bake_pixels, taken on the main thread, so edits made during the bake don't reach it"""
+        self._baking = self.version
+        return self.inputs()
+
+    @profiler.profile()
+    def bake_pixels(self, ids: np.ndarray, masks: np.ndarray) -> np.ndarray:
+        """RGBA pixels of this chunk from a snapshot, safe to call from worker threads"""
+        return bake_cache.bake(ids, masks, self.set.pixels, self.set.slots, self.set.digest, (CHUNK_SIZE, CHUNK_SIZE))
+
+    @profiler.profile()
+    def upload(self, pixels: np.ndarray):
+        if self._baking != self.version:
+            # tiles were changed while it was baked
+            baker.request(self)
+            return
+        self.cached_tex = self.parent.pool.acquire(self)
+        GLUtils.update_texture_data(self.cached_tex.tex_id, pixels)
         self.cached_valid = True
+        self.dirty = None
+        stats.add("chunk_bakes")
 
-    def render(self, cam: Camera):
-        if not self.tile_pos_valid:
-            self.update_tile_pos()
+    @profiler.profile()
+    def cache(self):
+        """Bakes chunk right away, on the calling thread"""
+        self.upload(self.bake_pixels(*self.snapshot()))
+
+    def evict(self):
+        """Called by pool when texture of this chunk is given to another one"""
+        self.cached_valid = False
+        self.cached_tex = None
+
+    def mark_tiles_changed(self):
+        """
+        Marks tiles of chunk as changed, so everything made out of them is rebuilt, texture too,
+        see patch for rebaking only the changed cells
+        """
+        self.version += 1
+        self.cached_valid = False
+        self.empty_valid = False
+        self.mesh = None
+
+    def patch(self, x0: int, y0: int, x1: int, y1: int):
+        """
+        Marks cells [x0, x1) x [y0, y1) of chunk as changed
+
+        Only they are rebaked into texture, once per frame, when chunk is rendered
+        """
+        self.version += 1
+        self.empty_valid = False
+        self.mesh = None
+        if self.dirty is not None:
+            dx0, dy0, dx1, dy1 = self.dirty
+            x0, y0, x1, y1 = min(x0, dx0), min(y0, dy0), max(x1, dx1), max(y1, dy1)
+        self.dirty = x0, y0, x1, y1
+
+    @profiler.profile()
+    def flush_patches(self):
+        """Rebakes cells changed since last frame into texture"""
+        x0, y0, x1, y1 = self.dirty
+        self.dirty = None
+        area = slice(x0, x1), slice(y0, y1)
+        slots = self.set.slots[self.parent.remap[self.tiles[area]], self.masks[area]]
+        GLUtils.update_texture_data(self.cached_tex.tex_id, bake(slots, self.set.pixels),
+                                    Vec2(x0, y0) * self.tile_size)
+        stats.add("chunk_patches")
+
+    def build_mesh(self):
+        ids = self.parent.remap[self.tiles]
+        xs, ys = np.nonzero(ids)
+        rects = np.empty((len(xs), 4), dtype=np.float32)
+        rects[:, 0] = xs * self.tile_size
+        rects[:, 1] = ys * self.tile_size
+        rects[:, 2:] = self.tile_size
+        uvs = self.set.uvs[ids[xs, ys], self.masks[xs, ys]]
+        self.mesh = Mesh(quad_vertices(rects, uvs), self.set.atlas.tex)
+        self.is_empty = len(self.mesh) == 0
+
+    def render(self, cam: Camera, bake: bool = True):
+        """
+        bake: whether to request bake of chunk, if it isn't baked yet
+        """
+        if not self.empty_valid:
+            self.check_empty()
         if self.is_empty:
             return
-        if self.global_pos.gt_or(cam.world_down_right):
-            return
-        if (self.global_pos + self.size).lt_or(cam.world_up_left):
+        pos = self.global_pos
+        if pos.gt_or(cam.world_down_right) or pos.add_vec(self.size).lt_or(cam.world_up_left):
             return
-        if not self.cached_valid:
-            self.cache()
 
-        pos = self.global_pos
-        size = self.size
-        cam.queue += (pos.x, pos.y, size.x, size.y), self.cached_tex
+        if self.parent.mode is ChunkMode.BAKED:
+            if self.cached_valid and self.parent.pool.touch(self):
+                if self.dirty is not None:
+                    self.flush_patches()
+                size = self.size
+                cam.queue += (pos.x, pos.y, size.x, size.y), self.cached_tex, self.parent.layer
+                return
+            if bake:
+                baker.request(self)
+
+        # either ATLAS mode, or placeholder for chunk being baked
+        self.render_mesh(cam, pos)
+
+    def render_mesh(self, cam: Camera, pos: Vec2):
+        """Queues tiles of chunk as quads from tileset atlas, if tileset has one"""
+        if self.set.atlas is None:
+            return
+        if self.mesh is None:
+            self.build_mesh()
+        cam.queue.add_mesh(self.mesh, pos.tuple, self.parent.layer)
 
     def check_empty(self):
-        self.is_empty = True
-        for t, p in self.tile_pos.items():
-            if isinstance(t, DirectionalTile):
-                for i in p:
-                    if i:
-                        self.is_empty = False
-                        break
-                else:
-                    continue
-                break
-            elif p:
-                self.is_empty = False
-                break
+        self.is_empty = not self.parent.remap[self.tiles].any()
+        self.empty_valid = True
 
-    def update_tile_pos(self):
-        self.tile_pos = {}
-        cx, cy = self.cpos.tuple
-        cw, ch = ceil(self.parent.size / CHUNK_SIZE).int_tuple
-        for x, col in enumerate(self.grid):
-            for y, cell in enumerate(col):
-                if not cell:
-                    continue
-                if isinstance(cell, DirectionalTile):
-                    if cell not in self.tile_pos:
-                        self.tile_pos[cell] = [[] for _ in range(len(cell.tile_vars))]
-                    index = 0
-                    if (self.grid[x][y + 1] is cell) if y + 1 < CHUNK_SIZE else (
-                            cy + 1 < ch and self.parent.grid[cx][cy + 1].grid[x][0] is cell):
-                        index += 1
-                    if (self.grid[x - 1][y] is cell) if x > 0 else (
-                            cx > 0 and self.parent.grid[cx - 1][cy].grid[-1][y] is cell):
-                        index += 2
-                    if (self.grid[x][y - 1] is cell) if y > 0 else (
-                            cy > 0 and self.parent.grid[cx][cy - 1].grid[x][-1] is cell):
-                        index += 4
-                    if (self.grid[x + 1][y] is cell) if x + 1 < CHUNK_SIZE else (
-                            cx + 1 < cw and self.parent.grid[cx + 1][cy].grid[0][y] is cell):
-                        index += 8
-                    # bullshit.
-                    # noinspection PyUnresolvedReferences
-                    self.tile_pos[cell][index].append(Vec2(x, y) * self.tile_size)
-                else:
-                    if cell not in self.tile_pos:
-                        self.tile_pos[cell] = []
-                    self.tile_pos[cell].append(Vec2(x, y) * self.tile_size)
-
-        self.check_empty()
-        self.tile_pos_valid = True
+
+class Region(Obj):
+    """
+    2 ** level x 2 ** level chunks downsampled into one chunk sized texture, drawn when camera is zoomed out
+
+    Texture is rebaked when any of its chunks changes (see Chunk.version), until then the old one is drawn
+    """
+    level: int
+    rpos: tuple[int, int]  # in regions of this level
+    cached_tex: Texture | None
+    versions: tuple[int, ...] | None  # versions of chunks texture was baked from
+    parent: "TileMap"
+
+    def __init__(self, level: int, rpos: tuple[int, int], parent: "TileMap"):
+        self.level = level
+        self.rpos = rpos
+        self.span = 2 ** level
+        self.size = parent.chunk_size * self.span
+        super().__init__(pos=self.size * Vec2(*rpos), parent=parent)
+        self.cached_tex = None
+        self.versions = None
+        self._baking = None
+
+    @property
+    def chunks(self) -> list[Chunk]:
+        """Non-empty chunks of the region, creating them also computes their masks, so main thread only"""
+        rx, ry = self.rpos
+        xs = range(rx * self.span, min((rx + 1) * self.span, self.parent.chunk_count[0]))
+        ys = range(ry * self.span, min((ry + 1) * self.span, self.parent.chunk_count[1]))
+        return [self.parent.chunk(cx, cy) for cx, cy in occupied_in(self.parent.occupied, xs, ys)]
+
+    @property
+    def cached_valid(self) -> bool:
+        return self.cached_tex is not None and self.versions == tuple(c.version for c in self.chunks)
+
+    def snapshot(self) -> tuple[np.ndarray, np.ndarray]:
+        """Arguments of bake_pixels, taken on the main thread: masks of the region are computed here, see chunks"""
+        self._baking = tuple(c.version for c in self.chunks)
+        cells = CHUNK_SIZE * self.span
+        x, y = self.rpos[0] * cells, self.rpos[1] * cells
+        area = slice(x, x + cells), slice(y, y + cells)
+        return self.parent.remap[self.parent.tiles[area]], self.parent.masks[area].copy()
+
+    @profiler.profile()
+    def bake_pixels(self, ids: np.ndarray, masks: np.ndarray) -> np.ndarray:
+        """RGBA pixels of region from a snapshot, safe to call from worker threads"""
+        cells = CHUNK_SIZE * self.span
+        tileset = self.parent.set
+        return bake_cache.bake(ids, masks, tileset.downsampled(self.level), tileset.slots, tileset.digest,
+                               (cells, cells), self.level)
+
+    @profiler.profile()
+    def upload(self, pixels: np.ndarray):
+        self.cached_tex = self.parent.pool.acquire(self)
+        GLUtils.update_texture_data(self.cached_tex.tex_id, pixels)
+        self.versions = self._baking
+        stats.add("region_bakes")
+
+    def evict(self):
+        """Called by pool when texture of this region is given to another one"""
+        self.cached_tex = None
+        self.versions = None
+
+    def render(self, cam: Camera):
+        pos = self.global_pos
+        if pos.gt_or(cam.world_down_right) or pos.add_vec(self.size).lt_or(cam.world_up_left):
+            return
+        if self.cached_tex is not None and self.parent.pool.touch(self):
+            cam.queue += (pos.x, pos.y, self.size.x, self.size.y), self.cached_tex, self.parent.layer
+            if not self.cached_valid:
+                baker.request(self)
+            return
+        baker.request(self)
+        # placeholder while region is being baked
+        for chunk in self.chunks:
+            chunk.render(cam, bake=False)
 
 
 class TileMap(Obj):
     set: Tileset
-    grid: list[list[Chunk | None]]
+    tiles: np.ndarray  # map ids, indexed [x][y]
+    mapping: dict[int, str]  # map id -> tile name
+    remap: np.ndarray  # map id -> tile id of the set
+    masks: np.ndarray  # variant index of DirectionalTile's, see neighbour_masks. Computed when chunk is created
+    occupied: np.ndarray  # [cx][cy] -> whether chunk has any tiles
+    chunks: dict[tuple[int, int], Chunk]  # created on first use, only for occupied positions
+    regions: dict[tuple[int, int, int], Region]  # (level, rx, ry) -> Region, created on first use
 
     def __init__(self, width: int, height: int, tileset, tile_size: int = 16, *, pos=None, parent=None,
-                 grid: list[list[Tile | str | int | None]] = None, mapping: dict[int, str] = None):
+                 grid: np.ndarray | list[list[Tile | str | int | None]] = None, mapping: dict[int, str] = None,
+                 layer: int = 0, mode: ChunkMode = ChunkMode.BAKED, pool: TexturePool = None):
+        """
+        grid: either array of map ids, which are translated to tiles through mapping, or nested lists of cells
+        mode: how chunks are drawn, ChunkMode.ATLAS requires tileset with atlas
+        pool: where textures of baked chunks are kept, defaults to chunk_pool(tile_size)
+
+        :type grid: np.ndarray | list[list[Tile | str | int | None]]
+        :type mapping: dict[int, str]
+        :type mode: ChunkMode
+        :type pool: TexturePool
+        """
         super().__init__(pos=pos, parent=parent)
+        self.layer = layer
+        if mode is ChunkMode.ATLAS and tileset.atlas is None:
+            raise ValueError("ChunkMode.ATLAS requires tileset loaded with atlas")
+        self.mode = mode
         self.set = tileset
         self.tile_size = tile_size
+        self.pool = pool if pool is not None else chunk_pool(tile_size)
         self.size = Vec2(width, height)
-        self.grid = [[None for _ in range(ceil(height / CHUNK_SIZE))] for _ in range(ceil(width / CHUNK_SIZE))]
-        if grid:
-            # converting all to Tiles
-            for y, row in enumerate(grid):
-                for x, cell in enumerate(row):
-                    cell: int | str | Tile = grid[x][y]
-                    if not cell:
-                        continue
-                    elif isinstance(cell, Tile):
-                        grid[x][y] = cell
-                    elif isinstance(cell, str):
-                        if cell in self.set.tiles:
-                            grid[x][y] = self.set.tiles[cell]
-                        else:
-                            logger.warning("Failed to load tile: not present in tileset")
-                            grid[x][y] = None
-                            continue
-                    elif isinstance(cell, int):
-                        c = mapping[cell]
-                        if c in self.set.tiles:
-                            grid[x][y] = self.set.tiles[c]
-                        else:
-                            logger.warning("Failed to load tile: not present in tileset")
-                            grid[x][y] = None
-                            continue
-            # dividing to chunks
-            size = Vec2(tile_size * CHUNK_SIZE, tile_size * CHUNK_SIZE)
-            import time
-            start = time.time()
-            for cy, crow in enumerate(self.grid):
-                for cx, chunk in enumerate(crow):
-                    cgrid: list[list[Tile | None]] = [[None for _ in range(CHUNK_SIZE)] for _ in range(CHUNK_SIZE)]
-                    cpos = Vec2(cx * CHUNK_SIZE, cy * CHUNK_SIZE)
-                    mn_y = min(cpos.y + CHUNK_SIZE, height)
-                    for x in range(cpos.x, min(cpos.x + CHUNK_SIZE, width)):
-                        cgrid[x % CHUNK_SIZE][:(mn_y - 1) % CHUNK_SIZE + 1] = grid[x][cpos.y:mn_y]
-
-                    self.grid[cx][cy] = Chunk(tileset, cgrid, tile_size, size, Vec2(cx, cy), cpos * tile_size, self)
-            logger.debug(f"time per TileMap: {time.time() - start}")
+        if grid is None:
+            grid = np.zeros((width, height), dtype=np.uint16)
+        elif not isinstance(grid, np.ndarray):
+            grid, mapping = self._ids_from_cells(grid, mapping)
+        if grid.shape != (width, height):
+            raise ValueError(f"Grid of shape {grid.shape} doesn't match size {self.size}")
+        self.tiles = grid
+        self.mapping = dict(mapping or {})
+        self.remap = self.set.remap(self.mapping, int(grid.max(initial=0)) + 1)
+        self.masks = np.zeros(grid.shape, dtype=np.uint8)
+
+        with profiler.scope("TileMap.occupancy"):
+            self.occupied = np.zeros(self.chunk_count, dtype=bool)
+            for x in range(0, width, MASK_BAND):
+                band = chunk_occupancy(self.remap[self.tiles[x:x + MASK_BAND]])
+                self.occupied[x // CHUNK_SIZE:x // CHUNK_SIZE + len(band)] = band
+        self.chunks = {}
+        self.regions = {}
+
+    def chunk(self, cx: int, cy: int) -> Chunk | None:
+        """Chunk at chunk coordinates, created on first call. None if there are no tiles"""
+        chunk = self.chunks.get((cx, cy))
+        if chunk is None and self.occupied[cx, cy]:
+            cpos = Vec2(cx * CHUNK_SIZE, cy * CHUNK_SIZE)
+            area = slice(cpos.x, cpos.x + CHUNK_SIZE), slice(cpos.y, cpos.y + CHUNK_SIZE)
+            self.update_masks(cpos.x, cpos.y, cpos.x + CHUNK_SIZE, cpos.y + CHUNK_SIZE)
+            chunk = Chunk(self.set, self.tiles[area], self.masks[area], self.tile_size, self.chunk_size,
+                          Vec2(cx, cy), cpos * self.tile_size, self)
+            self.chunks[cx, cy] = chunk
+        return chunk
+
+    def region_occupancy(self, level: int) -> np.ndarray:
+        """[rx][ry] -> whether region of level has any non-empty chunks"""
+        span = 2 ** level
+        cw, ch = self.occupied.shape
+        rw, rh = ceil(cw / span), ceil(ch / span)
+        occupied = np.zeros((rw * span, rh * span), dtype=bool)
+        occupied[:cw, :ch] = self.occupied
+        return occupied.reshape(rw, span, rh, span).any(axis=(1, 3))
+
+    def visible_regions(self, cam: Camera, level: int, margin: int = 0) -> list[Region]:
+        """Non-empty regions of level visible by camera"""
+        occupied = self.region_occupancy(level)
+        xs, ys = chunk_range(cam, self.global_pos, self.chunk_size * 2 ** level, occupied.shape, margin)
+        regions = []
+        for rx, ry in occupied_in(occupied, xs, ys):
+            region = self.regions.get((level, rx, ry))
+            if region is None:
+                region = self.regions[level, rx, ry] = Region(level, (rx, ry), self)
+            regions.append(region)
+        return regions
+
+    @staticmethod
+    def lod_level(zoom: float) -> int:
+        """Level of detail for camera zoom: texels of drawn textures are never much smaller than a pixel"""
+        if zoom >= 1:
+            return 0
+        return min(floor(log2(1 / zoom)), LOD_LEVELS)
+
+    def visible_chunks(self, cam: Camera, margin: int = 0) -> list[Chunk]:
+        """Non-empty chunks visible by camera, see chunk_range"""
+        xs, ys = chunk_range(cam, self.global_pos, self.chunk_size, self.chunk_count, margin)
+        return [self.chunk(cx, cy) for cx, cy in occupied_in(self.occupied, xs, ys)]
+
+    def _ids_from_cells(self, grid: list[list[Tile | str | int | None]],
+                        mapping: dict[int, str] = None) -> tuple[np.ndarray, dict[int, str]]:
+        """Converts nested lists of cells into array of map ids and mapping for it"""
+        mapping = dict(mapping or {})
+        names = {tile: name for name, tile in self.set.tiles.items()}
+        ids: dict[str, int] = {name: map_id for map_id, name in mapping.items()}
+        tiles = np.zeros((len(grid), len(grid[0]) if grid else 0), dtype=np.uint16)
+        for x, col in enumerate(grid):
+            for y, cell in enumerate(col):
+                if not cell:
+                    continue
+                elif isinstance(cell, int):
+                    tiles[x, y] = cell
+                    continue
+                name = names.get(cell) if isinstance(cell, Tile) else cell
+                if name not in ids:
+                    map_id = max(mapping, default=0) + 1
+                    mapping[map_id] = name
+                    ids[name] = map_id
+                tiles[x, y] = ids[name]
+        return tiles, mapping
+
+    def set_tile(self, x: int, y: int, tile: Tile | str | int | None) -> None:
+        """Changes one cell, see set_region"""
+        self.set_region(x, y, [[tile]])
+
+    def set_region(self, x: int, y: int, cells: np.ndarray | list[list[Tile | str | int | None]]) -> None:
+        """
+        Changes cells starting at (x, y), parts outside of the map are ignored
+
+        Only edited cells and their neighbours are recomputed, and only they are rebaked in chunk textures
+
+        :param cells: same as grid of __init__: array of map ids or nested lists of cells, indexed [x][y]
+        """
+        if isinstance(cells, np.ndarray):
+            ids = cells.astype(np.uint16, copy=False)
+        else:
+            ids, mapping = self._ids_from_cells(cells, self.mapping)
+            if mapping != self.mapping:
+                self.mapping = mapping
+                self.remap = self.set.remap(mapping, len(self.remap))
+        if ids.size and ids.max() >= len(self.remap):
+            self.remap = self.set.remap(self.mapping, int(ids.max()) + 1)
+
+        w, h = self.tiles.shape
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + ids.shape[0], w), min(y + ids.shape[1], h)
+        if x0 >= x1 or y0 >= y1:
+            return
+        area = slice(x0, x1), slice(y0, y1)
+        ids = ids[x0 - x:x1 - x, y0 - y:y1 - y]
+        changed = self.tiles[area] != ids
+        if not changed.any():
+            return
+        self.tiles[area] = ids
+
+        # masks of edited cells and their neighbours
+        bx0, by0 = max(x0 - 1, 0), max(y0 - 1, 0)
+        bx1, by1 = min(x1 + 1, w), min(y1 + 1, h)
+        box = slice(bx0, bx1), slice(by0, by1)
+        old_masks = self.masks[box].copy()
+        self.update_masks(bx0, by0, bx1, by1)
+        dirty = self.masks[box] != old_masks
+        dirty[x0 - bx0:x1 - bx0, y0 - by0:y1 - by0] |= changed
+
+        for cx in range(bx0 // CHUNK_SIZE, (bx1 - 1) // CHUNK_SIZE + 1):
+            for cy in range(by0 // CHUNK_SIZE, (by1 - 1) // CHUNK_SIZE + 1):
+                # part of the box inside of chunk, in chunk coordinates
+                ox, oy = cx * CHUNK_SIZE, cy * CHUNK_SIZE
+                lx0, ly0 = max(bx0 - ox, 0), max(by0 - oy, 0)
+                lx1, ly1 = min(bx1 - ox, CHUNK_SIZE), min(by1 - oy, CHUNK_SIZE)
+                xs, ys = np.nonzero(dirty[ox + lx0 - bx0:ox + lx1 - bx0, oy + ly0 - by0:oy + ly1 - by0])
+                if len(xs) == 0:
+                    continue
+                if not self.occupied[cx, cy]:
+                    chunk_area = slice(ox, ox + CHUNK_SIZE), slice(oy, oy + CHUNK_SIZE)
+                    self.occupied[cx, cy] = self.remap[self.tiles[chunk_area]].any()
+                if (chunk := self.chunks.get((cx, cy))) is not None:
+                    chunk.patch(lx0 + xs.min(), ly0 + ys.min(), lx0 + xs.max() + 1, ly0 + ys.max() + 1)
+
+    @property
+    def chunk_size(self) -> Vec2:
+        return Vec2(self.tile_size, self.tile_size) * CHUNK_SIZE
+
+    @property
+    def chunk_count(self) -> tuple[int, int]:
+        return ceil(self.size.x / CHUNK_SIZE), ceil(self.size.y / CHUNK_SIZE)
+
+    def update_masks(self, x0: int = 0, y0: int = 0, x1: int = None, y1: int = None) -> None:
+        """Recomputes neighbour masks of cells in [x0, x1) x [y0, y1)"""
+        w, h = self.tiles.shape
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(w if x1 is None else x1, w), min(h if y1 is None else y1, h)
+        if x0 >= x1 or y0 >= y1:
+            return
+        # region is expanded by a cell, so cells on its border see their neighbours
+        px0, py0 = max(x0 - 1, 0), max(y0 - 1, 0)
+        px1, py1 = min(x1 + 1, w), min(y1 + 1, h)
+        ids = self.remap[self.tiles[px0:px1, py0:py1]]
+        masks = neighbour_masks(ids)
+        masks[~self.set.directional[ids]] = 0
+        self.masks[x0:x1, y0:y1] = masks[x0 - px0:x1 - px0, y0 - py0:y1 - py0]
 
     @classmethod
     def from_image(cls, img: io.BytesIO, tileset, mapping: dict[int, str], tile_size: int = 16, *, pos=None,
-                   parent=None):
+                   parent=None, layer: int = 0, mode: ChunkMode = ChunkMode.BAKED):
         img = Image.open(img)
         if img.mode != 'P':
             raise ValueError("Image must be in palette mode")
-        pixels = img.load()
-        return cls(img.height, img.width, tileset, tile_size, pos=pos, parent=parent, mapping=mapping,
-                   grid=[[int(pixels[x, y]) for y in range(img.height)] for x in range(img.width)])
+        # image is stored row by row, while tiles are indexed [x][y]
+        tiles = np.ascontiguousarray(np.asarray(img, dtype=np.uint16).T)
+        return cls(img.width, img.height, tileset, tile_size, pos=pos, parent=parent, mapping=mapping, layer=layer,
+                   grid=tiles, mode=mode)
 
+    @profiler.profile()
     def render(self, cam: Camera):
-        chunk_width = self.grid[0][0].size.x
-        tl_chunk = ceil((cam.world_up_left - self.global_pos) // chunk_width)
-        rd_chunk = ceil(tl_chunk + ceil(cam.world_size / chunk_width)) + 1
-        for col in self.grid[max(tl_chunk.x, 0):min(rd_chunk.x, len(self.grid))]:
-            for chunk in col[max(tl_chunk.y, 0):min(rd_chunk.y, len(col))]:
-                chunk.render(cam)
-        tl_chunk = tl_chunk - 2
-        rd_chunk = rd_chunk + 2
-        for col in self.grid[max(tl_chunk.x, 0):min(rd_chunk.x, len(self.grid))]:
-            for chunk in col[max(tl_chunk.y, 0):min(rd_chunk.y, len(col))]:
-                if chunk.is_empty:
-                    continue
-                if not chunk.cached_valid:
-                    chunk.cache()
-                    break
-            else:
-                continue
-            break
+        level = self.lod_level(cam.zoom)
+        if self.mode is ChunkMode.BAKED or level:
+            baker.upload_ready()
+        if level:
+            for region in self.visible_regions(cam, level):
+                region.render(cam)
+            for region in self.visible_regions(cam, level, 1):
+                if not region.cached_valid:
+                    baker.request(region)
+            return
+
+        for chunk in self.visible_chunks(cam):
+            chunk.render(cam)
+        if self.mode is not ChunkMode.BAKED:
+            return
+        # baking nearby chunks in advance
+        for chunk in self.visible_chunks(cam, 2):
+            if not chunk.empty_valid:
+                chunk.check_empty()
+            if not chunk.is_empty and not chunk.cached_valid:
+                baker.request(chunk)
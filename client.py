@@ -6,9 +6,10 @@ from OpenGL import GL
 
 import logging_setup
 from Character import Character, CharSheet
-from Engine import Vec2, Camera, GLUtils, Debug, UiElement, Canvas, UiRenderer, UiTextRenderer, UiProgressBar
+from Engine import Vec2, Camera, GLUtils, Debug, UiElement, Canvas, UiRenderer, UiTextRenderer, UiProgressBar, \
+    FrameStats, FrameTimes, Profiler, SpatialIndex
 from Map import Map
-from Tilemap import Tileset
+from Tilemap import Tileset, bake_cache, BAKE_CACHE_DIR
 
 ########
 # Init #
@@ -53,19 +54,27 @@ signal_debug_string = ""
 
 # Debug #
 M_debug = Debug.DebugManager()
-M_debug.init(fonts['Debug'], (width, height), [("topright", Vec2(-5, 5)), ("topleft", Vec2(5, 5))])
+M_debug.init(fonts['Debug'], (width, height), [("topright", Vec2(-5, 5)), ("topleft", Vec2(5, 5))],
+             glyphs=True)
 debug = bool(os.environ.get("DEBUG", False))
 controls = True
 expected_fps = 60
 
 hui = True
 fps, dt, dt_spike = 0, 0, 0
+frame_stats = FrameStats()
+frame_times = FrameTimes()
+profiler = Profiler()
+profiler.enabled = bool(os.environ.get("PROFILE", False))
 
 #########
 # Tiles #
 #########
 tileset = Tileset().load_set("Assets/Tiles/Tileset.png")
-opened_map = Map.from_folder("Data/Maps/test_map", tileset)
+# chunks pre-baked by Prebake.py are read on bake workers instead of baked, and uploaded within per-frame budget
+if os.environ.get("BAKE_CACHE", False):
+    bake_cache.path = BAKE_CACHE_DIR
+opened_map = Map.load("Data/Maps/test_map", tileset)
 
 ###############
 # Scene Setup #
@@ -74,7 +83,7 @@ opened_map = Map.from_folder("Data/Maps/test_map", tileset)
 Character.setup_nicks(font=fonts["Nicks"], fore=(255, 255, 255), back=(0, 0, 0, 127))
 speed = 15
 cam = Camera(400, (width, height), parent=None)
-objects = [opened_map]
+objects = SpatialIndex([opened_map])
 
 # """
 # UI #
@@ -119,13 +128,15 @@ ui = {
                                   parent=name_block, pos=(-10, 0), relpos=(1, 0.5), pivot=(1, 0)),
     ## bars block ##
     "h_text": UiTextRenderer(f"{sheet.health} / {sheet.max_health}", font=fonts["ChInfo.Values"], fore=(255, 255, 255),
-                             back=(0, 0, 0, 0), parent=bars_block, pos=(40, 20), relpos=(0, 0), pivot=(0.5, 0.5)),
+                             back=(0, 0, 0, 0), parent=bars_block, pos=(40, 20), relpos=(0, 0), pivot=(0.5, 0.5),
+                             glyphs=True),
     "h_bar": UiProgressBar(img_back=bars_back, tex_back=bars_back_tex,
                            img_bar=health_bar, tex_bar=health_bar_tex,
                            parent=bars_block, progress=sheet.health / sheet.max_health,
                            pos=(80, 20), size=(ch_info_size[0] - 80 - 10, 10), pivot=(0, 0.5)),
     "m_text": UiTextRenderer(f"{sheet.mana} / {sheet.max_mana}", font=fonts["ChInfo.Values"], fore=(255, 255, 255),
-                             back=(0, 0, 0, 0), parent=bars_block, pos=(40, 40), relpos=(0, 0), pivot=(0.5, 0.5)),
+                             back=(0, 0, 0, 0), parent=bars_block, pos=(40, 40), relpos=(0, 0), pivot=(0.5, 0.5),
+                             glyphs=True),
     "m_bar": UiProgressBar(img_back=bars_back, tex_back=bars_back_tex,
                            img_bar=mana_bar, tex_bar=mana_bar_tex,
                            parent=bars_block, progress=(sheet.mana / sheet.max_mana) if sheet.max_mana > 0 else 0,
@@ -144,43 +155,48 @@ try:
         ##################
         # Event Handling #
         ##################
-        for event in pygame.event.get():
-            match event.type:
-                case pygame.QUIT:
-                    hui = False
-                case pygame.MOUSEWHEEL:
-                    cam.width = max(min(cam.width / (ZOOM_FACTOR ** event.y), MAX_W), MIN_W)
-                case pygame.KEYDOWN:
-                    match event.key:
-                        case pygame.K_F1:
-                            controls = not controls
-                        case pygame.K_F2:
-                            vsync = (vsync + 1) % 3
-                            pygame.display.set_mode((width, height),
-                                                    flags=FLAGS,
-                                                    vsync=vsync % 2)
-                        case pygame.K_F3:
-                            debug = not debug
-                        case pygame.K_RIGHTBRACKET:
-                            dt_spike = 0
-                        case pygame.K_e:
-                            cam.width = max(cam.width / ZOOM_FACTOR, MIN_W)
-                        case pygame.K_q:
-                            cam.width = min(cam.width * ZOOM_FACTOR, MAX_W)
-                        case pygame.K_COMMA:
-                            if ROOT:
-                                speed -= 0.25
-                        case pygame.K_PERIOD:
-                            if ROOT:
-                                speed += 0.25
-                case pygame.VIDEORESIZE:
-                    GL.glViewport(0, 0, event.w, event.h)
-                    M_debug.update_size((event.w, event.h))
-                    cam.size = Vec2(event.w, event.h)
-                    cam.width = cam.width
-                    width, height = cam.size.tuple
-                case pygame.MOUSEMOTION:
-                    mouse_pos = Vec2.from_tuple(pygame.mouse.get_pos())
+        with profiler.scope("events"):
+            for event in pygame.event.get():
+                match event.type:
+                    case pygame.QUIT:
+                        hui = False
+                    case pygame.MOUSEWHEEL:
+                        cam.width = max(min(cam.width / (ZOOM_FACTOR ** event.y), MAX_W), MIN_W)
+                    case pygame.KEYDOWN:
+                        match event.key:
+                            case pygame.K_F1:
+                                controls = not controls
+                            case pygame.K_F2:
+                                vsync = (vsync + 1) % 3
+                                pygame.display.set_mode((width, height),
+                                                        flags=FLAGS,
+                                                        vsync=vsync % 2)
+                            case pygame.K_F3:
+                                debug = not debug
+                            case pygame.K_F4:
+                                profiler.enabled = not profiler.enabled
+                            case pygame.K_F5:
+                                profiler.dump()
+                            case pygame.K_RIGHTBRACKET:
+                                dt_spike = 0
+                            case pygame.K_e:
+                                cam.width = max(cam.width / ZOOM_FACTOR, MIN_W)
+                            case pygame.K_q:
+                                cam.width = min(cam.width * ZOOM_FACTOR, MAX_W)
+                            case pygame.K_COMMA:
+                                if ROOT:
+                                    speed -= 0.25
+                            case pygame.K_PERIOD:
+                                if ROOT:
+                                    speed += 0.25
+                    case pygame.VIDEORESIZE:
+                        GL.glViewport(0, 0, event.w, event.h)
+                        M_debug.update_size((event.w, event.h))
+                        cam.size = Vec2(event.w, event.h)
+                        cam.width = cam.width
+                        width, height = cam.size.tuple
+                    case pygame.MOUSEMOTION:
+                        mouse_pos = Vec2.from_tuple(pygame.mouse.get_pos())
 
         ##################
         # Input Handling #
@@ -219,7 +235,8 @@ try:
                         ...
 
         # Render everything #
-        cam.render(objects)
+        with profiler.scope("cam.render"):
+            cam.render(objects)
 
         ############
         #    UI    #
@@ -233,14 +250,15 @@ try:
         ui["m_text"].text = f"{sheet.mana} / {sheet.max_mana}"
 
         # Render #
-        canvas.render()
+        with profiler.scope("canvas.render"):
+            canvas.render()
 
         # Controls #
         if controls:
             M_debug('Controls:', 1)
             M_debug('Movement: W A S D; Zoom: Q E', 1)
-            M_debug('Toggle: Controls: F1, FPS lock cycle: F2, Debug: F3', 1)
-            M_debug('Clear max_dt: ]', 1)
+            M_debug('Toggle: Controls: F1, FPS lock cycle: F2, Debug: F3, Profiler: F4', 1)
+            M_debug('Clear max_dt: ], Dump profile: F5', 1)
             if ROOT:
                 M_debug('Root:', 1)
                 M_debug('Speed: < >', 1)
@@ -249,6 +267,8 @@ try:
         # Debug #
         M_debug(f'FPS: {float(fps):.1f}, lock: {['NONE', 'VSYNC', 'MANUAL'][vsync]}')
         M_debug(f'dt: {dt}, Max dt: {dt_spike}')
+        p50, p95, p99 = frame_times.percentiles()
+        M_debug(f'Frame: p50: {p50:.1f}, p95: {p95:.1f}, p99: {p99:.1f} ms')
         if debug:
             M_debug(f'Cam: P: {cam.pos.int_tuple}/{cam.global_pos.int_tuple}, Zm: {cam.zoom:.3g}, W: '
                     f'{float(cam.width):.6g}')
@@ -256,15 +276,37 @@ try:
                     f'Scrn: S: {cam.size.tuple}, WS: {cam.world_size.int_tuple}')
             M_debug(f'Mouse: Sc: {mouse_pos.int_tuple}, Wr: {cam.screen_to_world(mouse_pos).int_tuple}')
             M_debug(f'Signals: {signal_debug_string}')
+            M_debug(f'Quads: {frame_stats["quads"]}, Binds: {frame_stats["binds"]}, '
+                    f'Saved: {frame_stats["binds_saved"]}')
+            M_debug(f'Objects: Drawn: {frame_stats["drawn"]}, Culled: {frame_stats["culled"]}')
+            text_cache = Debug.TRender
+            text_lookups = max(frame_stats["text_hits"] + frame_stats["text_misses"], 1)
+            M_debug(f'Text: Atlases: {text_cache.atlas_count}, Cached: {len(text_cache.prerendered_text)}, '
+                    f'Hit rate: {frame_stats["text_hits"] / text_lookups:.0%} ({text_cache.hit_rate:.0%} total)')
+            pool = opened_map.maps[0].pool
+            M_debug(f'Chunks: {pool.resident_bytes / 2 ** 20:.0f}/{pool.budget / 2 ** 20:.0f} MiB, '
+                    f'Hits: {pool.hits}, Misses: {pool.misses}, Evictions: {pool.evictions}')
+            M_debug(f'Debug lines rendered: {frame_stats["debug_lines_rasterized"]}')
+            M_debug.graph(frame_times, 1000 / expected_fps)
+            if profiler.enabled:
+                M_debug('Profile, ms: ' + ', '.join(f'{name}: {ms:.2f}'
+                                                    for name, ms in list(profiler.last_frame().items())[:6]))
 
         # Render debug #
-        M_debug.draw()
+        with profiler.scope("M_debug.draw"):
+            M_debug.draw()
         ################
         # End of frame #
         ################
-        pygame.display.flip()
+        with profiler.scope("flip"):
+            pygame.display.flip()
+        frame_stats.end_frame()
+        frame_times.tick()
+        profiler.end_frame()
         fps = clock.get_fps()
         dt = clock.tick(expected_fps if vsync == 2 else 0)
         dt_spike = max(dt, dt_spike)
 finally:
+    if profiler.frames:
+        profiler.dump()
     pygame.quit()
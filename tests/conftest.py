@@ -0,0 +1,49 @@
+"""
+Tests run headless: pygame on dummy video driver, OpenGL through offscreen EGL context on Linux (see gl fixture)
+
+Usage: python -m pytest tests
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# assets are loaded by paths relative to repository, same as in client
+os.chdir(ROOT)
+OFFSCREEN = sys.platform.startswith("linux")
+if OFFSCREEN:
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+    os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+
+import pygame
+import pytest
+
+
+@pytest.fixture(scope="session")
+def display():
+    """Display mode, which pygame needs to convert surfaces"""
+    pygame.display.init()
+    pygame.font.init()
+    pygame.display.set_mode((1, 1))
+    yield
+    pygame.quit()
+
+
+@pytest.fixture(scope="session")
+def gl(display):
+    """Current OpenGL context: offscreen on Linux, same as in render benchmark, hidden window elsewhere"""
+    try:
+        if OFFSCREEN:
+            from Engine.offscreen import egl_context
+            egl_context(1, 1)
+        else:
+            pygame.display.set_mode((1, 1), pygame.OPENGL | pygame.HIDDEN)
+    except Exception as e:
+        pytest.skip(f"No OpenGL context: {e}")
+
+
+@pytest.fixture(scope="session")
+def tileset(display):
+    from Tilemap import Tileset
+    return Tileset().load_set("Assets/Tiles/Tileset.png", atlas=False)
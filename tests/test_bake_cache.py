@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pytest
+
+import Tilemap
+from Tilemap import BakeCache, TileMap, CHUNK_SIZE, bake
+
+
+@pytest.fixture
+def cells(tileset) -> tuple[np.ndarray, np.ndarray]:
+    """Tile ids of the set and masks of a chunk with a lake, as Chunk.inputs gives them"""
+    grid = [["Grass"] * CHUNK_SIZE for _ in range(CHUNK_SIZE)]
+    for x in range(5, 20):
+        for y in range(8, 14):
+            grid[x][y] = "Water"
+    tilemap = TileMap(CHUNK_SIZE, CHUNK_SIZE, tileset, grid=grid)
+    return tilemap.chunk(0, 0).inputs()
+
+
+def test_key_covers_all_inputs(tileset, cells):
+    ids, masks = cells
+    key = BakeCache.key(ids, masks, tileset.digest, 16)
+    assert key == BakeCache.key(ids.copy(), masks.copy(), tileset.digest, 16)
+
+    other_ids = ids.copy()
+    other_ids[0, 0] = tileset.ids["Sand"]
+    other_masks = masks.copy()
+    other_masks[6, 9] ^= 1
+    assert len({
+        key,
+        BakeCache.key(other_ids, masks, tileset.digest, 16),
+        BakeCache.key(ids, other_masks, tileset.digest, 16),
+        BakeCache.key(ids, masks, bytes(16), 16),
+        BakeCache.key(ids, masks, tileset.digest, 8),
+        BakeCache.key(ids, masks, tileset.digest, 16, level=1),
+        # same cells in a different shape
+        BakeCache.key(ids.reshape(CHUNK_SIZE // 2, -1), masks.reshape(CHUNK_SIZE // 2, -1), tileset.digest, 16),
+    }) == 7
+
+
+def test_store_and_load(tmp_path):
+    cache = BakeCache(tmp_path)
+    pixels = np.random.default_rng(0).integers(0, 256, (64, 32, 4), dtype=np.uint8)
+    assert cache.load("00ff") is None
+    assert cache.misses == 1
+    cache.store("00ff", pixels)
+    assert os.listdir(tmp_path / "00") == ["00ff.npy"]
+    loaded = cache.load("00ff")
+    assert loaded.dtype == pixels.dtype and (loaded == pixels).all()
+    assert cache.hits == 1
+
+
+def test_bake_through_cache(tmp_path, tileset, cells):
+    ids, masks = cells
+    expected = bake(tileset.slots[ids, masks], tileset.pixels, (CHUNK_SIZE, CHUNK_SIZE))
+    cache = BakeCache(tmp_path)
+    args = ids, masks, tileset.pixels, tileset.slots, tileset.digest, (CHUNK_SIZE, CHUNK_SIZE)
+    assert (cache.bake(*args) == expected).all()
+    assert cache.misses == 1
+    assert (cache.bake(*args) == expected).all()
+    assert cache.hits == 1
+
+
+def test_disabled_cache(tmp_path, tileset, cells):
+    cache = BakeCache()
+    ids, masks = cells
+    cache.bake(ids, masks, tileset.pixels, tileset.slots, tileset.digest, (CHUNK_SIZE, CHUNK_SIZE))
+    assert cache.hits == cache.misses == 0
+    cache.store("00ff", np.zeros(4))
+    assert cache.load("00ff") is None
+
+
+def test_chunks_read_cache(tmp_path, tileset, monkeypatch):
+    monkeypatch.setattr(Tilemap.bake_cache, "path", tmp_path)
+    tilemap = TileMap(CHUNK_SIZE, CHUNK_SIZE, tileset, grid=[["Dirt"] * CHUNK_SIZE for _ in range(CHUNK_SIZE)])
+    chunk = tilemap.chunk(0, 0)
+    hits = Tilemap.bake_cache.hits
+    baked = chunk.bake_pixels(*chunk.snapshot())
+    assert (chunk.bake_pixels(*chunk.snapshot()) == baked).all()
+    assert Tilemap.bake_cache.hits == hits + 1
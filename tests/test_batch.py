@@ -0,0 +1,162 @@
+import numpy as np
+import pygame
+import pytest
+from OpenGL import GL
+
+from Engine import FrameStats, GLUtils, Texture, Vec2
+from Engine.batch import Mesh, quad_vertices, build_vertices, build_mesh_vertices, sort_order, count_binds, \
+    texture_runs
+
+stats = FrameStats()
+RED, GREEN, BLUE = (255, 0, 0), (0, 255, 0), (0, 0, 255)
+
+
+def test_sort_order_is_stable():
+    rng = np.random.default_rng(0)
+    tex_ids = rng.integers(1, 4, 200)
+    layers = rng.integers(0, 3, 200).astype(np.float64)
+    order = sort_order(tex_ids, layers)
+    # python's sort is stable, so quads of the same layer and texture stay in order they were queued in
+    assert order.tolist() == sorted(range(200), key=lambda i: (layers[i], tex_ids[i]))
+
+
+def test_fractional_layers_are_between():
+    order = sort_order(np.array([1, 2, 3]), np.array([1, 0.5, 0]))
+    assert order.tolist() == [2, 1, 0]
+
+
+def test_texture_runs():
+    tex_ids = np.array([5, 5, 2, 2, 2, 5])
+    assert count_binds(tex_ids) == 3
+    assert texture_runs(tex_ids) == [(5, 0, 2), (2, 2, 3), (5, 5, 1)]
+    assert count_binds(np.array([], dtype=np.int64)) == 0
+
+
+def test_quad_vertices():
+    vertices = quad_vertices(np.array([[10, 20, 3, 4]]), np.array([[0, 0.5, 0.25, 1]]))
+    # top-left, top-right, bottom-right, bottom-left
+    assert vertices.tolist() == [[[10, 20, 0, 0.5], [13, 20, 0.25, 0.5], [13, 24, 0.25, 1], [10, 24, 0, 1]]]
+
+
+def test_build_vertices():
+    texture = Texture(7, None, (0, 0, 1, 1), Vec2(0, 0), Vec2(1, 1))
+    mesh = Mesh(quad_vertices(np.array([[0, 0, 1, 1], [1, 0, 1, 1]]), np.zeros((2, 4))), 9)
+    vertices, tex_ids, layers = build_vertices([((1, 2, 3, 4), texture, 0.5), ((0, 0, 1, 1), texture, 2)])
+    assert vertices.shape == (2, 4, 4)
+    assert tex_ids.tolist() == [7, 7] and layers.tolist() == [0.5, 2]
+
+    vertices, tex_ids, layers = build_mesh_vertices([(mesh, (100, 50), 1)])
+    assert vertices[:, 0, :2].tolist() == [[100, 50], [101, 50]]
+    assert tex_ids.tolist() == [9, 9] and layers.tolist() == [1, 1]
+    # mesh itself isn't moved
+    assert mesh.vertices[1, 0, :2].tolist() == [1, 0]
+
+
+@pytest.fixture
+def solids(gl) -> dict[tuple, Texture]:
+    textures = {}
+    for color in (RED, GREEN, BLUE):
+        surf = pygame.Surface((1, 1), pygame.SRCALPHA)
+        surf.fill(color)
+        textures[color] = GLUtils.surf_to_tex_default(surf)
+    yield textures
+    GL.glDeleteTextures([texture.tex_id for texture in textures.values()])
+
+
+@pytest.fixture
+def halves(gl) -> tuple[Texture, Texture]:
+    """Left and right half of one texture, red and green"""
+    surf = pygame.Surface((2, 1), pygame.SRCALPHA)
+    surf.fill(RED, (0, 0, 1, 1))
+    surf.fill(GREEN, (1, 0, 1, 1))
+    texture = GLUtils.surf_to_tex_default(surf)
+    yield (Texture(texture.tex_id, None, (0, 0, 0.5, 1), Vec2(0, 0), Vec2(1, 1)),
+           Texture(texture.tex_id, None, (0.5, 0, 1, 1), Vec2(1, 0), Vec2(1, 1)))
+    GL.glDeleteTextures([texture.tex_id])
+
+
+def drawn(queue: GLUtils.DrawQueue) -> tuple[int, int, int]:
+    """Color of the only pixel of context, after queue is drawn over black"""
+    GL.glViewport(0, 0, 1, 1)
+    GL.glClearColor(0, 0, 0, 1)
+    GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+    GLUtils.set_size_center(1, 1)
+    GL.glLoadIdentity()
+    queue()
+    pixel = np.frombuffer(GL.glReadPixels(0, 0, 1, 1, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE), np.uint8)
+    return tuple(pixel[:3].tolist())
+
+
+def cover(queue: GLUtils.DrawQueue, texture: Texture, layer: float = 0) -> None:
+    queue.add(-0.5, -0.5, 1, 1, texture, layer)
+
+
+@pytest.mark.parametrize("top, bottom", [(RED, GREEN), (GREEN, RED)])
+def test_higher_layer_is_drawn_over(solids, top, bottom):
+    queue = GLUtils.DrawQueue()
+    cover(queue, solids[top], 1)
+    cover(queue, solids[bottom], 0)
+    assert drawn(queue) == top
+
+
+def test_fractional_layer_is_drawn_over(solids):
+    queue = GLUtils.DrawQueue()
+    cover(queue, solids[RED], 0.5)
+    cover(queue, solids[GREEN], 0)
+    cover(queue, solids[BLUE], 1)
+    assert drawn(queue) == BLUE
+    cover(queue, solids[RED], 0.5)
+    cover(queue, solids[GREEN], 0)
+    assert drawn(queue) == RED
+
+
+@pytest.mark.parametrize("first, last", [(0, 1), (1, 0)])
+def test_order_in_texture_is_kept(halves, first, last):
+    queue = GLUtils.DrawQueue()
+    cover(queue, halves[first])
+    cover(queue, halves[last])
+    assert drawn(queue) == (RED, GREEN)[last]
+
+
+def test_unsorted_queue_keeps_order(solids):
+    queue = GLUtils.DrawQueue(sort=False)
+    cover(queue, solids[RED], 1)
+    cover(queue, solids[GREEN], 0)
+    assert drawn(queue) == GREEN
+
+
+# mesh follows green quad, so it shares its bind
+@pytest.mark.parametrize("sort, binds, saved", [(True, 2, 2), (False, 4, 0)])
+def test_counters(solids, sort, binds, saved):
+    mesh = Mesh(quad_vertices(np.array([[0, 0, 1, 1]] * 3, dtype=np.float32), np.zeros((3, 4))),
+                solids[GREEN].tex_id)
+    queue = GLUtils.DrawQueue(sort=sort)
+    for color in (RED, GREEN, RED, GREEN):
+        cover(queue, solids[color])
+    queue.add_mesh(mesh, (0, 0))
+    stats.end_frame()
+    drawn(queue)
+    assert (queue.binds, queue.binds_saved) == (binds, saved)
+    last = stats.end_frame()
+    assert last["quads"] == 7
+    assert last["binds"] == binds and last.get("binds_saved", 0) == saved
+    assert not queue.queue and not queue.meshes
+
+
+def test_empty_queue(gl):
+    queue = GLUtils.DrawQueue()
+    queue()
+    assert (queue.binds, queue.binds_saved) == (0, 0)
+
+
+def test_quads_are_counted(solids):
+    mesh = Mesh(quad_vertices(np.array([[0, 0, 1, 1]] * 3, dtype=np.float32), np.zeros((3, 4))),
+                solids[GREEN].tex_id)
+    queue = GLUtils.DrawQueue()
+    cover(queue, solids[RED])
+    cover(queue, solids[BLUE])
+    queue.add_mesh(mesh, (0, 0))
+    stats.end_frame()
+    drawn(queue)
+    assert stats.end_frame()["quads"] == 5
+    assert not queue.queue and not queue.meshes
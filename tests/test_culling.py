@@ -0,0 +1,63 @@
+import pygame
+import pytest
+
+from Engine import Camera, Renderer, TextRenderer, Vec2
+
+
+@pytest.fixture
+def cam(gl) -> Camera:
+    # zoom 1, sees [-200, 200] x [-200, 200]
+    cam = Camera(400, (400, 400))
+    cam.update()
+    return cam
+
+
+@pytest.fixture(scope="module")
+def font(display):
+    return pygame.font.Font("Assets/Fonts/Exo2-Regular.ttf", 16)
+
+
+def queued(cam: Camera, obj) -> int:
+    cam.queue.queue.clear()
+    obj.render(cam)
+    return len(cam.queue.queue)
+
+
+@pytest.mark.parametrize("pos, seen", [
+    ((0, 0), True),
+    ((205, 0), True),  # half of 20 px sprite is still in view
+    ((215, 0), False),
+    ((0, -215), False),
+    ((-1000, 1000), False),
+])
+def test_renderer(cam, pos, seen):
+    sprite = Renderer(pygame.Surface((20, 20)), pos=pos)
+    assert queued(cam, sprite) == seen
+
+
+def test_unscalable_renderer_keeps_screen_size(cam):
+    sprite = Renderer(pygame.Surface((20, 20)), pos=(-500, 0), scalable=False)
+    assert not queued(cam, sprite)
+    # zoomed out 4 times: view is [-800, 800], sprite is still 20 px, so 80 world units
+    cam.width = 1600
+    cam.update()
+    assert queued(cam, sprite)
+    sprite.pos = Vec2(-845, 0)
+    assert not queued(cam, sprite)
+    sprite.pos = Vec2(-835, 0)
+    assert queued(cam, sprite)
+
+
+def test_child_is_culled_by_its_global_position(cam):
+    parent = Renderer(pygame.Surface((4, 4)), pos=(1000, 0))
+    child = Renderer(pygame.Surface((4, 4)), pos=(-1000, 0), parent=parent)
+    assert not queued(cam, parent)
+    assert queued(cam, child)
+
+
+@pytest.mark.parametrize("glyphs", [False, True])
+def test_text_renderer(cam, font, glyphs):
+    tag = TextRenderer("Noname", font, (255, 255, 255), (0, 0, 0, 127), pos=(0, 0), glyphs=glyphs)
+    assert queued(cam, tag)
+    tag.pos = Vec2(0, 300)
+    assert not queued(cam, tag)
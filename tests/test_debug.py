@@ -0,0 +1,61 @@
+import pygame
+import pytest
+
+from Engine import Vec2
+from Engine.Debug import DebugManager, DEBUG_BACK
+from Engine.GLUtils import DrawQueue
+from Engine.packer import MaxRectsPacker
+from Engine.renderer import TRender
+from Engine.texture import TextureAtlas
+
+
+class RecordingQueue(DrawQueue):
+    """Keeps quads it was given on every draw"""
+
+    def __init__(self):
+        super().__init__()
+        self.drawn = []
+
+    def __call__(self):
+        self.drawn.append(list(self.queue))
+        super().__call__()
+
+
+@pytest.fixture(scope="module")
+def manager(gl):
+    # manager is a singleton, initialized once
+    manager = DebugManager()
+    manager.init(pygame.font.Font("Assets/Fonts/Exo2-Regular.ttf", 16), (400, 300), [("topleft", Vec2(0, 0))])
+    return manager
+
+
+def box(manager, text: str) -> tuple[int, int]:
+    return TRender.render_box(text, manager.font, back=DEBUG_BACK).get_size()
+
+
+def test_lines_drawn_after_compaction_use_new_textures(manager, monkeypatch):
+    first, (old, new), last = "ab", ("first", "firsts"), "last"
+    # one row, which fits the lines only once they are packed again
+    width = box(manager, first)[0] + box(manager, new)[0] + box(manager, last)[0]
+    monkeypatch.setattr(manager, "atlas", TextureAtlas.create_empty(Vec2(width, box(manager, first)[1]),
+                                                                    packer=MaxRectsPacker, keep_copies=False))
+    monkeypatch.setattr(manager, "queue", RecordingQueue())
+    display, = manager.displays
+    display.lines.clear()
+
+    for text in (first, old, last):
+        manager(text)
+    manager.draw()
+    line = display.lines[0]
+    before = line.texture
+
+    # first line is placed before the second one changes and compacts the atlas
+    for text in (first, new, last):
+        manager(text)
+    assert line.texture is not before and line.texture.pos != before.pos
+    manager.draw()
+
+    textures = [texture for _, texture, _ in manager.queue.drawn[-1]]
+    assert textures == [slot.texture for slot in display.lines]
+    assert all(texture is manager.atlas.textures[display, i] for i, texture in enumerate(textures))
+    assert not manager.placed
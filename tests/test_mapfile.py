@@ -0,0 +1,77 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from MapFile import MapFile, ALIGN, convert
+
+
+@pytest.fixture
+def map_file() -> MapFile:
+    rng = np.random.default_rng(0)
+    layers = {"Terrain": rng.integers(0, 4, (37, 21)).astype(np.uint16),
+              "Objects": rng.integers(0, 2, (37, 21)).astype(np.uint16)}
+    return MapFile("test", 37, 21, (-5, 7), {1: "Grass", 2: "Water", 3: "Stone path"}, layers)
+
+
+def test_round_trip(map_file, tmp_path):
+    map_file.save(tmp_path / "test.amap")
+    loaded = MapFile.open(tmp_path / "test.amap")
+    assert (loaded.name, loaded.width, loaded.height, loaded.offset) == ("test", 37, 21, (-5, 7))
+    assert loaded.mapping == map_file.mapping
+    # order of layers is drawing order
+    assert list(loaded.layers) == ["Terrain", "Objects"]
+    for name, tiles in map_file.layers.items():
+        assert loaded.layers[name].shape == (37, 21)
+        assert (loaded.layers[name] == tiles).all()
+
+
+def test_layers_are_page_aligned(map_file, tmp_path):
+    map_file.save(tmp_path / "test.amap")
+    assert (tmp_path / "test.amap").stat().st_size % ALIGN == 0
+    for tiles in MapFile.open(tmp_path / "test.amap").layers.values():
+        assert tiles.base.offset % ALIGN == 0
+
+
+def test_opened_layers_are_copy_on_write(map_file, tmp_path):
+    map_file.save(tmp_path / "test.amap")
+    MapFile.open(tmp_path / "test.amap").layers["Terrain"][0, 0] = 100
+    assert MapFile.open(tmp_path / "test.amap").layers["Terrain"][0, 0] == map_file.layers["Terrain"][0, 0]
+
+
+def test_not_a_map_file(tmp_path):
+    (tmp_path / "test.amap").write_bytes(b"PNG" + bytes(100))
+    with pytest.raises(ValueError):
+        MapFile.open(tmp_path / "test.amap")
+
+
+def test_layer_of_wrong_size(map_file, tmp_path):
+    map_file.layers["Objects"] = np.zeros((3, 3), dtype=np.uint16)
+    with pytest.raises(ValueError):
+        map_file.save(tmp_path / "test.amap")
+
+
+def test_converted_folder_matches_it(tmp_path):
+    folder = MapFile.from_folder("Data/Maps/demo")
+    converted = MapFile.open(convert("Data/Maps/demo", tmp_path / "demo.amap"))
+    assert converted.mapping == folder.mapping and converted.offset == folder.offset
+    for name, tiles in folder.layers.items():
+        assert (converted.layers[name] == tiles).all()
+
+
+def test_map_is_loaded_from_up_to_date_map_file(tileset, tmp_path):
+    from Map import Map
+
+    def from_file(mp: Map) -> bool:
+        return isinstance(mp.maps[0].tiles.base, np.memmap)
+
+    folder = tmp_path / "demo"
+    shutil.copytree("Data/Maps/demo", folder, ignore=shutil.ignore_patterns("*.amap"))
+    assert not from_file(Map.load(folder, tileset))
+    path = convert(folder)
+    assert from_file(Map.load(folder, tileset))
+    # layer edited after conversion
+    layer = next(folder.glob("*.png"))
+    os.utime(layer, (os.path.getmtime(path) + 10,) * 2)
+    assert not from_file(Map.load(folder, tileset))
@@ -0,0 +1,118 @@
+import random
+from functools import partial
+
+import pytest
+
+from Engine import Vec2, GuillotinePacker, SkylinePacker, MaxRectsPacker
+from Engine.rect import Rect
+
+PACKERS = {
+    "Guillotine": GuillotinePacker,
+    "Skyline": SkylinePacker,
+    **{f"MaxRects-{h}": partial(MaxRectsPacker, heuristic=h) for h in MaxRectsPacker.HEURISTICS},
+}
+ATLAS = Vec2(256, 256)
+
+packers = pytest.mark.parametrize("packer_type", PACKERS.values(), ids=PACKERS.keys())
+
+
+def overlap(a: Rect, b: Rect) -> bool:
+    return a.pos.x < b.end.x and b.pos.x < a.end.x and a.pos.y < b.end.y and b.pos.y < a.end.y
+
+
+def check_placement(rects: list[Rect]) -> None:
+    for i, rect in enumerate(rects):
+        assert rect.pos.x >= 0 and rect.pos.y >= 0 and rect.end.x <= ATLAS.x and rect.end.y <= ATLAS.y, rect
+        for other in rects[i + 1:]:
+            assert not overlap(rect, other), (rect, other)
+
+
+@packers
+def test_packed_rects_do_not_overlap(packer_type):
+    rng = random.Random(0)
+    packer = packer_type(ATLAS)
+    packed = []
+    for _ in range(300):
+        size = Vec2(rng.randint(1, 40), rng.randint(1, 40))
+        if (pos := packer.pack(size)) is not None:
+            packed.append(Rect(pos, size))
+    check_placement(packed)
+    # atlas is actually filled
+    assert sum(r.size.x * r.size.y for r in packed) > ATLAS.x * ATLAS.y * 0.6
+
+
+@packers
+def test_freed_space_is_never_given_twice(packer_type):
+    rng = random.Random(1)
+    packer = packer_type(ATLAS)
+    live = []
+    for _ in range(300):
+        if live and rng.random() < 0.4:
+            packer.free(live.pop(rng.randrange(len(live))))
+        size = Vec2(rng.randint(8, 40), rng.randint(8, 40))
+        if (pos := packer.pack(size)) is not None:
+            live.append(Rect(pos, size))
+        if len(live) % 20 == 0:
+            check_placement(live)
+    check_placement(live)
+
+
+@packers
+def test_freed_rect_is_reused(packer_type):
+    packer = packer_type(ATLAS)
+    tile = Vec2(64, 64)
+    tiles = [packer.pack(tile) for _ in range(16)]
+    assert None not in tiles
+    assert packer.pack(tile) is None
+    # last one is on the skyline, so every packer can reclaim it
+    packer.free(Rect(tiles[-1], tile))
+    assert packer.pack(tile) == tiles[-1]
+
+
+@pytest.mark.parametrize("packer_type", [GuillotinePacker, *(partial(MaxRectsPacker, heuristic=h)
+                                                           for h in MaxRectsPacker.HEURISTICS)])
+def test_any_freed_rect_is_reused(packer_type):
+    packer = packer_type(ATLAS)
+    tile = Vec2(64, 64)
+    tiles = [packer.pack(tile) for _ in range(16)]
+    packer.free(Rect(tiles[5], tile))
+    assert packer.pack(tile) == tiles[5]
+
+
+@packers
+def test_reset_frees_everything(packer_type):
+    packer = packer_type(ATLAS)
+    assert packer.pack(ATLAS) == Vec2(0, 0)
+    assert packer.pack(Vec2(1, 1)) is None
+    packer.reset()
+    assert packer.pack(ATLAS) == Vec2(0, 0)
+
+
+@packers
+@pytest.mark.parametrize("size", [Vec2(0, 0), Vec2(0, 10), Vec2(10, 0)])
+def test_empty_rect(packer_type, size):
+    packer = packer_type(ATLAS)
+    assert packer.pack(size) is not None
+    # takes no space
+    assert packer.pack(ATLAS) == Vec2(0, 0)
+
+
+@packers
+@pytest.mark.parametrize("size", [Vec2(257, 1), Vec2(1, 257)])
+def test_too_big_rect(packer_type, size):
+    assert packer_type(ATLAS).pack(size) is None
+
+
+@packers
+def test_pack_many(packer_type):
+    rng = random.Random(2)
+    sizes = [Vec2(rng.randint(1, 50), rng.randint(1, 50)) for _ in range(100)] + [Vec2(300, 300)]
+    positions = packer_type(ATLAS).pack_many(sizes)
+    assert len(positions) == len(sizes)
+    assert positions[-1] is None
+    check_placement([Rect(pos, size) for pos, size in zip(positions, sizes) if pos is not None])
+
+
+def test_unknown_heuristic():
+    with pytest.raises(ValueError):
+        MaxRectsPacker(ATLAS, heuristic="best")
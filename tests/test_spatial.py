@@ -0,0 +1,115 @@
+import pytest
+
+from Engine import Obj, SpatialIndex, Vec2
+
+
+class Dot(Obj):
+    """Draws a 10 x 10 square around its position"""
+    reach = (5, 0)
+
+    def bounds(self, zoom: float = 1) -> tuple[float, float, float, float]:
+        pos = self.global_pos
+        return pos.x - 5, pos.y - 5, pos.x + 5, pos.y + 5
+
+
+def query(index: SpatialIndex, x0: float, y0: float, x1: float, y1: float) -> list[Obj]:
+    return index.query_rect(Vec2(x0, y0), Vec2(x1, y1))
+
+
+@pytest.fixture
+def dots() -> list[Dot]:
+    return [Dot(pos) for pos in ((0, 0), (100, 0), (300, 300), (-600, 50), (1000, -1000))]
+
+
+def test_query_rect(dots):
+    index = SpatialIndex(dots, cell_size=64)
+    assert query(index, -10, -10, 10, 10) == [dots[0]]
+    assert query(index, -10, -10, 310, 310) == dots[:3]
+    # reach of objects widens the query
+    assert query(index, 304, 304, 400, 400) == [dots[2]]
+    assert query(index, 306, 306, 400, 400) == []
+    assert query(index, -2000, -2000, 2000, 2000) == dots
+
+
+def test_results_keep_order_of_adding(dots):
+    index = SpatialIndex(reversed(dots))
+    assert query(index, -2000, -2000, 2000, 2000) == dots[::-1]
+
+
+def test_unbounded_objects_are_always_returned(dots):
+    world = Obj()
+    index = SpatialIndex([dots[0], world, dots[1]])
+    assert query(index, 5000, 5000, 5010, 5010) == [world]
+    assert query(index, -10, -10, 110, 10) == [dots[0], world, dots[1]]
+
+
+def test_query_radius_and_point(dots):
+    index = SpatialIndex(dots)
+    assert index.query_radius(Vec2(50, 0), 45) == [dots[0], dots[1]]
+    assert index.query_radius(Vec2(50, 0), 40) == []
+    assert index.query_point(Vec2(104, -4)) == [dots[1]]
+    assert index.query_point(Vec2(106, 0)) == []
+
+
+def test_moved_object_is_rebucketed(dots):
+    index = SpatialIndex(dots, cell_size=64)
+    dot = dots[0]
+    cell = index.entries[dot]
+    dot.pos = Vec2(700, 700)
+    assert dot in index.moved
+    assert query(index, -10, -10, 10, 10) == []
+    assert query(index, 690, 690, 710, 710) == [dot]
+    assert index.entries[dot] == index.cell(700, 700) != cell
+    assert cell not in index.cells
+
+
+def test_in_place_move_is_rebucketed(dots):
+    index = SpatialIndex(dots)
+    dots[0].pos += Vec2(0, 500)
+    assert query(index, -10, 490, 10, 510) == [dots[0]]
+
+
+def test_children_move_with_parent():
+    parent = Obj()
+    child = Dot((10, 0), parent=parent)
+    index = SpatialIndex([child])
+    parent.pos = Vec2(-1000, 0)
+    assert query(index, 0, -10, 20, 10) == []
+    assert query(index, -1000, -10, -980, 10) == [child]
+
+
+def test_reparented_object_is_rebucketed(dots):
+    carrier = Obj((500, 500))
+    index = SpatialIndex(dots)
+    dots[1].parent = carrier
+    assert query(index, 90, -10, 110, 10) == []
+    assert query(index, 590, 490, 610, 510) == [dots[1]]
+    assert len(index) == len(dots)
+
+
+def test_removed_object_is_gone(dots):
+    index = SpatialIndex(dots)
+    dots[0].pos = Vec2(1, 1)
+    dots[0].remove()
+    assert dots[0] not in index and dots[0] not in index.moved
+    assert query(index, -10, -10, 10, 10) == []
+    assert len(index) == len(dots) - 1
+    # can be added again, to this or another index
+    SpatialIndex([dots[0]])
+
+
+def test_removed_child_is_gone():
+    parent = Obj()
+    child = Dot((0, 0), parent=parent)
+    index = SpatialIndex([child])
+    child.remove()
+    assert child not in parent.children and child not in index
+    # moving former parent doesn't reach index anymore
+    parent.pos = Vec2(5, 5)
+    assert not index.moved
+
+
+def test_object_is_in_one_index_only(dots):
+    SpatialIndex(dots[:1])
+    with pytest.raises(ValueError):
+        SpatialIndex(dots[:1])
@@ -0,0 +1,168 @@
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+import pytest
+from OpenGL import GL
+
+from Engine import FrameStats, Vec2
+from Engine.renderer import TRender
+from Engine.TextRenderUtils import GlyphAtlas
+from Engine.texture import TextureAtlas
+
+stats = FrameStats()
+
+
+@pytest.fixture
+def font(display):
+    # fonts are hashed by identity, so every test gets atlases of its own
+    return pygame.font.Font("Assets/Fonts/Exo2-Regular.ttf", 16)
+
+
+@pytest.fixture
+def trender(gl, monkeypatch):
+    """TRender with empty cache, its sizes are set by tests and restored afterwards"""
+    monkeypatch.setattr(TRender, "prerendered_text", OrderedDict())
+    monkeypatch.setattr(TRender, "atlases", {})
+    monkeypatch.setattr(TRender, "atlas_size", Vec2(256, 256))
+    yield TRender
+    for atlases in TRender.atlases.values():
+        for atlas in atlases:
+            atlas.delete()
+
+
+def cached(trender, font) -> dict[str, object]:
+    return {text: entry for (text, f, _, _), entry in trender.prerendered_text.items() if f is font}
+
+
+def on_gpu(trender, text: str, font) -> bool:
+    """Whether pixels of cached string in its atlas texture are the same as of freshly rendered one"""
+    TextureAtlas.flush_all()
+    texture = cached(trender, font)[text].texture
+    size = trender.atlas_size
+    GL.glBindTexture(GL.GL_TEXTURE_2D, texture.tex_id)
+    pixels = np.frombuffer(GL.glGetTexImage(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE), np.uint8)
+    pixels = pixels.reshape(int(size.y), int(size.x), 4)
+    (x, y), (w, h) = texture.pos.int_tuple, texture.size.int_tuple
+    box = trender.render_box(text, font)
+    expected = np.frombuffer(pygame.image.tobytes(box, "RGBA"), np.uint8).reshape(h, w, 4)
+    return (pixels[y:y + h, x:x + w] == expected).all()
+
+
+def test_cache_hit(trender, font):
+    texture = trender.prerender_text("hello", font)
+    hits = trender.hits
+    assert trender.prerender_text("hello", font) is texture
+    assert trender.hits == hits + 1
+    assert on_gpu(trender, "hello", font)
+
+
+def test_too_long_string(trender, font):
+    with pytest.raises(ValueError):
+        trender.prerender_text("long " * 100, font)
+
+
+def test_lru_trim(trender, font, monkeypatch):
+    monkeypatch.setattr(trender, "cache_size", 4)
+    for i in range(10):
+        trender.prerender_text(f"text {i}", font)
+        stats.end_frame()
+    assert list(cached(trender, font)) == [f"text {i}" for i in range(6, 10)]
+    # evicted strings give their space back
+    atlas, = trender.atlases[font]
+    assert {text for text, _, _ in atlas.textures} == set(cached(trender, font))
+
+
+def test_use_refreshes_lru(trender, font, monkeypatch):
+    monkeypatch.setattr(trender, "cache_size", 3)
+    for text in ("a", "b", "c"):
+        trender.prerender_text(text, font)
+        stats.end_frame()
+    trender.prerender_text("a", font)
+    stats.end_frame()
+    trender.prerender_text("d", font)
+    assert list(cached(trender, font)) == ["c", "a", "d"]
+
+
+def test_strings_of_current_frame_are_kept(trender, font, monkeypatch):
+    monkeypatch.setattr(trender, "cache_size", 2)
+    textures = [trender.prerender_text(f"text {i}", font) for i in range(5)]
+    assert len(cached(trender, font)) == 5
+    # textures of this frame stay valid
+    assert all(on_gpu(trender, f"text {i}", font) for i in range(5))
+    assert [entry.texture for entry in cached(trender, font).values()] == textures
+
+    stats.end_frame()
+    trender.prerender_text("next", font)
+    assert list(cached(trender, font)) == ["text 4", "next"]
+
+
+def test_empty_atlas_is_deleted(trender, font, monkeypatch):
+    # every atlas fits exactly one string
+    monkeypatch.setattr(trender, "atlas_size", Vec2.from_tuple(trender.render_box("0", font).get_size()))
+    monkeypatch.setattr(trender, "cache_size", 1)
+    trender.prerender_text("0", font)
+    first, = trender.atlases[font]
+    stats.end_frame()
+    trender.prerender_text("0", font, fore=(255, 0, 0))
+    assert list(trender.atlases[font]) != [first]
+    assert len(trender.atlases[font]) == 1
+
+
+def test_last_atlas_is_kept(trender, font):
+    trender.prerender_text("text", font)
+    stats.end_frame()
+    trender.evict(("text", font, (255, 255, 255), (0, 0, 0)))
+    assert len(trender.atlases[font]) == 1
+
+
+def test_compact_atlas(trender, font):
+    texts = [f"string {i}" for i in range(30)]
+    for text in texts:
+        trender.prerender_text(text, font)
+    atlas, = trender.atlases[font]
+    stats.end_frame()
+    for text in texts[::3] + texts[1::3]:
+        trender.evict((text, font, (255, 255, 255), (0, 0, 0)))
+    assert atlas.occupancy() < trender.compact_occupancy
+
+    assert trender.compact_atlas(font) is atlas
+    kept = texts[2::3]
+    assert list(cached(trender, font)) == kept
+    for text in kept:
+        assert cached(trender, font)[text].texture is atlas.textures[text, (255, 255, 255), (0, 0, 0)]
+        assert on_gpu(trender, text, font)
+    # space of evicted strings is reclaimed
+    assert max(texture.pos.y + texture.size.y for texture in atlas.textures.values()) \
+        <= sum(texture.size.y for texture in atlas.textures.values())
+
+
+def test_compact_skips_atlases_in_use(trender, font):
+    trender.prerender_text("text", font)
+    assert trender.compact_atlas(font) is None
+    stats.end_frame()
+    assert trender.compact_atlas(font) is trender.atlases[font][0]
+
+
+def test_compact_skips_full_atlases(trender, font, monkeypatch):
+    monkeypatch.setattr(trender, "atlas_size", Vec2.from_tuple(trender.render_box("text", font).get_size()))
+    trender.prerender_text("text", font)
+    stats.end_frame()
+    assert trender.compact_atlas(font) is None
+
+
+@pytest.mark.parametrize("name, size", [("Regular", 16), ("Bold", 24), ("Regular", 11)])
+@pytest.mark.parametrize("text", ["AVAWAY Tj", "j jungle (fjord)", "  leading spaces",
+                                  "The quick brown fox jumps over the lazy dog, 1234567890 times!"])
+def test_glyph_layout_matches_font(gl, name, size, text):
+    font = pygame.font.Font(f"Assets/Fonts/Exo2-{name}.ttf", size)
+    quads, width = GlyphAtlas(font).layout(text)
+    assert width == font.size(text)[0]
+    # glyphs drawn at their places are the same as whole text drawn by font
+    expected = font.render(text, True, (255, 255, 255))
+    laid_out = pygame.Surface(expected.get_size(), pygame.SRCALPHA)
+    for x, texture in quads:
+        laid_out.blit(texture.surf, (x, 0), special_flags=pygame.BLEND_RGBA_MAX)
+    # up to antialiased edges of overlapping glyphs, which the font blends differently
+    diff = pygame.surfarray.array_alpha(laid_out).astype(int) - pygame.surfarray.array_alpha(expected)
+    assert np.abs(diff).mean() < 1
@@ -0,0 +1,114 @@
+import pytest
+from OpenGL import GL
+
+from Engine import FrameStats, TexturePool, Vec2
+
+stats = FrameStats()
+SLOT = Vec2(8, 8)
+
+
+class Owner:
+    def __init__(self, name: str):
+        self.name = name
+        self.evicted = 0
+
+    def evict(self) -> None:
+        self.evicted += 1
+
+    def __repr__(self):
+        return self.name
+
+
+@pytest.fixture
+def pool(gl):
+    pool = TexturePool(SLOT, 3 * 8 * 8 * 4)
+    yield pool
+    GL.glDeleteTextures([slot.tex_id for slot, _ in pool.slots.values()] + [slot.tex_id for slot in pool.free])
+
+
+def fill(pool: TexturePool, count: int) -> list[Owner]:
+    """Owners which acquired a slot each, in separate frames, first one is least recently used"""
+    owners = [Owner(str(i)) for i in range(count)]
+    for owner in owners:
+        pool.acquire(owner)
+        stats.end_frame()
+    return owners
+
+
+def test_acquire_within_budget(pool):
+    owners = fill(pool, 3)
+    slots = {pool.acquire(owner).tex_id for owner in owners}
+    assert len(slots) == 3
+    assert pool.resident_bytes == pool.budget
+    assert pool.misses == 3
+    assert not any(owner.evicted for owner in owners)
+
+
+def test_acquire_again_returns_same_slot(pool):
+    owner, = fill(pool, 1)
+    slot = pool.acquire(owner)
+    assert pool.acquire(owner) is slot
+    assert pool.misses == 1
+
+
+def test_least_recently_used_is_evicted(pool):
+    first, second, third = fill(pool, 3)
+    first_slot = pool.acquire(first)
+    stats.end_frame()
+    # second is least recently used now, its slot is taken over
+    second_slot = pool.slots[second][0]
+    assert pool.acquire(Owner("new")) is second_slot
+    assert second.evicted == 1 and second not in pool
+    assert not first.evicted and not third.evicted
+    assert pool.acquire(first) is first_slot
+    assert pool.resident_bytes == pool.budget
+    assert pool.evictions == 1
+
+
+def test_touch_keeps_slot(pool):
+    first, second, third = fill(pool, 3)
+    assert pool.touch(first)
+    stats.end_frame()
+    pool.acquire(Owner("new"))
+    assert not first.evicted and second.evicted
+    assert not pool.touch(second)
+
+
+def test_visible_owners_are_not_evicted(pool):
+    owners = fill(pool, 3)
+    for owner in owners:
+        pool.touch(owner)
+    extra = Owner("extra")
+    pool.acquire(extra)
+    assert not any(owner.evicted for owner in owners)
+    assert extra in pool
+    assert pool.resident_bytes > pool.budget
+
+
+def test_release_returns_slot(pool):
+    first, second, third = fill(pool, 3)
+    slot = pool.acquire(first)
+    pool.release(first)
+    assert first not in pool and not first.evicted
+    # freed slot is taken before evicting anyone
+    newcomer = Owner("new")
+    assert pool.acquire(newcomer) is slot
+    assert not second.evicted and not third.evicted
+
+
+def test_trim(pool):
+    owners = fill(pool, 3)
+    for owner in owners:
+        pool.touch(owner)
+    pool.acquire(extra := Owner("extra"))
+    pool.release(owners[0])
+    stats.end_frame()
+    pool.trim()
+    # released slot is deleted first, then least recently used owner is evicted
+    assert pool.resident_bytes == pool.budget
+    assert not pool.free
+    pool.budget = pool.slot_bytes
+    pool.trim()
+    assert pool.resident_bytes == pool.budget
+    assert owners[1].evicted and owners[2].evicted and extra in pool
+    assert not owners[0].evicted
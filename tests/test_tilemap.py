@@ -0,0 +1,190 @@
+import numpy as np
+import pytest
+
+from Tilemap import TileMap, CHUNK_SIZE, neighbour_masks
+
+
+@pytest.fixture
+def tilemap(tileset):
+    # a grass field with a lake, the last chunk row is only partly inside of the map
+    cells = [["Grass"] * 40 for _ in range(70)]
+    for x in range(10, 20):
+        for y in range(5, 12):
+            cells[x][y] = "Water"
+    return TileMap(70, 40, tileset, grid=cells)
+
+
+def expected_masks(tilemap: TileMap) -> np.ndarray:
+    """Masks of the whole map, computed from scratch"""
+    ids = tilemap.remap[tilemap.tiles]
+    masks = neighbour_masks(ids)
+    masks[~tilemap.set.directional[ids]] = 0
+    return masks
+
+
+def names(tilemap: TileMap, x: int, y: int) -> str | None:
+    return tilemap.mapping.get(int(tilemap.tiles[x, y]))
+
+
+def test_cells_are_stored_as_map_ids(tilemap):
+    assert tilemap.tiles.shape == (70, 40)
+    assert tilemap.tiles.dtype == np.uint16
+    assert names(tilemap, 0, 0) == "Grass"
+    assert names(tilemap, 15, 8) == "Water"
+    assert sorted(tilemap.mapping.values()) == ["Grass", "Water"]
+
+
+def test_grid_of_ids_with_mapping(tileset):
+    grid = np.array([[0, 1], [2, 1]], dtype=np.uint16)
+    tilemap = TileMap(2, 2, tileset, grid=grid, mapping={1: "Sand", 2: "Dirt"})
+    assert tilemap.tiles is grid
+    assert tilemap.remap[1] == tileset.ids["Sand"]
+    assert tilemap.remap[2] == tileset.ids["Dirt"]
+    assert tilemap.remap[0] == 0
+
+
+def test_grid_of_wrong_shape(tileset):
+    with pytest.raises(ValueError):
+        TileMap(3, 3, tileset, grid=np.zeros((2, 3), dtype=np.uint16))
+
+
+def test_set_tile(tilemap):
+    tilemap.set_tile(3, 4, "Sand")
+    assert names(tilemap, 3, 4) == "Sand"
+    assert tilemap.remap[tilemap.tiles[3, 4]] == tilemap.set.ids["Sand"]
+    tilemap.set_tile(3, 4, None)
+    assert tilemap.tiles[3, 4] == 0
+
+
+def test_set_region_is_clipped_to_map(tilemap):
+    before = tilemap.tiles.copy()
+    tilemap.set_region(68, -1, [["Sand"] * 3 for _ in range(4)])
+    changed = np.argwhere(tilemap.tiles != before)
+    assert sorted(map(tuple, changed.tolist())) == [(68, 0), (68, 1), (69, 0), (69, 1)]
+    tilemap.set_region(100, 100, [["Sand"]])
+    tilemap.set_region(-5, 0, [["Sand"]])
+
+
+def test_set_region_of_ids(tilemap):
+    water = next(map_id for map_id, name in tilemap.mapping.items() if name == "Water")
+    tilemap.set_region(30, 30, np.full((2, 3), water, dtype=np.uint16))
+    assert (tilemap.tiles[30:32, 30:33] == water).all()
+
+
+def test_edits_only_touch_changed_chunks(tilemap):
+    first, second = tilemap.chunk(0, 0), tilemap.chunk(1, 0)
+    tilemap.set_tile(5, 5, "Grass")  # same tile as was there
+    assert first.version == 0 and first.dirty is None
+
+    tilemap.set_tile(5, 5, "Sand")
+    assert first.version == 1
+    # the cell and its neighbours, as their masks may have changed
+    assert first.dirty is not None
+    x0, y0, x1, y1 = first.dirty
+    assert x0 <= 5 < x1 and y0 <= 5 < y1
+    assert second.version == 0
+
+    # edit on a chunk border changes both
+    tilemap.set_region(CHUNK_SIZE - 1, 0, [["Dirt"], ["Dirt"]])
+    assert first.version == 2 and second.version == 1
+
+
+def test_neighbour_masks_match_per_cell_check():
+    ids = np.random.default_rng(0).integers(0, 3, (9, 7))
+    masks = neighbour_masks(ids)
+    w, h = ids.shape
+    for x in range(w):
+        for y in range(h):
+            mask = 0
+            for bit, (dx, dy) in enumerate(((0, 1), (-1, 0), (0, -1), (1, 0))):
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < w and 0 <= ny < h and ids[nx, ny] == ids[x, y]:
+                    mask |= 1 << bit
+            assert masks[x, y] == mask, (x, y)
+
+
+def test_masks_are_computed_when_chunk_is_created(tileset):
+    cells = [["Stone path"] * 40 for _ in range(70)]
+    tilemap = TileMap(70, 40, tileset, grid=cells)
+    assert not tilemap.masks.any()
+
+    tilemap.chunk(1, 0)
+    area = slice(CHUNK_SIZE, 2 * CHUNK_SIZE), slice(0, CHUNK_SIZE)
+    assert (tilemap.masks[area] == expected_masks(tilemap)[area]).all()
+    # other chunks are left alone until they are needed
+    assert not tilemap.masks[:CHUNK_SIZE].any()
+
+
+def test_edits_keep_masks_of_created_chunks_up_to_date(tileset):
+    rng = np.random.default_rng(1)
+    paths = ["Stone path", "Dirt path", "Grass", None]
+    cells = [[paths[i] for i in row] for row in rng.integers(0, 4, (70, 40))]
+    tilemap = TileMap(70, 40, tileset, grid=cells)
+    for cx in range(3):
+        for cy in range(2):
+            tilemap.chunk(cx, cy)
+
+    for i in range(300):
+        x, y = (int(v) for v in rng.integers(-2, 70, 2))
+        if i % 5:
+            tilemap.set_tile(x, y, paths[int(rng.integers(0, 4))])
+        else:
+            tilemap.set_region(x, y, [[paths[int(k)] for k in row] for row in rng.integers(0, 4, (3, 4))])
+    assert (tilemap.masks == expected_masks(tilemap)).all()
+
+
+def test_empty_chunks_are_never_created(tileset):
+    cells = [[None] * 100 for _ in range(100)]
+    cells[40][70] = "Grass"
+    tilemap = TileMap(100, 100, tileset, grid=cells)
+    assert tilemap.occupied.shape == (4, 4)
+    assert np.argwhere(tilemap.occupied).tolist() == [[1, 2]]
+    assert tilemap.chunks == {}
+
+    assert tilemap.chunk(0, 0) is None
+    assert tilemap.chunk(1, 2) is tilemap.chunk(1, 2)
+    assert list(tilemap.chunks) == [(1, 2)]
+
+
+def test_tiles_of_unknown_names_are_empty(tileset):
+    tilemap = TileMap(40, 40, tileset, grid=[["No such tile"] * 40 for _ in range(40)])
+    assert not tilemap.occupied.any()
+
+
+def test_editing_empty_chunk_creates_it(tileset):
+    tilemap = TileMap(100, 100, tileset)
+    assert not tilemap.occupied.any()
+    tilemap.set_tile(99, 99, "Sand")
+    assert tilemap.occupied[3, 3]
+    assert tilemap.chunk(3, 3) is not None
+
+
+def test_visible_chunks_are_only_occupied_ones(tileset):
+    from Engine import Camera, Vec2
+
+    cells = [[None] * 100 for _ in range(100)]
+    cells[40][70] = cells[5][5] = "Grass"
+    tilemap = TileMap(100, 100, tileset, grid=cells)
+    # whole map in view
+    cam = Camera(4000, (400, 400), pos=Vec2(800, 800))
+    assert sorted(chunk.cpos.tuple for chunk in tilemap.visible_chunks(cam)) == [(0, 0), (1, 2)]
+    assert len(tilemap.chunks) == 2
+
+
+def test_moving_map_moves_its_chunks(tilemap):
+    from Engine import Vec2
+    from Map import Map
+
+    mp = Map([tilemap])
+    tilemap.parent = mp
+    chunk = tilemap.chunk(1, 0)
+    composite = mp.chunk(1, 0)
+    size = tilemap.chunk_size
+    assert chunk.global_pos == composite.global_pos == size.vx
+
+    mp.pos += Vec2(1000, -50)
+    assert tilemap.global_pos == Vec2(1000, -50)
+    assert chunk.global_pos == composite.global_pos == size.vx + Vec2(1000, -50)
+    # moving isn't a change of tiles, nothing is rebaked
+    assert chunk.version == 0
+    assert not chunk.dirty
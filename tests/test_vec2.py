@@ -0,0 +1,119 @@
+import tracemalloc
+
+import pytest
+
+from Engine import Camera, Canvas, Obj, UiElement, Vec2
+from Engine.vec2 import ConstVec2
+
+PRESETS = ["zero", "one", "up", "down", "left", "right"]
+
+
+@pytest.mark.parametrize("other", [Vec2(2, 3), (2, 3)])
+def test_in_place_ops_change_vector(other):
+    v = Vec2(10, 20)
+    same = v
+    v += other
+    assert v is same and v == Vec2(12, 23)
+    v -= other
+    assert v is same and v == Vec2(10, 20)
+    v *= other
+    assert v is same and v == Vec2(20, 60)
+
+
+def test_in_place_ops_do_not_allocate():
+    v, d = Vec2(1, 2), Vec2(3, 4)
+    # every result is kept, so a new vector per operation would stay in memory
+    results = [None] * 2000
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        for i in range(0, 2000, 2):
+            v += d
+            results[i] = v
+            v -= d
+            results[i + 1] = v
+        allocated = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    assert allocated < 1000
+    assert all(result is v for result in results)
+    assert v == Vec2(1, 2)
+
+
+def test_in_place_ops_with_number():
+    v = Vec2(1, 2)
+    same = v
+    v += 1
+    v *= 2.5
+    v -= 0.5
+    assert v is same and v == Vec2(4.5, 7)
+
+
+@pytest.mark.parametrize("op", ["__iadd__", "__isub__", "__imul__"])
+def test_in_place_ops_reject_other_types(op):
+    v = Vec2(1, 2)
+    with pytest.raises(TypeError):
+        getattr(v, op)("1")
+    assert v == Vec2(1, 2)
+
+
+def test_type_specialized_ops_match_operators():
+    a, b = Vec2(3, -4), Vec2(0.5, 2)
+    assert a.add_vec(b) == a + b
+    assert a.sub_vec(b) == a - b
+    assert a.mul_vec(b) == a * b
+    assert a.mul_tuple((2, 3)) == a * (2, 3)
+    assert a.mul_num(3) == a * 3
+    assert a.div_num(2) == a / 2
+    # operands aren't changed
+    assert a == Vec2(3, -4) and b == Vec2(0.5, 2)
+
+
+@pytest.mark.parametrize("name", PRESETS)
+def test_presets_can_not_be_changed(name):
+    preset = getattr(Vec2, name)
+    value = preset.copy()
+    assert isinstance(preset, ConstVec2)
+    with pytest.raises(AttributeError):
+        preset.x = 5
+    with pytest.raises(AttributeError):
+        preset.y += 1
+    assert preset == value
+
+
+@pytest.mark.parametrize("name", PRESETS)
+def test_in_place_ops_on_presets_make_new_vector(name):
+    preset = getattr(Vec2, name)
+    value = preset.copy()
+    v = preset
+    v += Vec2(1, 1)
+    v *= 3
+    v -= (1, 1)
+    assert v is not preset and type(v) is Vec2
+    assert v == (value + Vec2(1, 1)) * 3 - (1, 1)
+    assert preset == value
+    # copy of preset can be changed
+    copy = preset.copy()
+    copy.x = 5
+    assert type(copy) is Vec2 and preset == value
+
+
+def test_positions_are_not_shared():
+    pos = Vec2(1, 2)
+    obj = Obj(pos)
+    obj.pos += (10, 10)
+    assert pos == Vec2(1, 2)
+    zero = Obj(Vec2.zero)
+    zero.pos += (5, 5)
+    assert Vec2.zero == Vec2(0, 0)
+    assert zero.pos == zero.global_pos == Vec2(5, 5)
+
+
+def test_ui_defaults_are_not_shared():
+    canvas = Canvas(Camera(400, (400, 300)))
+    first, second = UiElement(canvas), UiElement(canvas)
+    first.size += (10, 20)
+    first.relpos += (1, 1)
+    assert first.size == Vec2(10, 20)
+    assert second.size == Vec2.zero == Vec2(0, 0)
+    assert second.relpos == Vec2(0, 0)